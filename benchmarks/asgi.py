@@ -0,0 +1,120 @@
+"""
+Concurrency of the WSGI and ASGI entry points under slow clients.
+
+    python -m benchmarks.asgi --threads 4 --clients 64 --requests 512 --upload-delay 50
+
+Both paths get --threads worker threads and serve authenticated resource
+listings to --clients concurrent clients that each take --upload-delay ms to
+send their request. Under WSGI a worker thread is held while the client is
+sending, as with a threaded WSGI server; under paas_api.asgi the body is read on
+the event loop and a thread is only taken to run the view. The script prints
+requests per second and p50/p95 latency in ms for each path.
+"""
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import percentile, seed_resources, seed_users, setup_django
+
+
+def scope_for(token):
+    return {
+        'type': 'http', 'method': 'GET', 'path': '/api/resources/', 'query_string': b'',
+        'headers': [(b'authorization', 'Token {}'.format(token).encode('ascii'))],
+        'server': ('testserver', 80), 'scheme': 'http', 'http_version': '1.1',
+    }
+
+
+def run(threads, clients, requests, upload_delay):
+    db_path = setup_django()
+    import io
+    from django.core.handlers.wsgi import WSGIHandler
+    from rest_framework.authtoken.models import Token
+    from paas.asgi import ThreadPoolASGIHandler, build_environ
+    from paas.models import MyUser
+
+    try:
+        seed_users(clients)
+        users = list(MyUser.objects.all())
+        seed_resources(users, 20)
+        tokens = [Token.objects.create(user=user).key for user in users]
+        wsgi_application = WSGIHandler()
+
+        def wsgi_request(index):
+            # The worker thread waits for the slow client's request to arrive
+            time.sleep(upload_delay / 1000.0)
+            statuses = []
+            chunks = wsgi_application(build_environ(scope_for(tokens[index % clients]), io.BytesIO()),
+                                      lambda status, headers, exc_info=None: statuses.append(status))
+            b''.join(chunks)
+            chunks.close()
+            assert statuses[0].startswith('200'), statuses
+
+        def run_wsgi():
+            workers = ThreadPoolExecutor(max_workers=threads)
+
+            def client_request(index):
+                start = time.perf_counter()
+                workers.submit(wsgi_request, index).result()
+                return time.perf_counter() - start
+
+            with workers, ThreadPoolExecutor(max_workers=clients) as client_threads:
+                return list(client_threads.map(client_request, range(requests)))
+
+        async def run_asgi():
+            application = ThreadPoolASGIHandler(wsgi_application, max_workers=threads)
+            pending = list(range(requests))
+            latencies = []
+
+            async def client(number):
+                while pending:
+                    index = pending.pop()
+                    start = time.perf_counter()
+                    sent = []
+                    arrived = []
+
+                    async def receive():
+                        if not arrived:
+                            await asyncio.sleep(upload_delay / 1000.0)
+                            arrived.append(True)
+                            return {'type': 'http.request', 'body': b'', 'more_body': False}
+                        await asyncio.sleep(3600)
+
+                    async def send(message):
+                        sent.append(message)
+
+                    await application(scope_for(tokens[index % clients]), receive, send)
+                    assert sent[0]['status'] == 200, sent[0]
+                    latencies.append(time.perf_counter() - start)
+
+            await asyncio.gather(*[client(number) for number in range(clients)])
+            application.executor.shutdown()
+            return latencies
+
+        print('%-6s %8s %10s %10s %10s' % ('path', 'requests', 'req/s', 'p50 ms', 'p95 ms'))
+        for name, measure in (('wsgi', run_wsgi), ('asgi', lambda: asyncio.run(run_asgi()))):
+            start = time.perf_counter()
+            latencies = [latency * 1000 for latency in measure()]
+            elapsed = time.perf_counter() - start
+            print('%-6s %8d %10.1f %10.2f %10.2f' % (name, len(latencies), len(latencies) / elapsed,
+                                                      percentile(latencies, 50), percentile(latencies, 95)))
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=512)
+    parser.add_argument('--upload-delay', type=float, default=50, help="ms a client takes to send its request")
+    args = parser.parse_args()
+    run(args.threads, args.clients, args.requests, args.upload_delay)
+
+
+if __name__ == '__main__':
+    main()
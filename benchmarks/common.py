@@ -0,0 +1,84 @@
+"""
+Helpers shared by the benchmark scripts. Each benchmark runs against its own
+throwaway SQLite database so it never touches db.sqlite3.
+"""
+import os
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django(db_path=None):
+    """
+    Configure Django with the project settings on a fresh, migrated database and return its path.
+    """
+    if BASE_DIR not in sys.path:
+        sys.path.insert(0, BASE_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'paas_api.settings')
+
+    if db_path is None:
+        handle, db_path = tempfile.mkstemp(prefix='paas_bench_', suffix='.sqlite3')
+        os.close(handle)
+        os.remove(db_path)
+
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = db_path
+    settings.DATABASES['default'].setdefault('OPTIONS', {})['timeout'] = 30
+    settings.ALLOWED_HOSTS = list(settings.ALLOWED_HOSTS) + ['testserver']
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return db_path
+
+
+def seed_users(count, start=0, batch_size=5000, password='pwd12345'):
+    """
+    Insert count users named bench_user<n>, all sharing one precomputed password hash.
+    """
+    from django.contrib.auth.hashers import make_password
+    from paas.models import MyUser
+
+    encoded = make_password(password)
+    for offset in range(start, start + count, batch_size):
+        stop = min(offset + batch_size, start + count)
+        MyUser.objects.bulk_create([
+            MyUser(username='bench_user%d' % i, email='Bench_User%d@Example.com' % i, password=encoded)
+            for i in range(offset, stop)
+        ])
+
+
+def seed_resources(users, per_user, value_size=200, batch_size=5000):
+    """
+    Insert per_user resources for every user, then bring resource_count and quota_left in line.
+    """
+    from paas.models import Resource, reconcile_resource_counts
+
+    value = ('x' * value_size)
+    pending = []
+    for user in users:
+        for i in range(per_user):
+            pending.append(Resource(owner_id=user.pk, resource_value='%d %s' % (i, value)))
+            if len(pending) >= batch_size:
+                Resource.objects.bulk_create(pending)
+                pending = []
+    Resource.objects.bulk_create(pending)
+    reconcile_resource_counts()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
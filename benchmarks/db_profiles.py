@@ -0,0 +1,109 @@
+"""
+Concurrent write throughput of the SQLite database profiles.
+
+    python -m benchmarks.db_profiles --writers 8 --readers 4 --seconds 10
+
+Every profile in --profiles (values of PAAS_DATABASE_PROFILE) runs the same
+workload in its own process on a throwaway database: --writers threads create
+resources the way the bulk endpoint does, an owner lookup, quota reservation
+and insert in one transaction, while --readers threads keep listing resources.
+The script prints committed writes per second, writes that failed with
+"database is locked" and the p95 latency of reads in milliseconds.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.common import percentile, seed_resources, seed_users, setup_django, timed
+
+
+def run_profile(writers, readers, seconds):
+    db_path = setup_django()
+    from django.db import OperationalError, connection, transaction
+    from paas.models import MyUser, Resource
+
+    try:
+        seed_users(writers + readers)
+        users = list(MyUser.objects.order_by('username'))
+        seed_resources(users[writers:], 100)
+        connection.close()
+
+        deadline = time.monotonic() + seconds
+        lock = threading.Lock()
+        totals = {'committed': 0, 'locked': 0, 'reads': []}
+
+        def write(user):
+            committed = locked = 0
+            while time.monotonic() < deadline:
+                try:
+                    with transaction.atomic():
+                        MyUser.objects.filter(pk=user.pk).exists()
+                        Resource.objects.create(owner=user, resource_value='benchmark value')
+                    committed += 1
+                except OperationalError:
+                    locked += 1
+            connection.close()
+            with lock:
+                totals['committed'] += committed
+                totals['locked'] += locked
+
+        def read(user):
+            latencies = []
+            while time.monotonic() < deadline:
+                try:
+                    elapsed, rows = timed(list, Resource.objects.filter(owner=user).order_by('id')[:100])
+                    latencies.append(elapsed * 1000)
+                except OperationalError:
+                    pass
+            connection.close()
+            with lock:
+                totals['reads'].extend(latencies)
+
+        threads = [threading.Thread(target=write, args=(user,)) for user in users[:writers]]
+        threads += [threading.Thread(target=read, args=(user,)) for user in users[writers:]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return {
+            'writes_per_second': totals['committed'] / float(seconds),
+            'locked': totals['locked'],
+            'read_p95_ms': percentile(totals['reads'], 95),
+        }
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--profiles', nargs='+', default=['sqlite-plain', 'sqlite'])
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--run-profile', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_profile:
+        print(json.dumps(run_profile(args.writers, args.readers, args.seconds)))
+        return
+
+    print('%-14s %12s %10s %12s' % ('profile', 'writes/s', 'locked', 'read p95 ms'))
+    for profile in args.profiles:
+        # Settings pick the profile at import time, so every profile gets a fresh interpreter
+        output = subprocess.check_output(
+            [sys.executable, '-m', 'benchmarks.db_profiles', '--run-profile', '--writers', str(args.writers),
+             '--readers', str(args.readers), '--seconds', str(args.seconds)],
+            env=dict(os.environ, PAAS_DATABASE_PROFILE=profile))
+        result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+        print('%-14s %12.1f %10d %12.3f' % (profile, result['writes_per_second'], result['locked'],
+                                            result['read_p95_ms']))
+
+
+if __name__ == '__main__':
+    main()
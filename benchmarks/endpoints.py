@@ -0,0 +1,236 @@
+"""
+Load test for every endpoint in paas/urls.py.
+
+    python -m benchmarks.endpoints --users 50 --resources-per-user 200 --clients 8 --requests 400
+    python -m benchmarks.endpoints --save-baseline bench_baseline.json
+    python -m benchmarks.endpoints --baseline bench_baseline.json --tolerance 0.25
+
+The project is served in process through the WSGI handler (no network, no
+server) on a throwaway SQLite database. For each endpoint, --requests calls
+are spread over --clients concurrent threads, and the script reports p50/p95/p99
+latency in ms, requests per second and SQL queries per successful request. With
+--baseline it exits with status 1 when an endpoint's p95 latency grew by more
+than --tolerance or it issues more queries per request than in the baseline.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+from benchmarks.common import percentile, seed_resources, seed_users, setup_django
+
+PASSWORD = 'pwd12345'
+
+
+class Client(object):
+    """
+    One simulated API client with its own test client and database connection.
+    """
+
+    def __init__(self, user, token):
+        from rest_framework.test import APIClient
+        self.user = user
+        self.api = APIClient()
+        self.api.credentials(HTTP_AUTHORIZATION='Token ' + token)
+        self.created = []
+
+
+def login(user):
+    from django.urls import reverse
+    from rest_framework.test import APIClient
+    response = APIClient().post(reverse('user-login'), {'email': user.email, 'password': PASSWORD})
+    assert response.status_code == 200, response.status_code
+    return response.data['token']
+
+
+def build_scenarios(admin, resource_ids, page_size):
+    """
+    Ordered (name, expected status, call) triples. Each call gets a Client and a request counter.
+    """
+    from django.urls import reverse
+
+    def pick(client, n):
+        ids = resource_ids[client.user.pk]
+        return ids[n % len(ids)]
+
+    def create(client, n):
+        response = client.api.post(reverse('list-resources'), {'resource_value': 'bench %d' % n})
+        client.created.append(response.data['id'])
+        return response
+
+    def delete(client, n):
+        return client.api.delete(reverse('get-resource', args=[client.created.pop()]))
+
+    def bulk_create(client, n):
+        data = [{'resource_value': 'bulk %d %d' % (n, i)} for i in range(20)]
+        response = client.api.post(reverse('bulk-resources'), data, format='json')
+        client.created.extend(item['data']['id'] for item in response.data)
+        return response
+
+    def quota_update(client, n):
+        return admin.api.patch(reverse('get-user', args=[client.user.pk]), {'quota': 1000000 + n})
+
+    return [
+        ('user-login', 200, lambda client, n: client.api.post(
+            reverse('user-login'), {'email': client.user.email, 'password': PASSWORD})),
+        ('list-resources', 200, lambda client, n: client.api.get(reverse('list-resources'))),
+        ('list-resources (page 2)', 200, lambda client, n: client.api.get(
+            client.api.get(reverse('list-resources'), {'page_size': page_size}).data['next'])),
+        ('get-resource', 200, lambda client, n: client.api.get(reverse('get-resource', args=[pick(client, n)]))),
+        ('create-resource', 201, create),
+        ('update-resource', 200, lambda client, n: client.api.patch(
+            reverse('get-resource', args=[pick(client, n)]), {'resource_value': 'updated %d' % n})),
+        ('delete-resource', 204, delete),
+        ('bulk-resources (20 rows)', 201, bulk_create),
+        ('get-user', 200, lambda client, n: admin.api.get(reverse('get-user', args=[client.user.pk]))),
+        ('update-user-quota', 200, quota_update),
+        ('list-users', 200, lambda client, n: admin.api.get(reverse('list-users'))),
+    ]
+
+
+def run_endpoint(clients, call, expected, requests):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    latencies = []
+    queries = []
+    failures = []
+    lock = threading.Lock()
+
+    def worker(index, client):
+        # Requests are dealt round-robin so every client runs the same share, e.g. as many deletes as creates
+        local_latencies, local_queries = [], []
+        try:
+            for n in range(index, requests, len(clients)):
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    try:
+                        status_code = call(client, n).status_code
+                    except Exception as exc:
+                        status_code = type(exc).__name__
+                    elapsed = time.perf_counter() - start
+                if status_code != expected:
+                    with lock:
+                        failures.append(status_code)
+                else:
+                    local_queries.append(len(captured))
+                local_latencies.append(elapsed * 1000)
+        finally:
+            connection.close()
+            with lock:
+                latencies.extend(local_latencies)
+                queries.extend(local_queries)
+
+    threads = [threading.Thread(target=worker, args=(index, client)) for index, client in enumerate(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    return {
+        'requests': len(latencies),
+        'failures': len(failures),
+        'failure_kinds': sorted(set(str(failure) for failure in failures)),
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'rps': len(latencies) / wall if wall else 0.0,
+        'queries_per_request': sum(queries) / float(len(queries)) if queries else 0.0,
+    }
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if result['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append('%s: p95 %.2f ms > baseline %.2f ms' % (name, result['p95_ms'], previous['p95_ms']))
+        if result['queries_per_request'] > previous['queries_per_request'] + 0.01:
+            regressions.append('%s: %.2f queries/request > baseline %.2f' % (
+                name, result['queries_per_request'], previous['queries_per_request']))
+    return regressions
+
+
+def run(args):
+    db_path = setup_django()
+    # Failed requests are counted in the report; their tracebacks would only drown it
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+    from django.conf import settings
+    if args.no_response_cache:
+        settings.PAAS_RESPONSE_CACHE_TTL = 0
+    from django.contrib.auth.hashers import make_password
+    from paas.models import MyUser, Resource
+
+    try:
+        seed_users(args.users, password=PASSWORD)
+        users = list(MyUser.objects.order_by('username'))
+        seed_resources(users, args.resources_per_user)
+        MyUser.objects.create(username='bench_admin', email='bench_admin@example.com', is_staff=True,
+                              is_superuser=True, password=make_password(PASSWORD))
+
+        admin_user = MyUser.objects.get(username='bench_admin')
+        admin = Client(admin_user, login(admin_user))
+        clients = [Client(user, login(user)) for user in users[:args.clients]]
+        resource_ids = {}
+        for client in clients:
+            resource_ids[client.user.pk] = list(
+                Resource.objects.filter(owner=client.user).values_list('pk', flat=True)[:100])
+
+        results = {}
+        print('%-26s %8s %9s %9s %9s %9s %9s %6s' % (
+            'endpoint', 'requests', 'p50 ms', 'p95 ms', 'p99 ms', 'req/s', 'queries', 'fail'))
+        page_size = max(1, min(20, args.resources_per_user // 2))
+        for name, expected, call in build_scenarios(admin, resource_ids, page_size):
+            requests = args.login_requests if name == 'user-login' else args.requests
+            result = run_endpoint(clients, call, expected, requests)
+            results[name] = result
+            print('%-26s %8d %9.2f %9.2f %9.2f %9.1f %9.2f %6d' % (
+                name, result['requests'], result['p50_ms'], result['p95_ms'], result['p99_ms'],
+                result['rps'], result['queries_per_request'], result['failures']))
+            if result['failures']:
+                print('    unexpected results: %s' % ', '.join(result['failure_kinds']))
+    finally:
+        os.remove(db_path)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as handle:
+            json.dump(results, handle, indent=2, sort_keys=True)
+        print('Baseline written to %s' % args.save_baseline)
+
+    status = 0
+    if any(result['failures'] for result in results.values()):
+        print('Some requests returned an unexpected status')
+        status = 1
+    if args.baseline:
+        with open(args.baseline) as handle:
+            regressions = compare(results, json.load(handle), args.tolerance)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if regressions:
+            status = 1
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--resources-per-user', type=int, default=100)
+    parser.add_argument('--clients', type=int, default=4, help='concurrent clients, at most --users')
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint')
+    parser.add_argument('--login-requests', type=int, default=20, help='requests for the login endpoint')
+    parser.add_argument('--no-response-cache', action='store_true', help='disable the resource response cache')
+    parser.add_argument('--save-baseline', metavar='PATH')
+    parser.add_argument('--baseline', metavar='PATH')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative p95 growth')
+    sys.exit(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
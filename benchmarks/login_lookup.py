@@ -0,0 +1,64 @@
+"""
+Login lookup latency as the user table grows.
+
+    python -m benchmarks.login_lookup --sizes 1000 10000 100000 1000000
+
+For every table size it times ModelEmailBackend.get_login_user for username and
+email logins in mixed case, next to the previous three-way iexact query, and
+prints p50/p95 latency in milliseconds. Password hashing is left out on purpose:
+its cost does not depend on the table size.
+"""
+import argparse
+import os
+import random
+
+from benchmarks.common import percentile, seed_users, setup_django, timed
+
+
+def run(sizes, samples):
+    db_path = setup_django()
+    from django.db.models import Q
+    from paas.backends import ModelEmailBackend
+    from paas.models import MyUser
+
+    backend = ModelEmailBackend()
+
+    def legacy_lookup(username):
+        return MyUser.objects.get(Q(username__iexact=username) | Q(email__iexact=None) |
+                                  Q(email__iexact=username))
+
+    cases = [
+        ('username', lambda n: backend.get_login_user(username='bench_user%d' % n)),
+        ('USERNAME', lambda n: backend.get_login_user(username='BENCH_USER%d' % n)),
+        ('email', lambda n: backend.get_login_user(email='bench_user%d@example.com' % n)),
+        ('legacy iexact', lambda n: legacy_lookup('BENCH_USER%d@example.com' % n)),
+    ]
+
+    print('%10s  %-14s %10s %10s' % ('users', 'lookup', 'p50 ms', 'p95 ms'))
+    seeded = 0
+    try:
+        for size in sorted(sizes):
+            seed_users(size - seeded, start=seeded)
+            seeded = size
+            for name, lookup in cases:
+                latencies = []
+                for i in range(samples):
+                    elapsed, user = timed(lookup, random.randrange(size))
+                    assert user is not None
+                    latencies.append(elapsed * 1000)
+                print('%10d  %-14s %10.3f %10.3f' % (size, name, percentile(latencies, 50),
+                                                     percentile(latencies, 95)))
+    finally:
+        os.remove(db_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--samples', type=int, default=200)
+    args = parser.parse_args()
+    run(args.sizes, args.samples)
+
+
+if __name__ == '__main__':
+    main()
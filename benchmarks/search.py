@@ -0,0 +1,85 @@
+"""
+Latency of ?q= resource search against scanning resource values.
+
+    python -m benchmarks.search --rows 1000000 --backend fts5 --repeat 5
+
+Seeds --rows resources of 12 words drawn from a skewed vocabulary (bulk
+creates maintain the search index), then times search.search() for a page of
+100 on the selected --backend for rare, common, prefix and two word queries,
+across all owners and for one owner. Next to it, a LIKE scan counting the
+values that contain the first word shows the least a search without an index
+has to read. Prints seeding time and the best of --repeat runs in ms.
+"""
+import argparse
+import os
+import random
+import time
+
+from benchmarks.common import seed_users, setup_django, timed
+
+WORDS_PER_VALUE = 12
+
+
+def word(rng, vocabulary):
+    # Pareto ranks: a few words are in most values, most words in few
+    return 'word%d' % min(int(rng.paretovariate(1.0)) - 1, vocabulary - 1)
+
+
+def run(rows, backend, repeat, vocabulary, users):
+    db_path = setup_django()
+    from django.conf import settings
+    from django.db import transaction
+    from paas import search
+    from paas.models import MyUser, Resource
+
+    settings.PAAS_SEARCH_BACKEND = backend
+    rng = random.Random(0)
+    try:
+        seed_users(users)
+        owners = list(MyUser.objects.values_list('pk', flat=True))
+        start = time.perf_counter()
+        for offset in range(0, rows, 5000):
+            with transaction.atomic():
+                Resource.objects.bulk_create([
+                    Resource(owner_id=owners[i % users],
+                             resource_value=' '.join(word(rng, vocabulary) for n in range(WORDS_PER_VALUE)))
+                    for i in range(offset, min(offset + 5000, rows))
+                ])
+        print('seeded %d rows with the %s index in %.1f s' % (rows, backend, time.perf_counter() - start))
+
+        queries = [
+            ('rare', 'word%d' % (vocabulary - 1)),
+            ('common', 'word0'),
+            ('prefix', 'word99*'),
+            ('two words', 'word1 word2'),
+        ]
+        print('%-10s %-12s %10s %10s %10s' % ('query', 'q', 'all ms', 'owner ms', 'scan ms'))
+        for name, query in queries:
+            terms = search.parse_query(query)
+            all_times, owner_times, scan_times = [], [], []
+            for i in range(repeat):
+                all_times.append(timed(search.search, terms, limit=100)[0] * 1000)
+                owner_times.append(timed(search.search, terms, owner_id=owners[0], limit=100)[0] * 1000)
+                scan = Resource.objects.filter(resource_value__contains=terms[0][0])
+                scan_times.append(timed(scan.count)[0] * 1000)
+            print('%-10s %-12s %10.2f %10.2f %10.2f' % (name, query, min(all_times), min(owner_times),
+                                                        min(scan_times)))
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--backend', choices=('fts5', 'tokens'), default='fts5')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--vocabulary', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=100)
+    args = parser.parse_args()
+    run(args.rows, args.backend, args.repeat, args.vocabulary, args.users)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+List serialization cost of the DRF serializers against their compiled versions.
+
+    python -m benchmarks.serializers --rows 10000 --repeat 5
+
+For ListResourceSerializer (with the nested owner) and UserSerializer it times
+fetching --rows rows, serializing them and rendering the JSON body, once through
+model instances and the DRF serializer and once through values() rows and
+compile_serializer, checks both bodies are identical, and prints the best of
+--repeat runs in milliseconds along with the speedup.
+"""
+import argparse
+import os
+
+from benchmarks.common import seed_resources, seed_users, setup_django, timed
+
+
+def run(rows, repeat):
+    db_path = setup_django()
+    from rest_framework.renderers import JSONRenderer
+    from paas.fastserializers import compile_serializer
+    from paas.models import MyUser, Resource
+    from paas.serializers import ListResourceSerializer, UserSerializer
+
+    renderer = JSONRenderer()
+
+    def drf(serializer_class, queryset):
+        return renderer.render(serializer_class(list(queryset.all()), many=True).data)
+
+    def compiled(serializer_class, queryset):
+        serializer = compile_serializer(serializer_class)
+        return renderer.render(serializer.serialize(list(queryset.values(*serializer.columns))))
+
+    try:
+        users = max(1, rows // 100)
+        seed_users(rows)
+        seed_resources(list(MyUser.objects.order_by('username')[:users]), rows // users)
+        cases = [
+            ('resources', ListResourceSerializer,
+             Resource.objects.select_related('owner').order_by('owner_id', 'id')[:rows]),
+            ('users', UserSerializer, MyUser.objects.order_by('username')[:rows]),
+        ]
+
+        print('%-10s %8s %12s %12s %8s' % ('listing', 'rows', 'drf ms', 'compiled ms', 'speedup'))
+        for name, serializer_class, queryset in cases:
+            drf_times, compiled_times = [], []
+            for i in range(repeat):
+                elapsed, expected = timed(drf, serializer_class, queryset)
+                drf_times.append(elapsed * 1000)
+                elapsed, actual = timed(compiled, serializer_class, queryset)
+                compiled_times.append(elapsed * 1000)
+                assert actual == expected, 'compiled output differs for %s' % name
+            print('%-10s %8d %12.1f %12.1f %7.1fx' % (name, queryset.count(), min(drf_times),
+                                                       min(compiled_times), min(drf_times) / min(compiled_times)))
+    finally:
+        os.remove(db_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    run(args.rows, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
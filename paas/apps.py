@@ -3,3 +3,10 @@ from django.apps import AppConfig
 
 class PaasConfig(AppConfig):
     name = 'paas'
+
+    def ready(self):
+        # Connects the database signal receivers
+        import paas.checks  # noqa: F401
+        import paas.db  # noqa: F401
+        # Connects the receiver resuming jobs left by a previous process
+        import paas.jobs  # noqa: F401
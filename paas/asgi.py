@@ -0,0 +1,161 @@
+import asyncio
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def build_environ(scope, body):
+    """
+    WSGI environ for an ASGI HTTP scope whose request body has been read into body.
+    """
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        # WSGI carries the raw path as latin-1 decoded bytes
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server_name),
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': 'HTTP/{}'.format(scope.get('http_version', '1.1')),
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        environ[name] = '{},{}'.format(environ[name], value) if name in environ else value
+    return environ
+
+
+class ThreadPoolASGIHandler(object):
+    """
+    ASGI application serving a WSGI application from a bounded thread pool.
+
+    Request bodies are read and responses are sent on the event loop, so slow
+    clients do not occupy a thread; a thread is only taken while the view runs
+    and produces response chunks. Streaming responses hand over at most
+    `max_queued_chunks` chunks before their thread waits for the client.
+    """
+    body_spool_size = 1024 * 1024
+
+    def __init__(self, wsgi_application, max_workers=16, max_queued_chunks=16):
+        self.wsgi_application = wsgi_application
+        self.max_queued_chunks = max_queued_chunks
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='paas-asgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError("Unsupported ASGI scope type {!r}".format(scope['type']))
+
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.max_queued_chunks)
+        disconnected = threading.Event()
+        watcher = loop.create_task(self.watch_disconnect(receive, disconnected))
+        worker = loop.run_in_executor(self.executor, self.run, scope, body, queue, loop, disconnected)
+        finished = False
+        try:
+            while True:
+                message = await queue.get()
+                if message is None:
+                    finished = True
+                    break
+                if not disconnected.is_set():
+                    await send(message)
+            await worker
+        finally:
+            watcher.cancel()
+            if not finished:
+                # send() failed: stop the response and drain the queue, or the
+                # thread waits forever for room in it, holding its database connection
+                disconnected.set()
+                while await queue.get() is not None:
+                    pass
+
+    async def read_body(self, receive):
+        body = tempfile.SpooledTemporaryFile(max_size=self.body_spool_size)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                body.seek(0)
+                return body
+
+    async def watch_disconnect(self, receive, disconnected):
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                disconnected.set()
+                return
+
+    def run(self, scope, body, queue, loop, disconnected):
+        """
+        Call the WSGI application and feed the ASGI messages of its response to queue.
+        Runs in a pool thread; everything of one request happens in that thread,
+        so its database connection is used and closed by the same thread.
+        """
+        def put(message):
+            asyncio.run_coroutine_threadsafe(queue.put(message), loop).result()
+
+        response = {}
+
+        def start():
+            if not response.get('started'):
+                put({'type': 'http.response.start', 'status': response['status'], 'headers': response['headers']})
+                response['started'] = True
+
+        def write(data):
+            start()
+            put({'type': 'http.response.body', 'body': data, 'more_body': True})
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                   for name, value in headers]
+            return write
+
+        try:
+            chunks = self.wsgi_application(build_environ(scope, body), start_response)
+            try:
+                for chunk in chunks:
+                    if disconnected.is_set():
+                        break
+                    if chunk:
+                        write(chunk)
+                start()
+                put({'type': 'http.response.body', 'body': b'', 'more_body': False})
+            finally:
+                # Sends request_finished, which closes this thread's database connections
+                if hasattr(chunks, 'close'):
+                    chunks.close()
+        finally:
+            body.close()
+            put(None)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -0,0 +1,188 @@
+import copy
+import hashlib
+import hmac
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.encoding import force_bytes
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import Throttled
+
+from paas.hashing import HashingPoolSaturated
+UserModel = get_user_model()
+
+
+def changes_cache():
+    return caches[getattr(settings, 'PAAS_AUTH_CHANGES_CACHE', 'default')]
+
+
+def changed_key(user_id):
+    return 'paas:credentials-changed:{}'.format(user_id)
+
+
+def credentials_changed(user_id):
+    """
+    Record when the credentials of user_id last changed in the PAAS_AUTH_CHANGES_CACHE
+    cache alias, so that every process sharing it stops trusting what it verified before.
+    """
+    timeout = max(credential_cache.ttl, token_cache.ttl)
+    if timeout > 0:
+        changes_cache().set(changed_key(user_id), time.time(), timeout + 1)
+
+
+class CredentialCache(object):
+    """
+    Bounded LRU of recently verified credentials and the users they belong to.
+    Entries live for `ttl_setting` seconds; keys are HMACs of the credentials,
+    so passwords and tokens are never held in memory. A hit checks that the user's
+    credentials did not change, in any process, since their verification started.
+    """
+
+    def __init__(self, ttl_setting, size_setting, default_ttl=300, default_size=1024):
+        self.ttl_setting = ttl_setting
+        self.size_setting = size_setting
+        self.default_ttl = default_ttl
+        self.default_size = default_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def ttl(self):
+        return getattr(settings, self.ttl_setting, self.default_ttl)
+
+    @property
+    def max_size(self):
+        return getattr(settings, self.size_setting, self.default_size)
+
+    def make_key(self, *credentials):
+        message = '\0'.join(credentials)
+        return hmac.new(force_bytes(settings.SECRET_KEY), force_bytes(message), hashlib.sha256).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] < time.monotonic():
+                del self._entries[key]
+                entry = None
+        if entry is not None:
+            changed = changes_cache().get(changed_key(entry[0].pk))
+            if changed is not None and changed >= entry[2]:
+                self.invalidate(key)
+                entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return copy.copy(entry[0])
+
+    def set(self, key, user, verified_at):
+        """
+        Cache user for key, verified from what the database held at time.time() verified_at.
+        """
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (copy.copy(user), time.monotonic() + self.ttl, verified_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in [key for key, (user, expires, verified_at) in self._entries.items() if user.pk == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+credential_cache = CredentialCache('PAAS_AUTH_CACHE_TTL', 'PAAS_AUTH_CACHE_SIZE')
+token_cache = CredentialCache('PAAS_TOKEN_CACHE_TTL', 'PAAS_TOKEN_CACHE_SIZE', default_ttl=60)
+
+
+class CachedBasicAuthentication(BasicAuthentication):
+    """
+    HTTP Basic authentication that skips the user lookup and password hashing
+    for credentials verified within the last PAAS_AUTH_CACHE_TTL seconds.
+    """
+
+    def authenticate_credentials(self, userid, password, request=None):
+        key = credential_cache.make_key(userid, password)
+        user = credential_cache.get(key)
+        if user is None:
+            verified_at = time.time()
+            try:
+                user, auth = super().authenticate_credentials(userid, password, request)
+            except HashingPoolSaturated:
+                raise Throttled()
+            credential_cache.set(key, user, verified_at)
+        return (user, None)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that keeps the principal of recently seen tokens in memory,
+    so authenticated requests do not touch the database. A revoked token can stay
+    usable in other processes for at most PAAS_TOKEN_CACHE_TTL seconds.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = token_cache.make_key(key)
+        user = token_cache.get(cache_key)
+        if user is None:
+            verified_at = time.time()
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(cache_key, user, verified_at)
+            return (user, token)
+        return (user, Token(key=key, user=user))
+
+
+def user_credentials_changed(user_id):
+    # Once more after the commit: a process may read the old row until then and cache it as verified
+    credentials_changed(user_id)
+    transaction.on_commit(lambda: credentials_changed(user_id))
+
+
+@receiver(post_delete, sender=Token)
+def drop_cached_token(sender, instance, **kwargs):
+    token_cache.invalidate(token_cache.make_key(instance.key))
+    user_credentials_changed(instance.user_id)
+
+
+@receiver(post_save, sender=UserModel)
+def invalidate_cached_credentials(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    credential_cache.invalidate_user(instance.pk)
+    token_cache.invalidate_user(instance.pk)
+    user_credentials_changed(instance.pk)
+
+
+@receiver(post_delete, sender=UserModel)
+def drop_cached_credentials(sender, instance, **kwargs):
+    credential_cache.invalidate_user(instance.pk)
+    token_cache.invalidate_user(instance.pk)
+    user_credentials_changed(instance.pk)
@@ -1,20 +1,51 @@
 from django.contrib.auth import backends, get_user_model
-from django.db.models import Q
+from django.contrib.auth.hashers import check_password, make_password
+from django.db.models import Value
+from django.db.models.functions import Lower
+
+from paas.hashing import hashing_pool
 UserModel = get_user_model()
 
 
 class ModelEmailBackend(backends.ModelBackend):
+
+    def get_login_user(self, username=None, email=None):
+        """
+        Find the user by username or email, case-insensitively. Every lookup is served by an index:
+        the exact username first, then the LOWER(username) and LOWER(email) expression indexes.
+        """
+        lookups = []
+        if username:
+            lookups.append({'username': username})
+            lookups.append({'username__lower': Lower(Value(username))})
+            lookups.append({'email__lower': Lower(Value(username))})
+        if email:
+            lookups.append({'email__lower': Lower(Value(email))})
+
+        for lookup in lookups:
+            users = list(UserModel._default_manager.filter(**lookup)[:2])
+            if len(users) == 1:
+                return users[0]
+        return None
+
     def authenticate(self, request, username=None, email=None, password=None, **kwargs):
-        try:
-            user = UserModel.objects.get(Q(username__iexact=username) |
-                                         Q(email__iexact=email) |
-                                         Q(email__iexact=username))
-        except UserModel.DoesNotExist:
-            UserModel().set_password(password)
-        else:
-            if user.check_password(password) and self.user_can_authenticate(user):
-                return user
-        return super().authenticate(request, username, password, **kwargs)
+        """
+        Hashing runs on the login hashing pool, which raises HashingPoolSaturated when it is full.
+        """
+        user = self.get_login_user(username, email)
+        if user is None:
+            # Run the password hasher once to reduce the timing difference with existing users
+            hashing_pool.run(make_password, password)
+            return None
+        upgrade = []
+        if hashing_pool.run(check_password, password, user.password, upgrade.append) and \
+                self.user_can_authenticate(user):
+            if upgrade:
+                # The stored hash uses outdated parameters, save the password with the current ones
+                user.password = hashing_pool.run(make_password, password)
+                user.save(update_fields=['password'])
+            return user
+        return None
 
     def get_user(self, user_id):
         try:
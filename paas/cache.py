@@ -0,0 +1,155 @@
+import hashlib
+import json
+import math
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils import encoders
+
+from paas.db.routers import replica_in_use
+
+
+class ResponseCache(object):
+    """
+    Caches serialized resource responses in the PAAS_RESPONSE_CACHE cache alias.
+
+    Entries are tied to a generation counter per owner (and one for admin listings
+    across all owners). Any write to an owner's resources bumps that counter, which
+    makes every cached listing page and resource of the owner unreachable at once,
+    including after bulk operations that do not know the affected ids.
+    """
+    all_owners = 'all'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = Counter()
+        self.misses = Counter()
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'PAAS_RESPONSE_CACHE', 'default')]
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'PAAS_RESPONSE_CACHE_TTL', 300)
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def generation_key(self, scope):
+        return 'paas:gen:{}'.format(scope)
+
+    def generation(self, scope):
+        key = self.generation_key(scope)
+        value = self.cache.get(key)
+        if value is None:
+            # Start from the clock so an evicted counter never repeats an old value
+            self.cache.add(key, time.time_ns(), None)
+            value = self.cache.get(key)
+        return value
+
+    def bump(self, scopes):
+        for scope in scopes:
+            key = self.generation_key(scope)
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.set(key, time.time_ns(), None)
+
+    def invalidate_owners(self, owner_ids):
+        """
+        Invalidate cached responses of the given owners. Runs now and again on commit,
+        so readers that raced with the write cannot keep pre-commit data.
+        """
+        if not self.enabled:
+            return
+        scopes = [str(owner_id) for owner_id in set(owner_ids)] + [self.all_owners]
+        self.bump(scopes)
+        transaction.on_commit(lambda: self.bump(scopes))
+
+    def list_key(self, scope, uri):
+        digest = hashlib.md5(uri.encode('utf-8')).hexdigest()
+        return 'paas:list:{}:{}:{}'.format(scope, self.generation(scope), digest)
+
+    def resource_key(self, pk, fields=None):
+        if fields is not None:
+            return 'paas:resource:{}:{}'.format(pk, ','.join(fields))
+        return 'paas:resource:{}'.format(pk)
+
+    def get_list(self, key):
+        return self._count('list', self.cache.get(key) if self.enabled else None)
+
+    def get_resource(self, key):
+        entry = self.cache.get(key) if self.enabled else None
+        if entry is not None and entry['generation'] != self.generation(str(entry['owner_id'])):
+            entry = None
+        return self._count('resource', entry)
+
+    def set(self, key, data, etag=None, **extra):
+        if etag is None:
+            content = json.dumps(data, cls=encoders.JSONEncoder, sort_keys=True).encode('utf-8')
+            etag = '"{}"'.format(hashlib.md5(content).hexdigest())
+        # Rounded up: an entry rebuilt later in the same second is never older than a date sent for this one
+        entry = dict(extra, data=data, etag=etag, last_modified=math.ceil(time.time()))
+        # A lagging replica may return rows older than the current generation
+        if self.enabled and replica_in_use() is None:
+            self.cache.set(key, entry, self.ttl)
+        return entry
+
+    def respond(self, request, entry):
+        """
+        Build the response for a cache entry, or a 304 when the client's copy is current.
+        """
+        # Until the entry's second is over, claim the one before: an entry rebuilt
+        # within it would have the same date, so this one must not validate yet
+        last_modified = min(entry['last_modified'], int(time.time()))
+        headers = {
+            'ETag': entry['etag'],
+            'Last-Modified': http_date(last_modified),
+            'Cache-Control': 'private, no-cache',
+        }
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        if if_none_match is not None:
+            not_modified = entry['etag'] in [tag.strip() for tag in if_none_match.split(',')] or if_none_match == '*'
+        else:
+            not_modified = if_modified_since is not None and entry['last_modified'] <= if_modified_since
+        if not_modified:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(entry['data'], headers=headers)
+
+    def _count(self, kind, entry):
+        with self._lock:
+            if entry is None:
+                self.misses[kind] += 1
+            else:
+                self.hits[kind] += 1
+        return entry
+
+    def stats(self):
+        with self._lock:
+            kinds = set(self.hits) | set(self.misses)
+            return {
+                kind: {
+                    'hits': self.hits[kind],
+                    'misses': self.misses[kind],
+                    'hit_rate': self.hits[kind] / float(self.hits[kind] + self.misses[kind]),
+                }
+                for kind in kinds
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits.clear()
+            self.misses.clear()
+
+
+response_cache = ResponseCache()
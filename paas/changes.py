@@ -0,0 +1,62 @@
+import threading
+import time
+
+from django.db import connections
+from django.db import transaction
+from django.utils import timezone
+
+CREATED = 'created'
+UPDATED = 'updated'
+DELETED = 'deleted'
+
+_committed = threading.Condition()
+
+
+def record(resources, kind, using='default'):
+    """
+    Append a change of kind for each of resources to the ResourceChange log.
+    """
+    from paas.models import ResourceChange
+
+    ResourceChange.objects.using(using).bulk_create([
+        ResourceChange(resource_id=resource.pk, owner_id=resource.owner_id, kind=kind) for resource in resources
+    ])
+    transaction.on_commit(notify, using=using)
+
+
+def record_queryset(resources, kind):
+    """
+    Append a change of kind for every resource of the Resource queryset resources,
+    with one INSERT ... SELECT whatever their number.
+    """
+    from paas.models import ResourceChange
+
+    connection = connections[resources.db]
+    sql, params = resources.order_by().values('pk', 'owner_id').query.get_compiler(resources.db).as_sql()
+    created = connection.ops.adapt_datetimefield_value(timezone.now())
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'INSERT INTO {} (resource_id, owner_id, kind, created) SELECT changed.id, changed.owner_id, %s, %s '
+            'FROM ({}) changed'.format(ResourceChange._meta.db_table, sql),
+            (kind, created) + tuple(params))
+    transaction.on_commit(notify, using=resources.db)
+
+
+def notify():
+    with _committed:
+        _committed.notify_all()
+
+
+def wait_for_changes(fetch, timeout, poll_interval=1.0):
+    """
+    Call fetch until it returns changes or timeout seconds passed. Changes committed
+    by this process wake the wait at once; others are seen within poll_interval.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        changes = fetch()
+        remaining = deadline - time.monotonic()
+        if changes or remaining <= 0:
+            return changes
+        with _committed:
+            _committed.wait(min(remaining, poll_interval))
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core import checks
+
+# Cache alias settings whose cache every worker process has to share
+SHARED_CACHE_SETTINGS = ('PAAS_RESPONSE_CACHE', 'PAAS_DB_REPLICA_STICKY_CACHE', 'PAAS_THROTTLE_CACHE',
+                         'PAAS_AUTH_CHANGES_CACHE')
+PROCESS_LOCAL_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_caches(app_configs, **kwargs):
+    """
+    Warn when PAAS_WORKER_PROCESSES is more than one but a cache the processes
+    have to share lives in each process's memory: invalidations and limits would
+    then only apply to the process that made them.
+    """
+    if getattr(settings, 'PAAS_WORKER_PROCESSES', 1) <= 1:
+        return []
+    warnings = []
+    for setting in SHARED_CACHE_SETTINGS:
+        alias = getattr(settings, setting, 'default')
+        if settings.CACHES.get(alias, {}).get('BACKEND') in PROCESS_LOCAL_BACKENDS:
+            warnings.append(checks.Warning(
+                "{} is the '{}' cache, which each of the {} worker processes keeps in its own memory".format(
+                    setting, alias, settings.PAAS_WORKER_PROCESSES),
+                hint="Point it at a cache the processes share, such as memcached or redis.",
+                id='paas.W001',
+            ))
+    return warnings
@@ -0,0 +1,65 @@
+import time
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import DEFAULT_DB_ALIAS
+from django.db import connections
+from django.db import router
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """
+    Apply PAAS_SQLITE_PRAGMAS to every new SQLite connection.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'PAAS_SQLITE_PRAGMAS', {})
+    if pragmas:
+        with connection.cursor() as cursor:
+            for name, value in pragmas.items():
+                cursor.execute('PRAGMA {} = {}'.format(name, value))
+
+
+@receiver(request_started)
+def check_persistent_connections(sender, **kwargs):
+    """
+    Close persistent connections that stopped working, e.g. after a database
+    restart, so the request opens a fresh one instead of failing on its first
+    query. Each connection is checked at most every PAAS_DB_HEALTH_CHECK_INTERVAL seconds.
+    """
+    interval = getattr(settings, 'PAAS_DB_HEALTH_CHECK_INTERVAL', 30)
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block or not connection.settings_dict['CONN_MAX_AGE']:
+            continue
+        if now - getattr(connection, 'health_checked_at', 0) < interval:
+            continue
+        connection.health_checked_at = now
+        if not connection.is_usable():
+            connection.close()
+
+
+@receiver(post_migrate)
+def create_lower_indexes(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Create the LOWER(username) and LOWER(email) expression indexes of MyUser after
+    every migrate. Django 2.2 cannot declare them in Meta.indexes, so the migration
+    state does not know them and SQLite drops them whenever a migration rebuilds the table.
+    """
+    from paas.models import MyUser
+
+    connection = connections[using]
+    table = MyUser._meta.db_table
+    if sender.label != 'paas' or not router.allow_migrate_model(using, MyUser):
+        return
+    if table not in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        for column in ('username', 'email'):
+            cursor.execute('CREATE INDEX IF NOT EXISTS {} ON {} (LOWER({}))'.format(
+                connection.ops.quote_name('{}_{}_lower_idx'.format(table, column)), connection.ops.quote_name(table),
+                connection.ops.quote_name(column)))
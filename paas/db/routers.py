@@ -0,0 +1,186 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import request_finished
+from django.core.signals import request_started
+from django.db import DEFAULT_DB_ALIAS
+from django.db import connections
+from django.dispatch import receiver
+from rest_framework.permissions import SAFE_METHODS
+
+from paas.db.sharding import SHARDED_MODELS
+from paas.db.sharding import owner_shard
+from paas.db.sharding import shards
+from paas.db.sharding import sharding_enabled
+from paas.db.sharding import user_shard
+
+_routing = threading.local()
+
+
+def replicas():
+    return getattr(settings, 'PAAS_DB_REPLICAS', ())
+
+
+def use_replica():
+    """
+    Send the reads of the current request to one of the PAAS_DB_REPLICAS, until it finishes.
+    """
+    aliases = replicas()
+    _routing.alias = random.choice(aliases) if aliases else None
+
+
+def replica_in_use():
+    return getattr(_routing, 'alias', None)
+
+
+def use_shard(alias):
+    """
+    Send the sharded queries of the current request that carry no instance to route by to alias.
+    """
+    _routing.shard = alias
+
+
+def shard_in_use():
+    return getattr(_routing, 'shard', None)
+
+
+@receiver(request_started)
+@receiver(request_finished)
+def reset_routing(**kwargs):
+    _routing.alias = None
+    _routing.shard = None
+
+
+def sticky_key(user_id):
+    return 'paas:primary:{}'.format(user_id)
+
+
+def sticky_cache():
+    # Shared by every worker process, or a write would only stick the reads served by its own process
+    return caches[getattr(settings, 'PAAS_DB_REPLICA_STICKY_CACHE', 'default')]
+
+
+def stick_to_primary(user_id):
+    """
+    Read from the primary for the user for PAAS_DB_REPLICA_STICKY_SECONDS, so the
+    user sees its own writes while the replicas catch up.
+    """
+    seconds = getattr(settings, 'PAAS_DB_REPLICA_STICKY_SECONDS', 5)
+    if replicas() and seconds > 0:
+        sticky_cache().set(sticky_key(user_id), time.time() + seconds, seconds)
+
+
+def stuck_to_primary(user_id):
+    until = sticky_cache().get(sticky_key(user_id))
+    return until is not None and until > time.time()
+
+
+class ShardRouter(object):
+    """
+    Routes resources and their search index, payloads and change log to the shard
+    of their owner: by the instance a query is for when there is one, otherwise to
+    the shard the request chose with use_shard(). Leaves everything on the default
+    database to the routers after it.
+    """
+
+    def db_for_read(self, model, **hints):
+        return self.route(model, hints.get('instance'))
+
+    def db_for_write(self, model, **hints):
+        return self.route(model, hints.get('instance'))
+
+    def route(self, model, instance):
+        if model._meta.label_lower not in SHARDED_MODELS or not sharding_enabled():
+            return None
+        alias = None
+        if instance is not None:
+            if instance._meta.label_lower == 'paas.myuser':
+                alias = user_shard(instance)
+            elif instance._state.db in shards():
+                alias = instance._state.db
+            elif instance._meta.label_lower == 'paas.resource' and instance.owner_id is not None:
+                alias = owner_shard(instance.owner_id)
+        if alias is None:
+            alias = shard_in_use()
+        return None if alias == DEFAULT_DB_ALIAS else alias
+
+
+class ReplicaRouter(object):
+    """
+    Writes and migrations go to the primary. Reads go to a replica only within
+    requests that chose one with use_replica(), and never inside a transaction
+    on the primary, which has to see its own writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = replica_in_use()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db in replicas() else None
+
+
+class ReplicaReadMixin(object):
+    """
+    View mixin reading from a replica on safe requests, unless the user wrote
+    within the last PAAS_DB_REPLICA_STICKY_SECONDS. Authentication and throttling
+    run on the primary first.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super(ReplicaReadMixin, self).initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and replicas() and not stuck_to_primary(request.user.pk):
+            use_replica()
+
+
+class PrimaryAfterWriteMiddleware(object):
+    """
+    Sticks users that made a successful unsafe request to the primary for a short while.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in SAFE_METHODS and response.status_code < 400 and replicas():
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                stick_to_primary(user.pk)
+        return response
+
+
+class ShardRoutingMixin(object):
+    """
+    View mixin routing the request's resource queries to one shard: the user's own,
+    or for staff the one of ?owner_id=. Staff requests over all owners choose none;
+    such views query every shard get_fan_out_shards() lists.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super(ShardRoutingMixin, self).initial(request, *args, **kwargs)
+        if sharding_enabled():
+            use_shard(self.get_shard())
+
+    def get_shard(self):
+        if not self.request.user.is_staff:
+            return user_shard(self.request.user)
+        owner_id = self.request.query_params.get('owner_id')
+        return owner_shard(owner_id) if owner_id else None
+
+    def get_fan_out_shards(self):
+        if sharding_enabled() and shard_in_use() is None:
+            return list(shards())
+        return None
@@ -0,0 +1,291 @@
+import bisect
+import hashlib
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db import close_old_connections
+from django.db import transaction
+
+# Models whose rows live on the shard of the resource owner
+SHARDED_MODELS = {'paas.resource', 'paas.resourcepayload', 'paas.searchdocument', 'paas.searchtoken',
+                  'paas.resourcechange'}
+
+_pool_lock = threading.Lock()
+_pool = None
+
+
+def shards():
+    return getattr(settings, 'PAAS_SHARDS', ())
+
+
+def sharding_enabled():
+    return len(shards()) > 1
+
+
+def databases():
+    """
+    Every database holding resources: the shards, or the default database alone.
+    """
+    return list(shards()) or [DEFAULT_DB_ALIAS]
+
+
+class HashRing(object):
+    """
+    Consistent hashing of owner ids onto shard aliases. Every alias takes `points`
+    positions on the ring derived from its name alone, so the order of PAAS_SHARDS
+    does not matter and adding a shard only draws about 1/N of the owners to it.
+    """
+
+    def __init__(self, aliases, points=64):
+        ring = sorted((self.hash('{}#{}'.format(alias, point)), alias) for alias in aliases for point in range(points))
+        self.keys = [key for key, alias in ring]
+        self.aliases = [alias for key, alias in ring]
+
+    @staticmethod
+    def hash(value):
+        return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+    def lookup(self, owner_id):
+        index = bisect.bisect(self.keys, self.hash(uuid.UUID(str(owner_id)).hex))
+        return self.aliases[index % len(self.aliases)]
+
+
+@lru_cache(maxsize=8)
+def get_ring(aliases, points):
+    return HashRing(aliases, points)
+
+
+def ring_shard(owner_id):
+    """
+    The shard consistent hashing assigns owner_id to, where new owners are placed
+    and where `manage.py rebalance_shards` moves existing ones.
+    """
+    if not shards():
+        return DEFAULT_DB_ALIAS
+    return get_ring(tuple(sorted(shards())), getattr(settings, 'PAAS_SHARD_RING_POINTS', 64)).lookup(owner_id)
+
+
+def shard_alias(shard):
+    """
+    Database of a MyUser.shard value. Users placed before sharding was set up have
+    none and stay on the default database, like everyone while it is off.
+    """
+    return shard if shard and sharding_enabled() else DEFAULT_DB_ALIAS
+
+
+def user_shard(user):
+    return shard_alias(getattr(user, 'shard', ''))
+
+
+def owner_shard(owner_id):
+    from paas.models import MyUser
+
+    if not sharding_enabled():
+        return DEFAULT_DB_ALIAS
+    try:
+        uuid.UUID(str(owner_id))
+    except ValueError:
+        return DEFAULT_DB_ALIAS
+    return shard_alias(MyUser.objects.using(DEFAULT_DB_ALIAS).filter(pk=owner_id).values_list(
+        'shard', flat=True).first())
+
+
+def locate_resource(pk):
+    """
+    Shard holding the resource pk, asking all of them; the default database when none has it.
+    """
+    from paas.models import Resource
+
+    found = fan_out(lambda alias: Resource.objects.using(alias).filter(pk=pk).exists(), shards())
+    return next((alias for alias, exists in zip(shards(), found) if exists), DEFAULT_DB_ALIAS)
+
+
+def fan_out(func, items):
+    """
+    func(item) for every item, in parallel on PAAS_SHARD_FAN_OUT_THREADS threads
+    when there is more than one, with the results in the order of items.
+    """
+    global _pool
+    items = list(items)
+    if len(items) <= 1:
+        return [func(item) for item in items]
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=getattr(settings, 'PAAS_SHARD_FAN_OUT_THREADS', 8),
+                                       thread_name_prefix='paas-shards')
+    return list(_pool.map(lambda item: _run(func, item), items))
+
+
+def _run(func, item):
+    try:
+        return func(item)
+    finally:
+        # The connections the pool thread opened follow CONN_MAX_AGE like a request's
+        close_old_connections()
+
+
+@contextmanager
+def atomic(*aliases):
+    """
+    transaction.atomic() on each distinct database of aliases. Each commits on its
+    own; there is no transaction spanning databases.
+    """
+    with ExitStack() as stack:
+        for alias in dict.fromkeys(aliases):
+            stack.enter_context(transaction.atomic(using=alias))
+        yield
+
+
+def lock_owners(owner_ids):
+    """
+    The shards of the existing owners among owner_ids, read with their rows locked
+    until the end of the current transaction on the default database.
+    """
+    from paas.models import MyUser
+
+    owners = MyUser.objects.using(DEFAULT_DB_ALIAS).select_for_update().filter(pk__in=owner_ids)
+    return {pk: shard_alias(shard) for pk, shard in owners.values_list('pk', 'shard')}
+
+
+def lock_owner(owner_id):
+    """
+    lock_owners() for one owner, with no query while sharding is off.
+    """
+    if not sharding_enabled():
+        return DEFAULT_DB_ALIAS
+    return lock_owners([owner_id]).get(owner_id, DEFAULT_DB_ALIAS)
+
+
+@contextmanager
+def owner_write(owner_id):
+    """
+    Transaction for writing the resources of owner_id: on the default database with
+    the owner's row locked, and on the owner's shard, which it yields. move_owner()
+    switches shards under the same lock, so no write lands on the shard an owner left.
+    """
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        shard = lock_owner(owner_id)
+        with transaction.atomic(using=shard, savepoint=False):
+            yield shard
+
+
+def purge_resources(resources):
+    """
+    Delete the resources of a queryset with their search documents, but without
+    releasing quota or logging changes: for copies of resources that live on elsewhere.
+    """
+    from paas import search
+    from paas.models import SearchDocument
+
+    search.remove_documents(SearchDocument.objects.using(resources.db).filter(resource_id__in=resources.values('pk')))
+    return resources._raw_delete(resources.db)
+
+
+def copy_resources(pks, source, target):
+    """
+    Make the resources pks on target what they are on source: copied with their ids
+    and versions where the source has a newer version, or deleted when the source no
+    longer has them. Copies are not logged as changes on target, deletes are.
+    One transaction on target.
+    """
+    from paas import changes
+    from paas.models import Resource
+
+    resources = list(Resource.objects.using(source).filter(pk__in=pks))
+    with transaction.atomic(using=target):
+        versions = dict(Resource.objects.using(target).filter(pk__in=pks).values_list('pk', 'version'))
+        newer = [resource for resource in resources if resource.version > versions.get(resource.pk, 0)]
+        gone = set(versions) - {resource.pk for resource in resources}
+        if gone:
+            changes.record_queryset(Resource.objects.using(target).filter(pk__in=gone), changes.DELETED)
+        replaced = gone | {resource.pk for resource in newer if resource.pk in versions}
+        if replaced:
+            purge_resources(Resource.objects.using(target).filter(pk__in=replaced))
+        Resource.objects.using(target).bulk_create(newer, record_changes=False)
+
+
+def catch_up(owner_id, source, target, position, batch_size):
+    """
+    Copy the resources of owner_id changed on source after change id position.
+    Returns the id of the last change copied.
+    """
+    from paas.models import ResourceChange
+
+    while True:
+        changed = list(ResourceChange.objects.using(source).filter(owner_id=owner_id, id__gt=position).order_by(
+            'id').values_list('id', 'resource_id')[:batch_size])
+        if not changed:
+            return position
+        copy_resources({pk for change_id, pk in changed}, source, target)
+        position = changed[-1][0]
+
+
+def switch_owner(user, target, batch_size=1000):
+    """
+    Copy the resources of user to the target shard while they stay in use, and
+    switch MyUser.shard to it. The source rows stay until purge_owner().
+
+    Resources are copied in batches, then the changes made on the source in the
+    meantime, read from its change log. The last changes are copied holding the
+    owner's row lock, which every write to the owner's resources takes (owner_write()),
+    and MyUser.shard switches to the target under it: writes wait for the switch
+    and then go to the target. Returns the number of resources copied.
+    """
+    from paas.models import Resource, ResourceChange
+
+    source = user_shard(user)
+    position = ResourceChange.objects.using(source).filter(owner_id=user.pk).order_by('-id').values_list(
+        'id', flat=True).first() or 0
+    last_pk, moved = None, 0
+    while True:
+        resources = Resource.objects.using(source).filter(owner_id=user.pk).order_by('pk')
+        if last_pk is not None:
+            resources = resources.filter(pk__gt=last_pk)
+        pks = list(resources.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        copy_resources(pks, source, target)
+        last_pk = pks[-1]
+        moved += len(pks)
+    position = catch_up(user.pk, source, target, position, batch_size)
+
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        lock_owner(user.pk)
+        catch_up(user.pk, source, target, position, batch_size)
+        user.shard = target
+        user.save(update_fields=['shard'])
+    return moved
+
+
+def purge_owner(owner_id, source):
+    """
+    Delete the resources and change log of owner_id left on source by switch_owner(),
+    once no process reads them any more.
+    """
+    from paas.models import Resource, ResourceChange
+
+    with transaction.atomic(using=source):
+        purge_resources(Resource.objects.using(source).filter(owner_id=owner_id))
+        ResourceChange.objects.using(source).filter(owner_id=owner_id).delete()
+
+
+def move_owner(user, target, batch_size=1000, grace=0):
+    """
+    switch_owner(), then purge_owner() after grace seconds: long enough for processes
+    that hold the user with its old shard in an authentication cache to stop reading
+    from the source. Returns the number of resources moved.
+    """
+    source = user_shard(user)
+    if source == target:
+        return 0
+    moved = switch_owner(user, target, batch_size)
+    if grace:
+        time.sleep(grace)
+    purge_owner(user.pk, source)
+    return moved
@@ -0,0 +1,13 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite backend whose transactions start with BEGIN IMMEDIATE. A deferred
+    transaction that reads before it writes fails with "database is locked",
+    without waiting for the busy timeout, when another writer committed in the
+    meantime; taking the write lock up front makes concurrent writers queue instead.
+    """
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
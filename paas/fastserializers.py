@@ -0,0 +1,83 @@
+from functools import lru_cache
+
+from rest_framework import serializers
+
+
+def identity(value):
+    return value
+
+
+def get_converter(field):
+    """
+    The to_representation of field for a non-null database value, replaced by
+    the equivalent builtin for the common field types.
+    """
+    if type(field) is serializers.UUIDField and field.uuid_format == 'hex_verbose':
+        return str
+    if type(field) in (serializers.CharField, serializers.EmailField):
+        return str
+    if type(field) is serializers.IntegerField:
+        return int
+    if type(field) is serializers.PrimaryKeyRelatedField and field.pk_field is None:
+        return identity
+    if isinstance(field, (serializers.RelatedField, serializers.ManyRelatedField, serializers.SerializerMethodField)):
+        raise ValueError("Field {!r} cannot be compiled".format(field.field_name))
+    return field.to_representation
+
+
+class CompiledSerializer(object):
+    """
+    Read-only equivalent of a ModelSerializer that builds representations straight
+    from values() rows, skipping per-instance model and serializer field machinery.
+    Output matches the serializer's once rendered. Nested serializers are
+    followed through joins; fields that cannot be read from a single column,
+    like method fields or many-to-many relations, are not supported.
+    """
+
+    def __init__(self, serializer):
+        self.columns = []
+        self.plan = self.compile(serializer, '')
+
+    def compile(self, serializer, prefix):
+        plan = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if field.source == '*' or getattr(field, 'many', False):
+                raise ValueError("Field {!r} cannot be compiled".format(name))
+            path = prefix + field.source.replace('.', '__')
+            # For a nested serializer the column is the foreign key, None when there is no related row
+            self.columns.append(path)
+            if isinstance(field, serializers.BaseSerializer):
+                plan.append((name, path, None, self.compile(field, path + '__')))
+            else:
+                plan.append((name, path, get_converter(field), None))
+        return plan
+
+    def to_representation(self, row):
+        return build(row, self.plan)
+
+    def serialize(self, rows):
+        return [self.to_representation(row) for row in rows]
+
+
+def build(row, plan):
+    data = {}
+    for name, path, convert, nested in plan:
+        value = row[path]
+        if value is None:
+            data[name] = None
+        elif nested is not None:
+            data[name] = build(row, nested)
+        else:
+            data[name] = convert(value)
+    return data
+
+
+@lru_cache(maxsize=64)
+def compile_serializer(serializer_class, fields=None):
+    """
+    CompiledSerializer for serializer_class limited to fields (a tuple of names, as
+    for the sparse fieldset serializers). Compiled once per combination.
+    """
+    return CompiledSerializer(serializer_class(fields=fields))
@@ -0,0 +1,121 @@
+from rest_framework import serializers
+from rest_framework.compat import coreapi, coreschema
+from rest_framework.exceptions import ParseError
+from rest_framework.permissions import SAFE_METHODS
+
+
+class SparseFieldsetMixin(object):
+    """
+    View mixin for ?fields=a,b and ?exclude=c on reads. The serializer only outputs
+    the selected fields and the queryset only loads their columns (plus
+    `always_load`), so unselected large columns never leave the database.
+    """
+    fields_query_param = 'fields'
+    exclude_query_param = 'exclude'
+    # Model fields needed whatever is selected, e.g. for permissions or pagination
+    always_load = ('pk',)
+
+    def get_requested_names(self, param):
+        value = self.request.query_params.get(param)
+        if value is None:
+            return None
+        return {name.strip() for name in value.split(',') if name.strip()}
+
+    def get_sparse_fields(self, serializer_class=None):
+        """
+        Tuple of the selected serializer field names in declaration order, or None when
+        the request does not ask for a sparse fieldset.
+        """
+        # Schema generation inspects views without a request
+        if self.request is None or self.request.method not in SAFE_METHODS:
+            return None
+        cache = self.__dict__.setdefault('_sparse_fields', {})
+        if serializer_class not in cache:
+            cache[serializer_class] = self.select_fields(serializer_class)
+        return cache[serializer_class]
+
+    def select_fields(self, serializer_class):
+        requested = self.get_requested_names(self.fields_query_param)
+        excluded = self.get_requested_names(self.exclude_query_param) or set()
+        if requested is None and not excluded:
+            return None
+
+        available = [name for name, field in self.get_readable_fields(serializer_class).items()]
+        unknown = ((requested or set()) | excluded) - set(available)
+        if unknown:
+            raise ParseError("Unknown field(s): {}".format(', '.join(sorted(unknown))))
+        return tuple(name for name in available if (requested is None or name in requested) and name not in excluded)
+
+    def get_readable_fields(self, serializer_class=None):
+        serializer = (serializer_class or self.get_serializer_class())()
+        return {name: field for name, field in serializer.fields.items() if not field.write_only}
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_sparse_fields()
+        if fields is not None:
+            kwargs['fields'] = fields
+        return super().get_serializer(*args, **kwargs)
+
+    def project_queryset(self, queryset, serializer_class=None):
+        """
+        Restrict queryset to the columns of the sparse fieldset, following nested
+        serializers through select_related. Unchanged without a sparse fieldset.
+        """
+        fields = self.get_sparse_fields(serializer_class)
+        if fields is None:
+            return queryset
+        readable = self.get_readable_fields(serializer_class)
+        only = set(self.always_load)
+        related = []
+        for name in fields:
+            field = readable[name]
+            if isinstance(field, serializers.BaseSerializer):
+                related.append(field.source)
+                only.update('{}__{}'.format(field.source, child.source) for child in field.fields.values())
+            elif field.source != '*':
+                only.add(field.source.replace('.', '__'))
+        queryset = queryset.select_related(None)
+        if related:
+            queryset = queryset.select_related(*related)
+        return queryset.only(*only)
+
+    def get_queryset(self):
+        return self.project_queryset(super().get_queryset())
+
+
+class SparseFieldsetSerializerMixin(object):
+    """
+    Serializer taking a `fields` argument that limits the fields it has.
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class SparseFieldsetFilter(object):
+    """
+    Documents the sparse fieldset parameters in the API schema.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        return queryset
+
+    def get_schema_fields(self, view):
+        return [
+            coreapi.Field(
+                name=view.fields_query_param,
+                required=False,
+                location='query',
+                schema=coreschema.String(title='Fields', description='Comma separated fields to return.')
+            ),
+            coreapi.Field(
+                name=view.exclude_query_param,
+                required=False,
+                location='query',
+                schema=coreschema.String(title='Exclude', description='Comma separated fields to leave out.')
+            ),
+        ]
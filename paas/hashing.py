@@ -0,0 +1,47 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+
+class HashingPoolSaturated(Exception):
+    pass
+
+
+class HashingPool(object):
+    """
+    Runs password hashing on PAAS_LOGIN_HASHING_THREADS threads, so a burst of
+    logins cannot take more CPU than that. At most PAAS_LOGIN_QUEUE_DEPTH further
+    calls wait for a thread; beyond that `run` fails at once with HashingPoolSaturated.
+    PBKDF2 releases the GIL, so the threads hash in parallel.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self.pending = 0
+
+    @property
+    def workers(self):
+        return getattr(settings, 'PAAS_LOGIN_HASHING_THREADS', 4)
+
+    @property
+    def queue_depth(self):
+        return getattr(settings, 'PAAS_LOGIN_QUEUE_DEPTH', 16)
+
+    def run(self, func, *args):
+        with self._lock:
+            if self.pending >= self.workers + self.queue_depth:
+                raise HashingPoolSaturated()
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='paas-hashing')
+            self.pending += 1
+            executor = self._executor
+        try:
+            return executor.submit(func, *args).result()
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+
+hashing_pool = HashingPool()
@@ -0,0 +1,169 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import DEFAULT_DB_ALIAS
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.dispatch import receiver
+from django.utils import timezone
+
+from paas.db import sharding
+from paas.models import Job
+from paas.models import MyUser
+from paas.models import Resource
+
+logger = logging.getLogger(__name__)
+
+DELETE_USER = 'delete_user'
+
+
+def schedule_user_deletion(user):
+    """
+    Deactivate user and queue a job deleting the user's resources and then the user.
+    Returns the job, the one already queued when the deletion was scheduled before,
+    queued again if it failed.
+    """
+    with transaction.atomic():
+        user = MyUser.objects.select_for_update().get(pk=user.pk)
+        if user.pending_delete:
+            job = Job.objects.filter(kind=DELETE_USER, target_id=user.pk).latest('created')
+            if job.status == Job.FAILED:
+                # Resumes where it stopped: the batches done are gone
+                Job.objects.filter(pk=job.pk).update(status=Job.PENDING, error='', updated=timezone.now())
+                job.refresh_from_db()
+        else:
+            # Saving the user drops it from the credential and response caches
+            user.pending_delete, user.is_active = True, False
+            user.save(update_fields=['pending_delete', 'is_active'])
+            job = Job.objects.create(kind=DELETE_USER, target_id=user.pk, total=user.resource_count)
+        transaction.on_commit(start_worker)
+    return job
+
+
+def delete_user(job):
+    """
+    Delete the resources of the job's user in PAAS_JOB_BATCH_SIZE batches, one
+    transaction and no per-row signals each, recording progress after every batch.
+    Safe to resume after an interruption.
+    """
+    batch_size = getattr(settings, 'PAAS_JOB_BATCH_SIZE', 1000)
+    resources = Resource.objects.using(sharding.owner_shard(job.target_id))
+    while True:
+        with sharding.atomic(DEFAULT_DB_ALIAS, resources.db):
+            batch = list(resources.filter(owner_id=job.target_id).values_list('pk', flat=True)[:batch_size])
+            if batch:
+                resources.filter(pk__in=batch).delete_in_bulk()
+            Job.objects.filter(pk=job.pk).update(done=F('done') + len(batch), updated=timezone.now())
+        if len(batch) < batch_size:
+            break
+    with transaction.atomic():
+        MyUser.objects.filter(pk=job.target_id).delete()
+
+
+handlers = {
+    DELETE_USER: delete_user,
+}
+
+
+def stale_seconds():
+    return getattr(settings, 'PAAS_JOB_STALE_SECONDS', 300)
+
+
+def claim_job():
+    """
+    Take the oldest runnable job, including jobs whose worker stopped updating them
+    for PAAS_JOB_STALE_SECONDS. The conditional UPDATE makes sure only one worker gets it.
+    """
+    stale = timezone.now() - timedelta(seconds=stale_seconds())
+    runnable = Q(status=Job.PENDING) | Q(status=Job.RUNNING, updated__lt=stale)
+    for job in Job.objects.filter(runnable).order_by('created')[:10]:
+        claimed = Job.objects.filter(runnable, pk=job.pk).update(
+            status=Job.RUNNING, updated=timezone.now())
+        if claimed:
+            return job
+    return None
+
+
+def run_job(job):
+    try:
+        handlers[job.kind](job)
+    except Exception as exc:
+        logger.exception("Job %s failed", job.pk)
+        Job.objects.filter(pk=job.pk).update(status=Job.FAILED, error=str(exc), updated=timezone.now())
+    else:
+        Job.objects.filter(pk=job.pk).update(status=Job.DONE, updated=timezone.now())
+
+
+def run_pending_jobs():
+    """
+    Run jobs until none is left. Returns how many ran.
+    """
+    count = 0
+    while True:
+        job = claim_job()
+        if job is None:
+            return count
+        run_job(job)
+        count += 1
+
+
+_worker_lock = threading.Lock()
+_worker = None
+_wakeup = False
+_resumed_at = None
+
+
+def start_worker():
+    """
+    Make sure the in-process worker thread is running jobs, unless PAAS_JOB_WORKER
+    says jobs are left to `manage.py run_jobs`.
+    """
+    global _worker, _wakeup
+    if getattr(settings, 'PAAS_JOB_WORKER', 'thread') != 'thread':
+        return
+    with _worker_lock:
+        _wakeup = True
+        if _worker is None:
+            _worker = threading.Thread(target=_work, name='paas-jobs', daemon=True)
+            _worker.start()
+
+
+@receiver(request_started)
+def resume_jobs(sender, **kwargs):
+    """
+    Start the worker for the jobs nothing would start it for: queued before the
+    process started, or left running by a worker that stopped and taken over once
+    stale. Checked on the first request, then every PAAS_JOB_STALE_SECONDS; the
+    worker stops again at once when there is nothing to run.
+    """
+    global _resumed_at
+    now = time.monotonic()
+    with _worker_lock:
+        if _resumed_at is not None and now - _resumed_at < stale_seconds():
+            return
+        _resumed_at = now
+    start_worker()
+
+
+def _work():
+    global _worker, _wakeup
+    try:
+        while True:
+            with _worker_lock:
+                _wakeup = False
+            run_pending_jobs()
+            with _worker_lock:
+                # Jobs queued while running get picked up before the thread stops
+                if not _wakeup:
+                    _worker = None
+                    return
+    except Exception:
+        logger.exception("Job worker stopped")
+        with _worker_lock:
+            _worker = None
+    finally:
+        connection.close()
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db import models
+from django.db import transaction
+from django.db.models import Case, ExpressionWrapper, F, Value, When
+
+from paas import storage
+from paas.db import sharding
+from paas.models import Resource
+from paas.models import prune_resource_payloads
+
+
+class Command(BaseCommand):
+    help = ("Rewrite stored resource values in batches with the configured PAAS_RESOURCE_COMPRESSION "
+            "and PAAS_RESOURCE_DEDUPLICATION, which also decodes them again when both are off")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--prune', action='store_true',
+                            help="Afterwards delete payloads no resource refers to. Run it while resources "
+                                 "are not being written, a payload could be pruned just as it gets reused.")
+
+    def handle(self, *args, **options):
+        for alias in sharding.databases():
+            self.compact(alias, options['batch_size'])
+            if options['prune']:
+                with transaction.atomic(using=alias):
+                    pruned = prune_resource_payloads(alias)
+                self.stdout.write(self.label(alias) + "Pruned {} unused payload(s)".format(pruned))
+
+    def compact(self, alias, batch_size):
+        # The column as stored, bypassing StoredTextField's decoding
+        stored_value = ExpressionWrapper(F('resource_value'), output_field=models.TextField())
+        last_pk, scanned, rewritten = None, 0, 0
+        while True:
+            with transaction.atomic(using=alias):
+                rows = Resource.objects.using(alias).select_for_update().order_by('pk').annotate(stored=stored_value)
+                if last_pk is not None:
+                    rows = rows.filter(pk__gt=last_pk)
+                rows = list(rows.values_list('pk', 'stored')[:batch_size])
+                if not rows:
+                    break
+                last_pk = rows[-1][0]
+                scanned += len(rows)
+
+                changes, payloads = {}, []
+                for pk, stored in rows:
+                    target, payload = storage.encode(storage.decode(stored, alias))
+                    if target != stored:
+                        changes[pk] = When(pk=pk, then=Value(target, output_field=models.TextField()))
+                        if payload is not None:
+                            payloads.append(payload)
+                if changes:
+                    storage.save_payloads(payloads, alias)
+                    rewritten += Resource.objects.using(alias).filter(pk__in=changes).update(
+                        resource_value=Case(*changes.values(), output_field=models.TextField()))
+            self.stdout.write(self.label(alias) + "Scanned {} resource(s), rewrote {}".format(scanned, rewritten))
+
+    def label(self, alias):
+        return '{}: '.format(alias) if sharding.sharding_enabled() else ''
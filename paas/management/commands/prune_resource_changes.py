@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from paas.db import sharding
+from paas.models import ResourceChange
+
+
+class Command(BaseCommand):
+    help = ("Delete resource changes older than --days from the change feed log, in batches. "
+            "Feed cursors from before them are answered with 410 afterwards")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'PAAS_CHANGES_RETENTION_DAYS', 30))
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        for alias in sharding.databases():
+            changes = ResourceChange.objects.using(alias)
+            # The newest change to prune stays, marking where the retained log starts for the feed
+            keep = changes.filter(created__lt=cutoff).order_by('-id').values_list('id', flat=True).first()
+            pruned = 0
+            while keep is not None:
+                with transaction.atomic(using=alias):
+                    batch = changes.filter(id__lt=keep).order_by('id').values('id')[:options['batch_size']]
+                    deleted, per_model = changes.filter(id__in=batch).delete()
+                pruned += deleted
+                if deleted < options['batch_size']:
+                    break
+            self.stdout.write(self.label(alias) + "Pruned {} resource change(s)".format(pruned))
+
+    def label(self, alias):
+        return '{}: '.format(alias) if sharding.sharding_enabled() else ''
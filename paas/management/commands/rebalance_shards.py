@@ -0,0 +1,47 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from paas.db import sharding
+from paas.models import MyUser
+
+
+class Command(BaseCommand):
+    help = ("Move owners whose resources are not on the shard consistent hashing assigns them, "
+            "e.g. after adding a shard to PAAS_DB_SHARDS. Their resources stay readable and writable meanwhile")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--owner', action='append', help="Only move this user id, can be repeated")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--grace', type=float,
+                            default=max(getattr(settings, 'PAAS_AUTH_CACHE_TTL', 300),
+                                        getattr(settings, 'PAAS_TOKEN_CACHE_TTL', 60)),
+                            help="Seconds other processes may keep using an owner's old shard after it switched")
+        parser.add_argument('--dry-run', action='store_true', help="Only list the owners to move")
+
+    def handle(self, *args, **options):
+        if not sharding.sharding_enabled():
+            raise CommandError("Sharding is off, set PAAS_DB_SHARDS first")
+        users = MyUser.objects.order_by('pk').only('pk', 'shard')
+        if options['owner']:
+            users = users.filter(pk__in=options['owner'])
+        switched = []
+        for user in users.iterator():
+            source, target = sharding.user_shard(user), sharding.ring_shard(user.pk)
+            if source == target:
+                continue
+            self.stdout.write("{}: {} -> {}".format(user.pk, source, target))
+            if not options['dry_run']:
+                count = sharding.switch_owner(user, target, options['batch_size'])
+                self.stdout.write("Moved {} resource(s)".format(count))
+            switched.append((user.pk, source))
+        if switched and not options['dry_run']:
+            # One grace period for all the owners moved, then their old copies go
+            if options['grace']:
+                self.stdout.write("Deleting the old copies in {} s".format(options['grace']))
+                time.sleep(options['grace'])
+            for owner_id, source in switched:
+                sharding.purge_owner(owner_id, source)
+        self.stdout.write("{} owner(s) {}".format(len(switched), "to move" if options['dry_run'] else "moved"))
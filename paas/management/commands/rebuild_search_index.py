@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from paas import search
+from paas.db import sharding
+from paas.models import Resource
+
+
+class Command(BaseCommand):
+    help = ("Rebuild the search index from the Resource table, e.g. after changing PAAS_SEARCH_BACKEND "
+            "or writing resource values with update()")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for alias in sharding.databases():
+            self.rebuild(alias, options['batch_size'])
+
+    def rebuild(self, alias, batch_size):
+        with transaction.atomic(using=alias):
+            search.clear_index(alias)
+        last_pk, indexed = None, 0
+        while True:
+            with transaction.atomic(using=alias):
+                resources = Resource.objects.using(alias).order_by('pk').only('pk', 'owner', 'resource_value')
+                if last_pk is not None:
+                    resources = resources.filter(pk__gt=last_pk)
+                resources = list(resources[:batch_size])
+                if not resources:
+                    break
+                last_pk = resources[-1].pk
+                search.index_resources(resources, alias, replace=False)
+                indexed += len(resources)
+            self.stdout.write(self.label(alias) + "Indexed {} resource(s)".format(indexed))
+
+    def label(self, alias):
+        return '{}: '.format(alias) if sharding.sharding_enabled() else ''
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from paas.models import reconcile_resource_counts
+
+
+class Command(BaseCommand):
+    help = "Recompute every user's resource_count and quota_left from the Resource table"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drifted = reconcile_resource_counts()
+        self.stdout.write("Reconciled resource counts, {} user(s) had drifted".format(drifted))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from paas.jobs import run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs, for deployments setting PAAS_JOB_WORKER to None"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Exit once no job is left")
+        parser.add_argument('--interval', type=float, default=5, help="Seconds between polls for new jobs")
+
+    def handle(self, *args, **options):
+        while True:
+            count = run_pending_jobs()
+            if count:
+                self.stdout.write("Ran {} job(s)".format(count))
+            if options['once']:
+                return
+            time.sleep(options['interval'])
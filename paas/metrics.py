@@ -0,0 +1,142 @@
+import bisect
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+_local = threading.local()
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram(object):
+    """
+    Cumulative histogram in the Prometheus sense. Not thread-safe, the registry locks around it.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            lines.append('{}_bucket{{{},le="{}"}} {}'.format(name, labels, bound, cumulative))
+        lines.append('{}_sum{{{}}} {}'.format(name, labels, self.sum))
+        lines.append('{}_count{{{}}} {}'.format(name, labels, self.count))
+        return lines
+
+
+class RequestMetrics(object):
+    """
+    What a single sampled request did: its DB queries and named timing spans.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.spans = defaultdict(float)
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+    def server_timing(self, total):
+        entries = ['total;dur={:.2f}'.format(total * 1000),
+                   'db;dur={:.2f};desc="{} queries"'.format(self.db_time * 1000, self.queries)]
+        for name, duration in sorted(self.spans.items()):
+            entries.append('{};dur={:.2f}'.format(name, duration * 1000))
+        return ', '.join(entries)
+
+
+class MetricsRegistry(object):
+    """
+    Per URL name aggregates of sampled requests, exported in the Prometheus text format.
+    """
+    histograms = (
+        ('paas_request_duration_seconds', 'Wall time of the request', DURATION_BUCKETS),
+        ('paas_request_db_queries', 'Database queries per request', QUERY_BUCKETS),
+        ('paas_request_db_duration_seconds', 'Time spent in database queries', DURATION_BUCKETS),
+        ('paas_request_serializer_duration_seconds', 'Time spent serializing', DURATION_BUCKETS),
+        ('paas_response_size_bytes', 'Response body size', SIZE_BUCKETS),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+            self._requests = defaultdict(int)
+
+    def observe(self, url_name, method, status_code, values):
+        with self._lock:
+            self._requests[(url_name, method, status_code)] += 1
+            for (name, help_text, buckets), value in zip(self.histograms, values):
+                histogram = self._histograms.get((name, url_name))
+                if histogram is None:
+                    histogram = self._histograms[(name, url_name)] = Histogram(buckets)
+                histogram.observe(value)
+
+    def render(self, extra=()):
+        """
+        Prometheus text exposition of all metrics, followed by the `extra` lines.
+        """
+        with self._lock:
+            lines = ['# HELP paas_requests_total Sampled requests',
+                     '# TYPE paas_requests_total counter']
+            for (url_name, method, status_code), count in sorted(self._requests.items()):
+                lines.append('paas_requests_total{{url_name="{}",method="{}",status="{}"}} {}'.format(
+                    url_name, method, status_code, count))
+            for name, help_text, buckets in self.histograms:
+                lines.append('# HELP {} {}'.format(name, help_text))
+                lines.append('# TYPE {} histogram'.format(name))
+                for (histogram_name, url_name), histogram in sorted(self._histograms.items()):
+                    if histogram_name == name:
+                        lines.extend(histogram.render(name, 'url_name="{}"'.format(url_name)))
+        lines.extend(extra)
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def current():
+    return getattr(_local, 'metrics', None)
+
+
+def activate(metrics):
+    _local.metrics = metrics
+
+
+@contextmanager
+def span(name):
+    """
+    Time a block under `name` in the current request's metrics; does nothing when it is not sampled.
+    """
+    metrics = current()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.spans[name] += time.perf_counter() - start
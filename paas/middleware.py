@@ -0,0 +1,75 @@
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+from paas import metrics
+from paas.hashing import HashingPoolSaturated
+
+
+class RequestMetricsMiddleware(object):
+    """
+    Records wall time, DB query count and time, serializer time and response size
+    for a PAAS_METRICS_SAMPLE_RATE share of requests, aggregated per URL name in
+    `metrics.registry`. Sampled responses to admins get a Server-Timing header;
+    others only with PAAS_METRICS_SERVER_TIMING = True, timings telling about logins and lookups.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sample_rate = getattr(settings, 'PAAS_METRICS_SAMPLE_RATE', 0)
+        if sample_rate <= 0 or (sample_rate < 1 and random.random() >= sample_rate):
+            return self.get_response(request)
+
+        request_metrics = metrics.RequestMetrics()
+        metrics.activate(request_metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(request_metrics.record_query))
+                response = self.get_response(request)
+        finally:
+            metrics.activate(None)
+        total = time.perf_counter() - request_metrics.start
+
+        size = 0 if response.streaming else len(response.content)
+        if self.shows_server_timing(request):
+            response['Server-Timing'] = request_metrics.server_timing(total)
+        match = request.resolver_match
+        url_name = match.url_name if match is not None and match.url_name else 'unmatched'
+        metrics.registry.observe(url_name, request.method, response.status_code, (
+            total, request_metrics.queries, request_metrics.db_time,
+            request_metrics.spans.get('serialize', 0.0), size,
+        ))
+        return response
+
+    def shows_server_timing(self, request):
+        server_timing = getattr(settings, 'PAAS_METRICS_SERVER_TIMING', 'staff')
+        if server_timing == 'staff':
+            user = getattr(request, 'user', None)
+            return user is not None and user.is_authenticated and user.is_staff
+        return bool(server_timing)
+
+
+class HashingPoolSaturatedMiddleware(object):
+    """
+    Answers 429 when the login hashing pool is full for views that authenticate
+    outside the API, like the admin login; API views turn it into Throttled themselves.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, HashingPoolSaturated):
+            return HttpResponse("Too many logins in progress, try again shortly", status=429,
+                                content_type='text/plain')
+        return None
@@ -0,0 +1,17 @@
+# Generated by Django 2.2 on 2026-10-18 07:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paas', '0003_myuser_quota_left'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['owner', 'id'], name='paas_resource_owner_id_idx'),
+        ),
+    ]
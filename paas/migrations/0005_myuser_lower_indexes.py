@@ -0,0 +1,21 @@
+# Generated by Django 2.2 on 2026-10-18 08:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paas', '0004_resource_owner_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX paas_myuser_username_lower_idx ON paas_myuser (LOWER(username));',
+            'DROP INDEX paas_myuser_username_lower_idx;',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX paas_myuser_email_lower_idx ON paas_myuser (LOWER(email));',
+            'DROP INDEX paas_myuser_email_lower_idx;',
+        ),
+    ]
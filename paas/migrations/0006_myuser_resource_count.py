@@ -0,0 +1,29 @@
+# Generated by Django 2.2 on 2026-10-18 08:11
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_resource_count(apps, schema_editor):
+    MyUser = apps.get_model('paas', 'MyUser')
+    Resource = apps.get_model('paas', 'Resource')
+    counts = Resource.objects.filter(owner=OuterRef('pk')).order_by().values('owner').annotate(
+        count=Count('id')).values('count')
+    MyUser.objects.update(resource_count=Coalesce(Subquery(counts, output_field=models.IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paas', '0005_myuser_lower_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='myuser',
+            name='resource_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_resource_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 2.2 on 2026-10-18 08:22
+
+from django.db import migrations, models
+import paas.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paas', '0006_myuser_resource_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourcePayload',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('value', models.TextField()),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='resource',
+            name='resource_value',
+            field=paas.storage.StoredTextField(),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 2.2 on 2026-10-18 08:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_fts_table(apps, schema_editor):
+    # Without FTS5 the search index is kept in SearchToken rows instead
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        if cursor.fetchone()[0]:
+            cursor.execute("CREATE VIRTUAL TABLE paas_search_fts USING fts5(body, prefix='2 3')")
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS paas_search_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paas', '0008_job_myuser_pending_delete'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource_id', models.UUIDField(unique=True)),
+                ('owner_id', models.UUIDField(db_index=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+                ('count', models.IntegerField()),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='paas.SearchDocument')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='searchtoken',
+            index=models.Index(fields=['token', 'document'], name='paas_searchtoken_token_idx'),
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2 on 2026-10-18 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paas', '0009_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resource',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
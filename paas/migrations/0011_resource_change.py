@@ -0,0 +1,28 @@
+# Generated by Django 2.2 on 2026-10-18 08:59
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paas', '0010_resource_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourceChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource_id', models.UUIDField()),
+                ('owner_id', models.UUIDField()),
+                ('kind', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('deleted', 'Deleted')], max_length=10)),
+                ('created', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='resourcechange',
+            index=models.Index(fields=['owner_id', 'id'], name='paas_change_owner_id_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 2.2 on 2026-10-18 09:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paas', '0011_resource_change'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='myuser',
+            name='shard',
+            field=models.CharField(blank=True, default='', editable=False, max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='resource',
+            name='owner',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
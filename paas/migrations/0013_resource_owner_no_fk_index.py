@@ -0,0 +1,20 @@
+# Generated by Django 2.2 on 2026-10-18 10:09
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paas', '0012_sharding'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='resource',
+            name='owner',
+            field=models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -3,33 +3,320 @@ from django.contrib.auth.models import AbstractUser
 import uuid
 
 from django.dispatch import receiver
-from django.db.models.signals import post_delete, post_save
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, When
+from django.db.models.functions import Coalesce, Lower, Substr
+from django.db import DEFAULT_DB_ALIAS
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.utils import timezone
+
+from paas import changes
+from paas import search
+from paas import storage
+from paas.cache import response_cache
+from paas.db import sharding
+
+# Enables username__lower / email__lower lookups, served by the LOWER() expression indexes
+models.CharField.register_lookup(Lower)
 
 
 class MyUser(AbstractUser):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     quota = models.IntegerField(null=True, blank=True)
     quota_left = models.IntegerField(null=True, blank=True)
+    resource_count = models.IntegerField(default=0, editable=False)
+    # Set while a background job deletes the user's resources; the user is deactivated meanwhile
+    pending_delete = models.BooleanField(default=False, editable=False)
+    # Database alias holding the user's resources, the shard map; blank for the default database
+    shard = models.CharField(max_length=50, blank=True, default='', editable=False)
+
+
+class ResourceQuerySet(models.QuerySet):
+    """
+    Keeps the search index and the change log in step with bulk writes, and saves the
+    payloads of deduplicated values before any write. Values written with update() are
+    neither indexed nor logged; run `manage.py rebuild_search_index` after such changes.
+    """
+
+    def create(self, **kwargs):
+        # Without using() the instance is saved to the shard of its owner rather than of the request
+        obj = self.model(**kwargs)
+        self._for_write = True
+        obj.save(force_insert=True, using=self._db)
+        return obj
+
+    def bulk_create(self, objs, *args, record_changes=True, **kwargs):
+        objs = list(objs)
+        storage.save_text_payloads([obj.resource_value for obj in objs], self.db)
+        objs = super(ResourceQuerySet, self).bulk_create(objs, *args, **kwargs)
+        search.index_resources(objs, self.db, replace=False)
+        if record_changes:
+            changes.record(objs, changes.CREATED, self.db)
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if 'resource_value' in fields:
+            objs = list(objs)
+            storage.save_text_payloads([obj.resource_value for obj in objs], self.db)
+        super(ResourceQuerySet, self).bulk_update(objs, fields, *args, **kwargs)
+        if {'resource_value', 'owner'} & set(fields):
+            search.index_resources(objs, self.db)
+        changes.record(objs, changes.UPDATED, self.db)
+
+    def update(self, **kwargs):
+        storage.save_text_payloads([kwargs.get('resource_value')], self.db)
+        return super(ResourceQuerySet, self).update(**kwargs)
+
+    def delete_in_bulk(self):
+        """
+        Delete the matched resources in one statement without per-row signals,
+        releasing quota once per owner. Should be called inside a transaction.
+        """
+        per_owner = list(self.order_by().values_list('owner_id').annotate(models.Count('id')))
+        search.remove_documents(SearchDocument.objects.using(self.db).filter(resource_id__in=self.values('pk')))
+        changes.record_queryset(self, changes.DELETED)
+        deleted = self._raw_delete(self.db)
+        for owner_id, count in per_owner:
+            release_quota(owner_id, count)
+        response_cache.invalidate_owners(owner_id for owner_id, count in per_owner)
+        return deleted
 
 
 class Resource(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    owner = models.ForeignKey(MyUser, on_delete=models.CASCADE)
-    resource_value = models.TextField()
+    # Without a constraint, as the owner row stays on the default database when the resource is on a shard
+    owner = models.ForeignKey(MyUser, on_delete=models.CASCADE, db_constraint=False, db_index=False)
+    resource_value = storage.StoredTextField()
+    # Bumped by every update through the API, the ETag of the resource
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    objects = ResourceQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'id'], name='paas_resource_owner_id_idx'),
+        ]
 
     def __str__(self):
-        return "{} - {}".format(self.owner.username, self.resource_value[:50])
+        return "{} - {}".format(self.owner_id, self.resource_value[:50])
 
 
-@receiver(post_save, sender=Resource)
-def update_user_quota(sender, instance, created, *args, **kwargs):
-    if created and instance.owner.quota:
-        instance.owner.quota_left -= 1
-        instance.owner.save()
+class ResourcePayload(models.Model):
+    """
+    A resource value stored once for every resource holding the same text,
+    addressed by the SHA-256 of the text.
+    """
+    digest = models.CharField(primary_key=True, max_length=64)
+    value = models.TextField()
+
+
+class SearchDocument(models.Model):
+    """
+    A resource in the search index of paas.search. Its id is the rowid of the
+    resource's text in the FTS5 table, or the document of its SearchTokens.
+    """
+    resource_id = models.UUIDField(unique=True)
+    owner_id = models.UUIDField(db_index=True)
+
+
+class SearchToken(models.Model):
+    """
+    Occurrences of a token in a document, the search index where FTS5 is not available.
+    """
+    document = models.ForeignKey(SearchDocument, on_delete=models.CASCADE)
+    token = models.CharField(max_length=search.TOKEN_MAX_LENGTH)
+    count = models.IntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['token', 'document'], name='paas_searchtoken_token_idx'),
+        ]
+
+
+class ResourceChange(models.Model):
+    """
+    Append-only log of resource creates, updates and deletes, read by the change feed.
+    The id is the feed's cursor.
+    """
+    KIND_CHOICES = ((changes.CREATED, 'Created'), (changes.UPDATED, 'Updated'), (changes.DELETED, 'Deleted'))
+
+    resource_id = models.UUIDField()
+    owner_id = models.UUIDField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    created = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner_id', 'id'], name='paas_change_owner_id_idx'),
+        ]
+
+
+class Job(models.Model):
+    """
+    Background job run by the worker in paas.jobs, with its progress.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = ((PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed'))
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=50)
+    target_id = models.UUIDField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    total = models.IntegerField(default=0)
+    done = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'updated'], name='paas_job_status_idx'),
+        ]
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+def reserve_quota(owner_id, count=1):
+    """
+    Count count new resources against the owner with a single conditional UPDATE,
+    taking them from quota_left when the owner has a quota.
+    Returns False when the owner has a quota and not enough of it is left.
+    """
+    updated = MyUser.objects.filter(Q(quota__isnull=True) | Q(quota_left__gte=count), pk=owner_id).update(
+        resource_count=F('resource_count') + count,
+        quota_left=Case(When(quota__isnull=True, then=F('quota_left')), default=F('quota_left') - count),
+    )
+    # An unknown owner is left for the foreign key to reject
+    return bool(updated) or not MyUser.objects.filter(pk=owner_id).exists()
+
+
+def release_quota(owner_id, count=1):
+    MyUser.objects.filter(pk=owner_id).update(
+        resource_count=F('resource_count') - count,
+        quota_left=Case(When(quota__isnull=True, then=F('quota_left')), default=F('quota_left') + count),
+    )
+
+
+def reconcile_resource_counts():
+    """
+    Recompute resource_count and quota_left of every user from the Resource table
+    in one UPDATE with a grouped subquery. Returns the number of users that had drifted.
+    """
+    if sharding.sharding_enabled():
+        return reconcile_sharded_resource_counts()
+    actual = Coalesce(Subquery(
+        Resource.objects.filter(owner=OuterRef('pk')).order_by().values('owner').annotate(
+            count=Count('id')).values('count'),
+        output_field=models.IntegerField()), 0)
+    drifted = MyUser.objects.annotate(actual=actual).filter(
+        ~Q(resource_count=F('actual')) | Q(quota__isnull=False) & ~Q(quota_left=F('quota') - F('actual'))).count()
+    MyUser.objects.update(
+        resource_count=actual,
+        quota_left=Case(When(quota__isnull=True, then=F('quota_left')), default=F('quota') - actual),
+    )
+    return drifted
+
+
+def reconcile_sharded_resource_counts():
+    """
+    reconcile_resource_counts() across shards: resources are counted per owner on
+    every shard, and each user gets the count of its own shard. Copies left behind
+    by an interrupted move do not count. Returns the number of users that had drifted.
+    """
+    counts = sharding.fan_out(
+        lambda alias: dict(Resource.objects.using(alias).order_by().values_list('owner').annotate(Count('id'))),
+        sharding.databases())
+    actual = dict(zip(sharding.databases(), counts))
+    drifted = []
+    for user in MyUser.objects.only('pk', 'shard', 'resource_count', 'quota', 'quota_left').iterator():
+        count = actual.get(sharding.user_shard(user), {}).get(user.pk, 0)
+        quota_left = user.quota_left if user.quota is None else user.quota - count
+        if (user.resource_count, user.quota_left) != (count, quota_left):
+            user.resource_count, user.quota_left = count, quota_left
+            drifted.append(user)
+    MyUser.objects.bulk_update(drifted, ['resource_count', 'quota_left'], batch_size=1000)
+    return len(drifted)
+
+
+def prune_resource_payloads(using='default'):
+    """
+    Delete the payloads no resource refers to anymore. Returns how many were deleted.
+    """
+    prefix = '{}{}:'.format(storage.MARKER, storage.REFERENCE)
+    referenced = Resource.objects.using(using).filter(resource_value__startswith=prefix).annotate(
+        digest=Substr('resource_value', len(prefix) + 1)).values('digest')
+    deleted, per_model = ResourcePayload.objects.using(using).exclude(digest__in=referenced).delete()
+    return deleted
+
+
+@receiver(pre_save, sender=Resource)
+def update_user_quota(sender, instance, *args, **kwargs):
+    if instance._state.adding and not reserve_quota(instance.owner_id):
+        raise QuotaExceeded()
+
+
+@receiver(pre_save, sender=Resource)
+def save_resource_payload(sender, instance, using, update_fields=None, **kwargs):
+    if update_fields is None or 'resource_value' in update_fields:
+        storage.save_text_payloads([instance.resource_value], using)
 
 
 @receiver(post_delete, sender=Resource)
 def quota_left_add(sender, instance, *args, **kwargs):
-    if instance.owner.quota:
-        instance.owner.quota_left += 1
-        instance.owner.save()
\ No newline at end of file
+    release_quota(instance.owner_id)
+
+
+@receiver(post_save, sender=Resource)
+@receiver(post_delete, sender=Resource)
+def invalidate_resource_responses(sender, instance, *args, **kwargs):
+    response_cache.invalidate_owners([instance.owner_id])
+
+
+@receiver(post_save, sender=Resource)
+def index_resource(sender, instance, created=False, update_fields=None, using='default', **kwargs):
+    if update_fields is None or {'resource_value', 'owner'} & set(update_fields):
+        search.index_resources([instance], using, replace=not created)
+
+
+@receiver(post_delete, sender=Resource)
+def unindex_resource(sender, instance, using='default', **kwargs):
+    search.remove_resources([instance.pk], using)
+
+
+@receiver(post_save, sender=Resource)
+def log_saved_resource(sender, instance, created=False, using='default', **kwargs):
+    changes.record([instance], changes.CREATED if created else changes.UPDATED, using)
+
+
+# Also reached for each resource of a deleted user, through the cascade
+@receiver(post_delete, sender=Resource)
+def log_deleted_resource(sender, instance, using='default', **kwargs):
+    changes.record([instance], changes.DELETED, using)
+
+
+@receiver(pre_save, sender=MyUser)
+def place_user(sender, instance, **kwargs):
+    if instance._state.adding and not instance.shard and sharding.sharding_enabled():
+        instance.shard = sharding.ring_shard(instance.pk)
+
+
+@receiver(pre_delete, sender=MyUser)
+def delete_sharded_resources(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    # The cascade only reaches the resources on the user's own database
+    shard = sharding.user_shard(instance)
+    if shard != using:
+        with transaction.atomic(using=shard):
+            Resource.objects.using(shard).filter(owner_id=instance.pk).delete_in_bulk()
+
+
+@receiver(post_save, sender=MyUser)
+@receiver(post_delete, sender=MyUser)
+def invalidate_owner_responses(sender, instance, update_fields=None, *args, **kwargs):
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    response_cache.invalidate_owners([instance.pk])
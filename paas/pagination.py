@@ -0,0 +1,270 @@
+import itertools
+import json
+import uuid
+from datetime import timedelta
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.compat import coreapi, coreschema
+from rest_framework.exceptions import APIException
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from paas import changes
+from paas.db.sharding import fan_out
+
+
+class OwnerKeysetPagination(BasePagination):
+    """
+    Keyset pagination over (owner_id, id), served by the composite index on Resource.
+    Cost of a page does not depend on how deep into the listing it is.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        page_size = getattr(settings, 'PAAS_PAGE_SIZE', 100)
+        max_page_size = getattr(settings, 'PAAS_MAX_PAGE_SIZE', 1000)
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            requested = page_size
+        if requested <= 0:
+            requested = page_size
+        return min(requested, max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(urlsafe_b64decode(encoded.encode('ascii')).decode('ascii'))
+            return uuid.UUID(position['o']), uuid.UUID(position['i'])
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, owner_id, pk):
+        position = json.dumps({'o': str(owner_id), 'i': str(pk)}, separators=(',', ':'))
+        return urlsafe_b64encode(position.encode('ascii')).decode('ascii')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.paginate_querysets([queryset], request)
+
+    def paginate_querysets(self, querysets, request):
+        """
+        One page over the union of querysets, e.g. the same listing on every shard:
+        each is read up to the page in parallel and the results merged.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+        pages = fan_out(lambda queryset: list(self.seek(queryset, position)[:self.page_size + 1]), querysets)
+        if len(pages) > 1:
+            pages = [sorted(itertools.chain(*pages), key=self.get_position)[:self.page_size + 1]]
+        page = pages[0]
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.last_position = self.get_position(page[-1]) if page else None
+        return page
+
+    def seek(self, queryset, position):
+        queryset = queryset.order_by('owner_id', 'id')
+        if position is not None:
+            owner_id, pk = position
+            # The leading owner_id >= bound lets the index seek straight to the cursor.
+            queryset = queryset.filter(Q(owner_id__gte=owner_id),
+                                       Q(owner_id__gt=owner_id) | Q(id__gt=pk))
+        return queryset
+
+    def get_position(self, item):
+        # Pages of values() querysets hold dicts
+        if isinstance(item, dict):
+            return item['owner'], item['id']
+        return item.owner_id, item.id
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(*self.last_position))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_schema_fields(self, view):
+        return [
+            coreapi.Field(
+                name=self.cursor_query_param,
+                required=False,
+                location='query',
+                schema=coreschema.String(title='Cursor', description='The pagination cursor value.')
+            ),
+            coreapi.Field(
+                name=self.page_size_query_param,
+                required=False,
+                location='query',
+                schema=coreschema.Integer(title='Page size', description='Number of results to return per page.')
+            ),
+        ]
+
+
+class SearchPagination(OwnerKeysetPagination):
+    """
+    Keyset pagination over the (score, id) ranking of paas.search results.
+    """
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(urlsafe_b64decode(encoded.encode('ascii')).decode('ascii'))
+            return float(position['s']), uuid.UUID(position['i'])
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, score, pk):
+        position = json.dumps({'s': score, 'i': str(pk)}, separators=(',', ':'))
+        return urlsafe_b64encode(position.encode('ascii')).decode('ascii')
+
+    def paginate_search(self, search, request):
+        """
+        Page of (score, id) pairs; search is called with the position to start after and a limit.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        page = search(after=self.decode_cursor(request), limit=self.page_size + 1)
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.last_position = page[-1] if page else None
+        return page
+
+
+class ChangesPruned(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'Changes after this cursor were pruned from the log, sync from a full listing.'
+    default_code = 'changes_pruned'
+
+
+class ChangeFeedPagination(OwnerKeysetPagination):
+    """
+    Pages of the ResourceChange log in id order after the ?since= change id, which
+    the index on (owner_id, id) serves per owner. ?since=latest starts at the head of
+    the log, skipping every change made so far. Ids of the logs of other shards than
+    the default database are given as "<shard>:<id>".
+
+    Ids only become visible in commit order while writers are serialized, as on
+    SQLite. Elsewhere a change may commit after a higher id was handed out, so the
+    cursor stays before the changes younger than PAAS_CHANGES_SETTLE_SECONDS and
+    they come again on the next page, which clients skip by id: the cursor is then
+    "<settled id>.<last id handed out>", and ?wait= waits for changes after the latter.
+    """
+    cursor_query_param = 'since'
+    latest = 'latest'
+
+    def decode_cursor(self, request):
+        """
+        The (settled, last handed out) change ids of the cursor, or None for latest.
+        """
+        since = request.query_params.get(self.cursor_query_param)
+        if not since:
+            return 0, 0
+        if since == self.latest:
+            return None
+        shard, separator, since = since.rpartition(':')
+        if (shard if separator else DEFAULT_DB_ALIAS) != self.shard:
+            raise ChangesPruned('The resources moved to another shard after this cursor, sync from a full listing.')
+        settled, separator, seen = since.partition('.')
+        try:
+            settled, seen = int(settled), int(seen or settled)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not 0 <= settled <= seen:
+            raise NotFound(self.invalid_cursor_message)
+        return settled, seen
+
+    def encode_cursor(self, position):
+        settled, seen = position
+        since = settled if seen == settled else '{}.{}'.format(settled, seen)
+        if self.shard == DEFAULT_DB_ALIAS:
+            return since
+        return '{}:{}'.format(self.shard, since)
+
+    def paginate_changes(self, queryset, request, wait=0, shard=DEFAULT_DB_ALIAS):
+        """
+        Page of the changes in queryset, the log of shard, after the cursor, waiting
+        up to wait seconds for the first one when there are none yet.
+        """
+        self.request = request
+        self.shard = shard
+        self.page_size = self.get_page_size(request)
+        log = queryset.model.objects.using(queryset.db).order_by('id').values_list('id', flat=True)
+        position = self.decode_cursor(request)
+        if position is None:
+            since = seen = log.reverse().first() or 0
+        else:
+            since, seen = position
+            # Pruning keeps its newest pruned change, so a cursor before the oldest change may have missed some
+            oldest = log.first() if since else None
+            if oldest is not None and since < oldest:
+                raise ChangesPruned()
+
+        changes_after = queryset.filter(id__gt=since).order_by('id')
+        if seen > since:
+            # Wait for changes after the last one handed out, not for the unsettled ones handed out again
+            changes.wait_for_changes(queryset.filter(id__gt=seen).exists, wait)
+            page = list(changes_after[:self.page_size + 1])
+        else:
+            page = changes.wait_for_changes(lambda: list(changes_after[:self.page_size + 1]), wait)
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+
+        settled = since
+        unsettled = timezone.now() - timedelta(seconds=getattr(settings, 'PAAS_CHANGES_SETTLE_SECONDS', 0))
+        for change in page:
+            if change.created > unsettled:
+                break
+            settled = change.id
+        self.last_position = settled, max(page[-1].id if page else since, seen)
+        return page
+
+    def get_next_link(self):
+        # Always set: once the feed is drained it is the URL to poll for the changes to come
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.last_position))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('since', self.encode_cursor(self.last_position)),
+            ('more', self.has_next),
+            ('results', data),
+        ]))
+
+    def get_schema_fields(self, view):
+        return [
+            coreapi.Field(
+                name=self.cursor_query_param,
+                required=False,
+                location='query',
+                schema=coreschema.String(title='Since',
+                                         description='Id of the last change already seen, or "latest".')
+            ),
+            coreapi.Field(
+                name=self.page_size_query_param,
+                required=False,
+                location='query',
+                schema=coreschema.Integer(title='Page size', description='Number of results to return per page.')
+            ),
+        ]
@@ -0,0 +1,48 @@
+import hashlib
+import re
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+# Strong entity tags of resources: "<version>" or "<version>-<fields digest>"
+_resource_etag = re.compile(r'^"(\d+)(?:-[0-9a-f]+)?"$')
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'The resource has changed since the If-Match version was read.'
+    default_code = 'precondition_failed'
+
+
+def resource_etag(version, fields=None):
+    """
+    ETag of a resource representation at version, distinct for every sparse fieldset.
+    """
+    if fields is None:
+        return '"{}"'.format(version)
+    return '"{}-{}"'.format(version, hashlib.md5(','.join(fields).encode('utf-8')).hexdigest()[:8])
+
+
+def parse_if_match(header):
+    """
+    Versions an If-Match header accepts: None when any version does (no header or *),
+    otherwise a possibly empty set. Weak tags never match, as If-Match compares strongly.
+    """
+    if header is None or header.strip() == '*':
+        return None
+    versions = set()
+    for tag in header.split(','):
+        match = _resource_etag.match(tag.strip())
+        if match:
+            versions.add(int(match.group(1)))
+    return versions
+
+
+def if_none_match(header, etag):
+    """
+    Whether an If-None-Match header lists etag, comparing weakly.
+    """
+    if header is None:
+        return False
+    tags = [tag.strip() for tag in header.split(',')]
+    return header.strip() == '*' or etag in tags or 'W/' + etag in tags
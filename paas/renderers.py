@@ -0,0 +1,29 @@
+import json
+
+from rest_framework import renderers
+from rest_framework.utils import encoders
+
+
+class NDJSONRenderer(renderers.BaseRenderer):
+    """
+    Newline delimited JSON, one object per line.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+    encoder_class = encoders.JSONEncoder
+
+    def render_line(self, data):
+        return json.dumps(data, cls=self.encoder_class, ensure_ascii=False,
+                          separators=(',', ':')).encode('utf-8') + b'\n'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, list):
+            return b''.join(self.render_line(item) for item in data)
+        return self.render_line(data)
+
+    def render_stream(self, rows):
+        for row in rows:
+            yield self.render_line(row)
@@ -0,0 +1,225 @@
+import itertools
+import re
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models import Q, Sum
+from django.dispatch import receiver
+from rest_framework.compat import coreapi, coreschema
+
+# SQLite FTS5 table holding the text of each SearchDocument under its id as rowid
+FTS_TABLE = 'paas_search_fts'
+TOKEN_MAX_LENGTH = 64
+# Rows per statement, which keeps IN lists below SQLite's variable limit
+CHUNK_SIZE = 500
+
+_words = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return [word[:TOKEN_MAX_LENGTH] for word in _words.findall(text.lower())]
+
+
+def parse_query(query):
+    """
+    (token, prefix) terms of a search query. All terms have to match, and a word
+    ending in * matches tokens starting with it.
+    """
+    terms = []
+    for word in query.split():
+        tokens = tokenize(word)
+        if tokens:
+            terms.extend((token, False) for token in tokens[:-1])
+            terms.append((tokens[-1], word.endswith('*')))
+    return terms
+
+
+def uses_fts5(connection):
+    """
+    Whether the index on connection is the FTS5 table rather than SearchToken rows.
+    PAAS_SEARCH_BACKEND 'auto' picks FTS5 when the migration could create the table.
+    """
+    backend = getattr(settings, 'PAAS_SEARCH_BACKEND', 'auto')
+    if backend == 'auto':
+        if not hasattr(connection, 'paas_fts5'):
+            connection.paas_fts5 = (connection.vendor == 'sqlite'
+                                    and FTS_TABLE in connection.introspection.table_names())
+        return connection.paas_fts5
+    if backend not in ('fts5', 'tokens'):
+        raise ImproperlyConfigured("Unknown PAAS_SEARCH_BACKEND {!r}".format(backend))
+    return backend == 'fts5'
+
+
+@receiver(connection_created)
+def forget_fts5_table(sender, connection, **kwargs):
+    # A new connection may point at another database, e.g. the test database
+    connection.__dict__.pop('paas_fts5', None)
+
+
+def index_resources(resources, using='default', replace=True):
+    """
+    Add resources to the search index, replacing their previous entries unless
+    they are known to be new.
+    """
+    from paas.models import SearchDocument
+    from paas.models import SearchToken
+
+    connection = connections[using]
+    resources = list(resources)
+    for start in range(0, len(resources), CHUNK_SIZE):
+        chunk = resources[start:start + CHUNK_SIZE]
+        if replace:
+            remove_resources([resource.pk for resource in chunk], using)
+        SearchDocument.objects.using(using).bulk_create(
+            [SearchDocument(resource_id=resource.pk, owner_id=resource.owner_id) for resource in chunk])
+        if uses_fts5(connection):
+            prep = SearchDocument._meta.get_field('resource_id').get_db_prep_value
+            sql = 'INSERT INTO {} (rowid, body) SELECT id, %s FROM paas_searchdocument WHERE resource_id = %s'
+            with connection.cursor() as cursor:
+                cursor.executemany(sql.format(FTS_TABLE),
+                                   [(resource.resource_value, prep(resource.pk, connection)) for resource in chunk])
+        else:
+            documents = dict(SearchDocument.objects.using(using).filter(
+                resource_id__in=[resource.pk for resource in chunk]).values_list('resource_id', 'id'))
+            SearchToken.objects.using(using).bulk_create([
+                SearchToken(document_id=documents[resource.pk], token=token, count=count)
+                for resource in chunk for token, count in Counter(tokenize(resource.resource_value)).items()
+            ])
+
+
+def remove_resources(resource_ids, using='default'):
+    from paas.models import SearchDocument
+
+    resource_ids = list(resource_ids)
+    for start in range(0, len(resource_ids), CHUNK_SIZE):
+        remove_documents(SearchDocument.objects.using(using).filter(
+            resource_id__in=resource_ids[start:start + CHUNK_SIZE]))
+
+
+def remove_documents(documents):
+    """
+    Remove the entries of the SearchDocument queryset documents, in a few statements whatever their number.
+    """
+    from paas.models import SearchToken
+
+    connection = connections[documents.db]
+    if uses_fts5(connection):
+        sql, params = documents.values('id').query.get_compiler(documents.db).as_sql()
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM {} WHERE rowid IN ({})'.format(FTS_TABLE, sql), params)
+    else:
+        SearchToken.objects.using(documents.db).filter(document__in=documents.values('id'))._raw_delete(documents.db)
+    documents._raw_delete(documents.db)
+
+
+def clear_index(using='default'):
+    """
+    Empty the search index, both its FTS5 and its SearchToken form.
+    """
+    from paas.models import SearchDocument
+    from paas.models import SearchToken
+
+    connection = connections[using]
+    SearchToken.objects.using(using)._raw_delete(using)
+    if connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names():
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM {}'.format(FTS_TABLE))
+    SearchDocument.objects.using(using)._raw_delete(using)
+
+
+def search(terms, owner_id=None, after=None, limit=100, using='default'):
+    """
+    (score, resource_id) pairs of the resources matching all terms, best first, at
+    most limit of them, starting after the (score, resource_id) position after.
+    Lower scores rank higher: FTS5 bm25() scores, or minus the number of matching
+    tokens with the SearchToken index. Scores change as the index changes.
+    """
+    connection = connections[using]
+    if uses_fts5(connection):
+        return _search_fts5(connection, terms, owner_id, after, limit)
+    return _search_tokens(using, terms, owner_id, after, limit)
+
+
+def search_databases(terms, owner_id=None, after=None, limit=100, using=()):
+    """
+    search() on each database of using in parallel, merged into one ranking.
+    BM25 scores rank each database against its own documents, so the merge is
+    approximate where databases hold differently worded resources.
+    """
+    from paas.db.sharding import fan_out
+
+    ranked = fan_out(lambda alias: search(terms, owner_id, after, limit, alias), using)
+    return sorted(itertools.chain.from_iterable(ranked))[:limit]
+
+
+def _search_fts5(connection, terms, owner_id, after, limit):
+    from paas.models import SearchDocument
+
+    prep = SearchDocument._meta.get_field('resource_id').get_db_prep_value
+    # Tokens only hold word characters, so quoting them cannot break out of the expression
+    expression = ' '.join('"{}"{}'.format(token, '*' if prefix else '') for token, prefix in terms)
+    where, params = ['{} MATCH %s'.format(FTS_TABLE)], [expression]
+    if owner_id is not None:
+        where.append('document.owner_id = %s')
+        params.append(prep(owner_id, connection))
+    if after is not None:
+        score, resource_id = after
+        where.append('({0}.rank > %s OR ({0}.rank = %s AND document.resource_id > %s))'.format(FTS_TABLE))
+        params.extend([score, score, prep(resource_id, connection)])
+    sql = ('SELECT {0}.rank, document.resource_id FROM {0} '
+           'JOIN paas_searchdocument document ON document.id = {0}.rowid '
+           'WHERE {1} ORDER BY {0}.rank, document.resource_id LIMIT %s').format(FTS_TABLE, ' AND '.join(where))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + [limit])
+        return [(score, uuid.UUID(resource_id)) for score, resource_id in cursor.fetchall()]
+
+
+def _term(token, prefix):
+    if prefix:
+        # A range rather than LIKE, so the token index serves it on every database
+        return Q(token__gte=token, token__lt=token + '\U0010ffff')
+    return Q(token=token)
+
+
+def _search_tokens(using, terms, owner_id, after, limit):
+    from paas.models import SearchToken
+
+    tokens = SearchToken.objects.using(using)
+    matches = Q()
+    for term in terms:
+        matches |= _term(*term)
+    rows = tokens.filter(matches)
+    for term in terms:
+        rows = rows.filter(document__in=tokens.filter(_term(*term)).values('document'))
+    if owner_id is not None:
+        rows = rows.filter(document__owner_id=owner_id)
+    rows = rows.values('document__resource_id').annotate(score=-Sum('count'))
+    if after is not None:
+        score, resource_id = after
+        rows = rows.filter(Q(score__gt=score) | Q(score=score, document__resource_id__gt=resource_id))
+    rows = rows.order_by('score', 'document__resource_id')[:limit]
+    return [(row['score'], row['document__resource_id']) for row in rows]
+
+
+class SearchFilter(object):
+    """
+    Documents the ?q= search parameter in the API schema.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        return queryset
+
+    def get_schema_fields(self, view):
+        return [
+            coreapi.Field(
+                name=view.search_query_param,
+                required=False,
+                location='query',
+                schema=coreschema.String(
+                    title='Search', description='Words the resource value has to contain, word* for a prefix.')
+            ),
+        ]
@@ -2,47 +2,74 @@ from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 from paas.models import MyUser as User
 from paas.models import Resource
+from paas.models import Job
+from paas.models import ResourceChange
+from paas.fieldsets import SparseFieldsetSerializerMixin
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     email = serializers.EmailField(required=True, validators=[UniqueValidator(queryset=User.objects.all())])
     password = serializers.CharField(min_length=7, write_only=True)
 
     def create(self, validated_data):
-        user = User.objects.create_user(validated_data['username'], validated_data['email'], validated_data['password'])
+        extra_fields = {}
         if validated_data.get('quota'):
-            user.quota = validated_data['quota']
-            user.quota_left = validated_data['quota']
-            user.save()
-        return user
+            extra_fields = {'quota': validated_data['quota'], 'quota_left': validated_data['quota']}
+        return User.objects.create_user(validated_data['username'], validated_data['email'],
+                                        validated_data['password'], **extra_fields)
 
     class Meta:
         model = User
         fields = ('id', 'email', 'username', 'password', 'quota')
 
 
-class UserQuotaSerializer(serializers.ModelSerializer):
+class UserQuotaSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     username = serializers.CharField(read_only=True)
 
     class Meta:
         model = User
-        fields = ('id', 'username', 'quota', 'quota_left')
+        fields = ('id', 'username', 'quota', 'quota_left', 'resource_count')
 
 
-class ResourceSerializer(serializers.ModelSerializer):
+class ResourceSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Resource
         fields = ('id', 'owner', 'resource_value')
 
 
-class ListResourceSerializer(serializers.ModelSerializer):
-    owner = UserSerializer()
+class ResourceOwnerSerializer(serializers.ModelSerializer):
+    """
+    Read-only owner representation for listings, same output as UserSerializer without its validators.
+    """
+    class Meta:
+        model = User
+        fields = ('id', 'email', 'username', 'quota')
+        read_only_fields = fields
+
+
+class ListResourceSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    owner = ResourceOwnerSerializer(read_only=True)
 
     class Meta:
         model = Resource
         fields = ('id', 'owner', 'resource_value')
 
 
+class BulkCreateResourceSerializer(serializers.Serializer):
+    owner = serializers.UUIDField(required=False)
+    resource_value = serializers.CharField()
+
+
+class BulkUpdateResourceSerializer(serializers.Serializer):
+    id = serializers.UUIDField()
+    resource_value = serializers.CharField()
+
+    def validate(self, attrs):
+        if 'owner' in self.initial_data:
+            raise serializers.ValidationError("Change owner not allowed")
+        return attrs
+
+
 class UserLoginSerializer(serializers.Serializer):
     email = serializers.EmailField()
     password = serializers.CharField(write_only=True)
@@ -52,3 +79,15 @@ class UserLoginSerializer(serializers.Serializer):
 
     def update(self, instance, validated_data):
         pass
+
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = ('id', 'kind', 'target_id', 'status', 'total', 'done', 'error', 'created', 'updated')
+
+
+class ResourceChangeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ResourceChange
+        fields = ('id', 'resource_id', 'owner_id', 'kind', 'created')
@@ -0,0 +1,166 @@
+import base64
+import hashlib
+import lzma
+import threading
+import zlib
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import models
+
+# Stored values that start with MARKER are encoded, everything else is the text itself
+MARKER = '\x01'
+RAW = 'raw'
+REFERENCE = 'sha256'
+
+CODECS = {
+    'zlib': (zlib.compress, zlib.decompress),
+    'lzma': (lzma.compress, lzma.decompress),
+}
+
+
+def compress(text):
+    """
+    Encode text with the PAAS_RESOURCE_COMPRESSION codec when it is at least
+    PAAS_RESOURCE_COMPRESSION_MIN_SIZE long and compressing makes it shorter.
+    """
+    codec = getattr(settings, 'PAAS_RESOURCE_COMPRESSION', None)
+    if codec and len(text) >= getattr(settings, 'PAAS_RESOURCE_COMPRESSION_MIN_SIZE', 1024):
+        data = base64.b64encode(CODECS[codec][0](text.encode('utf-8'))).decode('ascii')
+        if len(data) + len(codec) + 2 < len(text):
+            return '{}{}:{}'.format(MARKER, codec, data)
+    if text.startswith(MARKER):
+        return '{}{}:{}'.format(MARKER, RAW, text)
+    return text
+
+
+def deduplicates(text):
+    return getattr(settings, 'PAAS_RESOURCE_DEDUPLICATION', False) and \
+        len(text) >= getattr(settings, 'PAAS_RESOURCE_COMPRESSION_MIN_SIZE', 1024)
+
+
+def reference(text):
+    return '{}{}:{}'.format(MARKER, REFERENCE, hashlib.sha256(text.encode('utf-8')).hexdigest())
+
+
+def encode(text):
+    """
+    Returns the value to store for text and, with PAAS_RESOURCE_DEDUPLICATION,
+    the ResourcePayload it refers to, which must be saved along with it.
+    """
+    from paas.models import ResourcePayload
+
+    if not deduplicates(text):
+        return compress(text), None
+    stored = reference(text)
+    return stored, ResourcePayload(digest=stored[len(MARKER) + len(REFERENCE) + 1:], value=compress(text))
+
+
+def decode(stored, using='default'):
+    if stored is None or not stored.startswith(MARKER):
+        return stored
+    kind, data = stored[1:].split(':', 1)
+    if kind == RAW:
+        return data
+    if kind == REFERENCE:
+        return load_payload(data, using)
+    return CODECS[kind][1](base64.b64decode(data)).decode('utf-8')
+
+
+class PayloadCache(object):
+    """
+    LRU cache of decoded payloads holding at most PAAS_PAYLOAD_CACHE_SIZE characters
+    in all. Payloads larger than an eighth of that are not cached, so a few huge
+    values cannot evict everything else.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.size = 0
+
+    @property
+    def max_size(self):
+        return getattr(settings, 'PAAS_PAYLOAD_CACHE_SIZE', 16 * 1024 * 1024)
+
+    def get(self, key):
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+            return text
+
+    def set(self, key, text):
+        if len(text) > self.max_size // 8:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = text
+            self.size += len(text)
+            while self.size > self.max_size:
+                self.size -= len(self._entries.popitem(last=False)[1])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+payload_cache = PayloadCache()
+
+
+def load_payload(digest, using='default'):
+    """
+    Payloads are addressed by their content and never change, so they are kept in
+    payload_cache. A list of duplicated values costs one query per distinct payload at most.
+    """
+    from paas.models import ResourcePayload
+
+    key = (digest, using)
+    text = payload_cache.get(key)
+    if text is None:
+        text = decode(ResourcePayload.objects.using(using).values_list('value', flat=True).get(digest=digest), using)
+        payload_cache.set(key, text)
+    return text
+
+
+def save_payloads(payloads, using='default'):
+    from paas.models import ResourcePayload
+
+    ResourcePayload.objects.using(using).bulk_create(payloads, ignore_conflicts=True)
+
+
+def save_text_payloads(texts, using='default'):
+    """
+    Save the payloads the stored form of texts refers to, before writing rows holding
+    them. One query for all of them, none when no text is deduplicated.
+    """
+    payloads = {}
+    for text in texts:
+        if isinstance(text, str) and deduplicates(text):
+            stored, payload = encode(text)
+            payloads[payload.digest] = payload
+    if payloads:
+        save_payloads(list(payloads.values()), using)
+
+
+class StoredTextField(models.TextField):
+    """
+    TextField whose values are compressed and deduplicated on save according to
+    the PAAS_RESOURCE_* settings, and read back as the original text. Existing
+    plain values stay readable whatever the settings, and lookups other than on
+    short plain values will not match encoded rows.
+
+    Deduplicated values are written as references only: whoever writes them saves
+    their payloads first with save_text_payloads(), as ResourceQuerySet does.
+    """
+
+    def from_db_value(self, value, expression, connection):
+        return decode(value, connection.alias)
+
+    def get_db_prep_save(self, value, connection):
+        value = self.get_prep_value(value)
+        if value is None:
+            return value
+        return reference(value) if deduplicates(value) else compress(value)
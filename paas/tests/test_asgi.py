@@ -0,0 +1,103 @@
+import asyncio
+import json
+
+from django.core.handlers.wsgi import WSGIHandler
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITransactionTestCase
+from paas.asgi import ThreadPoolASGIHandler
+from paas.models import MyUser as User
+from paas.models import Resource
+
+
+class ThreadPoolASGIHandlerTest(APITransactionTestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('user1', 'user1@gmail.com', 'pwd12345')
+        self.token = Token.objects.create(user=self.user)
+        Resource.objects.create(owner=self.user, resource_value="User1 Resource1")
+        self.application = ThreadPoolASGIHandler(WSGIHandler(), max_workers=2)
+        self.addCleanup(self.application.executor.shutdown)
+
+    def request(self, method, path, query_string=b'', body_chunks=(b'',), headers=()):
+        scope = {
+            'type': 'http', 'method': method, 'path': path, 'query_string': query_string,
+            'headers': [(b'authorization', 'Token {}'.format(self.token.key).encode('ascii'))] + list(headers),
+            'server': ('testserver', 80), 'scheme': 'http', 'http_version': '1.1',
+        }
+        incoming = [{'type': 'http.request', 'body': chunk, 'more_body': index < len(body_chunks) - 1}
+                    for index, chunk in enumerate(body_chunks)]
+        sent = []
+
+        async def receive():
+            if incoming:
+                return incoming.pop(0)
+            await asyncio.sleep(3600)
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(self.application(scope, receive, send))
+        self.assertEqual(sent[0]['type'], 'http.response.start')
+        self.assertFalse(sent[-1]['more_body'])
+        return sent[0], b''.join(message.get('body', b'') for message in sent[1:])
+
+    def test_get(self):
+        start, body = self.request('GET', '/api/resources/')
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'content-type', b'application/json'), start['headers'])
+        self.assertEqual(json.loads(body.decode('utf-8'))['results'][0]['resource_value'], "User1 Resource1")
+
+    def test_post_in_chunks(self):
+        payload = json.dumps({'resource_value': "New Resource"}).encode('utf-8')
+        start, body = self.request('POST', '/api/resources/', body_chunks=(payload[:10], payload[10:]),
+                                   headers=[(b'content-type', b'application/json'),
+                                            (b'content-length', str(len(payload)).encode('ascii'))])
+        self.assertEqual(start['status'], 201)
+        self.assertTrue(Resource.objects.filter(resource_value="New Resource").exists())
+
+    def test_streaming(self):
+        start, body = self.request('GET', '/api/resources/', query_string=b'format=ndjson')
+        self.assertEqual(start['status'], 200)
+        self.assertEqual([json.loads(line)['resource_value'] for line in body.splitlines()], ["User1 Resource1"])
+
+    def test_failed_send_releases_thread(self):
+        Resource.objects.bulk_create([Resource(owner=self.user, resource_value="Row {}".format(i)) for i in range(20)])
+        application = ThreadPoolASGIHandler(WSGIHandler(), max_workers=1, max_queued_chunks=1)
+        self.addCleanup(application.executor.shutdown, wait=False)
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': '/api/resources/', 'query_string': b'format=ndjson',
+            'headers': [(b'authorization', 'Token {}'.format(self.token.key).encode('ascii'))],
+            'server': ('testserver', 80), 'scheme': 'http', 'http_version': '1.1',
+        }
+        incoming = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+        async def receive():
+            if incoming:
+                return incoming.pop(0)
+            await asyncio.sleep(3600)
+
+        async def send(message):
+            if message['type'] == 'http.response.body':
+                raise OSError("Connection reset by peer")
+
+        async def serve():
+            with self.assertRaises(OSError):
+                await application(scope, receive, send)
+            # The server's loop goes on; the only worker thread has to be free for the next request
+            loop = asyncio.get_running_loop()
+            return await asyncio.wait_for(loop.run_in_executor(application.executor, lambda: 'free'), 10)
+
+        self.assertEqual(asyncio.run(serve()), 'free')
+
+    def test_lifespan(self):
+        messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        asyncio.run(self.application({'type': 'lifespan'}, receive, send))
+        self.assertEqual(sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
@@ -0,0 +1,156 @@
+import base64
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.db.models import Value
+from django.db.models.functions import Lower
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework import status
+from paas.authentication import credential_cache
+from paas.authentication import credentials_changed
+from paas.authentication import token_cache
+from paas.backends import ModelEmailBackend
+from paas.models import MyUser as User
+from paas.models import Resource
+
+
+def basic_auth(username, password):
+    credentials = base64.b64encode('{}:{}'.format(username, password).encode('utf-8'))
+    return 'Basic ' + credentials.decode('ascii')
+
+
+@override_settings(PAAS_RESPONSE_CACHE_TTL=0)
+class CachedBasicAuthenticationTest(APITestCase):
+
+    def setUp(self):
+        credential_cache.clear()
+        self.user = User.objects.create_user('user1', 'user1@gmail.com', 'pwd12345')
+        Resource.objects.create(owner=self.user, resource_value="Test Resource")
+
+    def tearDown(self):
+        credential_cache.clear()
+
+    def test_repeated_calls_hit_cache(self):
+        self.client.credentials(HTTP_AUTHORIZATION=basic_auth('user1', 'pwd12345'))
+        response = self.client.get(reverse('list-resources'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(credential_cache.stats()['misses'], 1)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('list-resources'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(credential_cache.stats()['hits'], 1)
+
+    def test_invalid_credentials_not_cached(self):
+        self.client.credentials(HTTP_AUTHORIZATION=basic_auth('user1', 'wrong'))
+        response = self.client.get(reverse('list-resources'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(credential_cache.stats()['size'], 0)
+
+    def test_password_change_invalidates(self):
+        self.client.credentials(HTTP_AUTHORIZATION=basic_auth('user1', 'pwd12345'))
+        self.client.get(reverse('list-resources'))
+        self.user.set_password('newpwd12345')
+        self.user.save()
+        response = self.client.get(reverse('list-resources'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivation_invalidates(self):
+        self.client.credentials(HTTP_AUTHORIZATION=basic_auth('user1', 'pwd12345'))
+        self.client.get(reverse('list-resources'))
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(reverse('list-resources'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_change_in_another_process_invalidates(self):
+        self.client.credentials(HTTP_AUTHORIZATION=basic_auth('user1', 'pwd12345'))
+        self.client.get(reverse('list-resources'))
+        # Another process saved the new password: this one only sees the shared cache
+        User.objects.filter(pk=self.user.pk).update(password=make_password('newpwd12345'))
+        credentials_changed(self.user.pk)
+        response = self.client.get(reverse('list-resources'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials(HTTP_AUTHORIZATION=basic_auth('user1', 'newpwd12345'))
+        self.assertEqual(self.client.get(reverse('list-resources')).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(reverse('list-resources')).status_code, status.HTTP_200_OK)
+        self.assertEqual(credential_cache.stats()['hits'], 1)
+
+    def test_cache_disabled(self):
+        self.client.credentials(HTTP_AUTHORIZATION=basic_auth('user1', 'pwd12345'))
+        with self.settings(PAAS_AUTH_CACHE_TTL=0):
+            self.client.get(reverse('list-resources'))
+            self.client.get(reverse('list-resources'))
+        self.assertEqual(credential_cache.stats()['hits'], 0)
+        self.assertEqual(credential_cache.stats()['misses'], 2)
+
+
+class ModelEmailBackendTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('User1', 'User1@Gmail.com', 'pwd12345')
+        self.backend = ModelEmailBackend()
+
+    def test_login_by_username_any_case(self):
+        self.assertEqual(self.backend.authenticate(None, username='User1', password='pwd12345'), self.user)
+        self.assertEqual(self.backend.authenticate(None, username='user1', password='pwd12345'), self.user)
+
+    def test_login_by_email_any_case(self):
+        self.assertEqual(self.backend.authenticate(None, email='user1@gmail.com', password='pwd12345'), self.user)
+        self.assertEqual(self.backend.authenticate(None, username='USER1@GMAIL.COM', password='pwd12345'), self.user)
+
+    def test_login_wrong_password(self):
+        self.assertIsNone(self.backend.authenticate(None, username='user1', password='wrong'))
+        self.assertIsNone(self.backend.authenticate(None, email='nobody@gmail.com', password='pwd12345'))
+
+    def test_exact_username_single_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.backend.get_login_user(username='User1'), self.user)
+
+    def test_lookups_use_indexes(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Query plan check is written for SQLite')
+        plan = User.objects.filter(email__lower=Lower(Value('user1@gmail.com'))).explain()
+        self.assertIn('paas_myuser_email_lower_idx', plan)
+        plan = User.objects.filter(username__lower=Lower(Value('user1'))).explain()
+        self.assertIn('paas_myuser_username_lower_idx', plan)
+
+
+@override_settings(PAAS_RESPONSE_CACHE_TTL=0)
+class CachedTokenAuthenticationTest(APITestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        User.objects.create_user('user1', 'user1@gmail.com', 'pwd12345')
+        response = self.client.post(reverse('user-login'), data={'email': 'user1@gmail.com', 'password': 'pwd12345'})
+        self.token = response.data['token']
+        self.client.logout()
+
+    def tearDown(self):
+        token_cache.clear()
+
+    def test_token_auth_without_queries(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        response = self.client.get(reverse('list-resources'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('list-resources'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(token_cache.stats()['hits'], 1)
+
+    def test_invalid_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+        response = self.client.get(reverse('list-resources'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_revokes_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        self.client.get(reverse('list-resources'))
+        response = self.client.post(reverse('user-logout'))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        response = self.client.get(reverse('list-resources'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -0,0 +1,118 @@
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework import status
+from paas.models import MyUser as User
+from paas.models import Resource
+
+
+class BulkSetup(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('user1', 'user1@gmail.com', 'pwd12345', quota=5, quota_left=5)
+        self.other = User.objects.create_user('user2', 'user2@gmail.com', 'pwd12345')
+        self.admin = User.objects.create_superuser('admin', 'admin@gmail.com', 'pwd12345')
+
+
+class BulkCreateTest(BulkSetup):
+
+    def test_bulk_create_without_login(self):
+        response = self.client.post(reverse('bulk-resources'), [{'resource_value': 'Value'}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_bulk_create(self):
+        self.client.force_authenticate(user=self.user)
+        data = [{'resource_value': 'Value%s' % i} for i in range(3)]
+        response = self.client.post(reverse('bulk-resources'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([item['data']['resource_value'] for item in response.data], ['Value0', 'Value1', 'Value2'])
+        self.assertEqual(Resource.objects.filter(owner=self.user).count(), 3)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.quota_left, 2)
+
+    def test_bulk_create_query_count(self):
+        self.client.force_authenticate(user=self.other)
+        data = [{'resource_value': 'Value%s' % i} for i in range(50)]
+        # Two of them add the resources to the search index, one logs them in the change feed
+        with self.assertNumQueries(8):
+            response = self.client.post(reverse('bulk-resources'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Resource.objects.filter(owner=self.other).count(), 50)
+
+    def test_bulk_create_quota_exceeded(self):
+        self.client.force_authenticate(user=self.user)
+        data = [{'resource_value': 'Value%s' % i} for i in range(6)]
+        response = self.client.post(reverse('bulk-resources'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertTrue(all(item['status'] == status.HTTP_400_BAD_REQUEST for item in response.data))
+        self.assertEqual(Resource.objects.filter(owner=self.user).count(), 0)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.quota_left, 5)
+
+    def test_bulk_create_partial(self):
+        self.client.force_authenticate(user=self.admin)
+        data = [{'resource_value': 'Value', 'owner': self.other.id}, {'owner': self.other.id},
+                {'resource_value': 'Value', 'owner': self.admin.id}]
+        response = self.client.post(reverse('bulk-resources'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual([item['status'] for item in response.data], [201, 400, 201])
+        self.assertEqual(response.data[0]['data']['owner'], self.other.id)
+
+    def test_bulk_create_not_a_list(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(reverse('bulk-resources'), {'resource_value': 'Value'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_create_too_many(self):
+        self.client.force_authenticate(user=self.other)
+        with self.settings(PAAS_MAX_BULK_SIZE=2):
+            response = self.client.post(reverse('bulk-resources'), [{'resource_value': 'Value'}] * 3, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BulkUpdateDeleteTest(BulkSetup):
+
+    def setUp(self):
+        super().setUp()
+        self.resources = [Resource.objects.create(owner=self.user, resource_value="Value%s" % i) for i in range(3)]
+        self.foreign = Resource.objects.create(owner=self.other, resource_value="Other Value")
+
+    def test_bulk_update(self):
+        self.client.force_authenticate(user=self.user)
+        data = [{'id': resource.id, 'resource_value': 'New Value'} for resource in self.resources]
+        response = self.client.patch(reverse('bulk-resources'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Resource.objects.filter(resource_value='New Value').count(), 3)
+
+    def test_bulk_update_of_another_user(self):
+        self.client.force_authenticate(user=self.user)
+        data = [{'id': self.resources[0].id, 'resource_value': 'New Value'},
+                {'id': self.foreign.id, 'resource_value': 'New Value'}]
+        response = self.client.patch(reverse('bulk-resources'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual([item['status'] for item in response.data], [200, 404])
+        self.foreign.refresh_from_db()
+        self.assertEqual(self.foreign.resource_value, 'Other Value')
+
+    def test_bulk_update_owner_change(self):
+        self.client.force_authenticate(user=self.admin)
+        data = [{'id': self.resources[0].id, 'resource_value': 'New Value', 'owner': self.other.id}]
+        response = self.client.patch(reverse('bulk-resources'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(Resource.objects.filter(owner=self.user).count(), 3)
+
+    def test_bulk_delete(self):
+        self.client.force_authenticate(user=self.user)
+        data = [resource.id for resource in self.resources]
+        response = self.client.delete(reverse('bulk-resources'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Resource.objects.filter(owner=self.user).count(), 0)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.quota_left, 5)
+
+    def test_bulk_delete_of_another_user(self):
+        self.client.force_authenticate(user=self.user)
+        data = [self.resources[0].id, self.foreign.id, 'not-an-id']
+        response = self.client.delete(reverse('bulk-resources'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual([item['status'] for item in response.data], [204, 404, 400])
+        self.assertTrue(Resource.objects.filter(pk=self.foreign.pk).exists())
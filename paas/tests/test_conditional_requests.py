@@ -0,0 +1,83 @@
+from unittest import mock
+
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework.views import status
+from paas.models import MyUser as User
+from paas.models import Resource
+from paas.serializers import ResourceSerializer
+
+
+@override_settings(PAAS_RESPONSE_CACHE_TTL=0)
+class ConditionalResourceTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('user1', 'user1@gmail.com', 'pwd12345')
+        self.resource = Resource.objects.create(owner=self.user, resource_value="Original")
+        self.url = reverse('get-resource', args=[self.resource.id])
+        self.client.force_authenticate(user=self.user)
+
+    def test_etag_is_version(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['ETag'], '"1"')
+        sparse = self.client.get(self.url, {'fields': 'id'})
+        self.assertNotEqual(sparse['ETag'], response['ETag'])
+        self.assertTrue(sparse['ETag'].startswith('"1-'))
+
+    def test_if_match_update(self):
+        response = self.client.patch(self.url, {'resource_value': "First"}, HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], '"2"')
+
+        # A second editor that also read version 1 must not overwrite the first one
+        response = self.client.patch(self.url, {'resource_value': "Second"}, HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.resource.refresh_from_db()
+        self.assertEqual((self.resource.resource_value, self.resource.version), ("First", 2))
+
+        response = self.client.patch(self.url, {'resource_value': "Second"}, HTTP_IF_MATCH='"1", "2"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], '"3"')
+
+    def test_if_match_forms(self):
+        response = self.client.patch(self.url, {'resource_value': "Weak"}, HTTP_IF_MATCH='W/"1"')
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        response = self.client.patch(self.url, {'resource_value': "Any"}, HTTP_IF_MATCH='*')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.patch(self.url, {'resource_value': "Blind"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], '"3"')
+
+    def test_if_match_delete(self):
+        response = self.client.delete(self.url, HTTP_IF_MATCH='"2"')
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertTrue(Resource.objects.filter(pk=self.resource.pk).exists())
+        response = self.client.delete(self.url, HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.resource_count, 0)
+
+    def test_if_none_match_skips_serialization(self):
+        with mock.patch.object(ResourceSerializer, 'to_representation') as to_representation:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"1"')
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], '"1"')
+        to_representation.assert_not_called()
+
+        self.client.patch(self.url, {'resource_value': "Changed"})
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"1"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['resource_value'], "Changed")
+
+    def test_if_none_match_is_not_found_for_others(self):
+        other = User.objects.create_user('user2', 'user2@gmail.com', 'pwd12345')
+        self.client.force_authenticate(user=other)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"1"')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_bulk_update_bumps_version(self):
+        self.client.patch(reverse('bulk-resources'), [{'id': self.resource.id, 'resource_value': "Bulk"}],
+                          format='json')
+        response = self.client.patch(self.url, {'resource_value': "Stale"}, HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
@@ -0,0 +1,49 @@
+from unittest import mock
+
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from paas.db import check_persistent_connections
+
+
+class SQLiteProfileTest(TestCase):
+
+    def test_pragmas_applied(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 30000)
+
+
+class ImmediateTransactionTest(TransactionTestCase):
+
+    def test_begin_immediate(self):
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                pass
+        self.assertEqual(queries[0]['sql'], 'BEGIN IMMEDIATE')
+
+
+class HealthCheckTest(TestCase):
+
+    def setUp(self):
+        connection.ensure_connection()
+        patcher = mock.patch.dict(connection.settings_dict, CONN_MAX_AGE=600)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        connection.health_checked_at = 0
+
+    def test_unusable_connection_closed(self):
+        with mock.patch.object(connection, 'in_atomic_block', False), \
+                mock.patch.object(connection, 'is_usable', return_value=False), \
+                mock.patch.object(connection, 'close') as close:
+            check_persistent_connections(sender=self.__class__)
+            check_persistent_connections(sender=self.__class__)
+        close.assert_called_once_with()
+
+    def test_usable_connection_kept(self):
+        with mock.patch.object(connection, 'in_atomic_block', False), \
+                mock.patch.object(connection, 'close') as close:
+            check_persistent_connections(sender=self.__class__)
+        close.assert_not_called()
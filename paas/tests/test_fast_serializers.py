@@ -0,0 +1,51 @@
+from django.test import TestCase
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from paas.fastserializers import CompiledSerializer
+from paas.fastserializers import compile_serializer
+from paas.models import MyUser as User
+from paas.models import Resource
+from paas.serializers import ListResourceSerializer
+from paas.serializers import ResourceSerializer
+from paas.serializers import UserQuotaSerializer
+from paas.serializers import UserSerializer
+
+
+class CompiledSerializerTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('user1', 'user1@gmail.com', 'pwd12345', quota=5, quota_left=5)
+        self.other = User.objects.create_user('usér2', '', 'pwd12345')
+        Resource.objects.create(owner=self.user, resource_value="User1 Resource1")
+        Resource.objects.create(owner=self.user, resource_value="ünicode \"quoted\" \\ \n value")
+        Resource.objects.create(owner=self.other, resource_value=" padded ")
+
+    def assertSameOutput(self, serializer_class, queryset, fields=None):
+        compiled = compile_serializer(serializer_class, fields)
+        expected = serializer_class(queryset, many=True, fields=fields).data
+        actual = compiled.serialize(queryset.values(*compiled.columns))
+        self.assertEqual(JSONRenderer().render(actual), JSONRenderer().render(expected))
+
+    def test_resources(self):
+        queryset = Resource.objects.order_by('owner_id', 'id')
+        for serializer_class in (ListResourceSerializer, ResourceSerializer):
+            self.assertSameOutput(serializer_class, queryset)
+            self.assertSameOutput(serializer_class, queryset, ('id',))
+            self.assertSameOutput(serializer_class, queryset, ('owner', 'resource_value'))
+
+    def test_users(self):
+        queryset = User.objects.order_by('username')
+        for serializer_class in (UserSerializer, UserQuotaSerializer):
+            self.assertSameOutput(serializer_class, queryset)
+            self.assertSameOutput(serializer_class, queryset, ('id', 'username'))
+
+    def test_unsupported_field(self):
+        class MethodSerializer(serializers.ModelSerializer):
+            label = serializers.SerializerMethodField()
+
+            class Meta:
+                model = Resource
+                fields = ('id', 'label')
+
+        with self.assertRaises(ValueError):
+            CompiledSerializer(MethodSerializer())
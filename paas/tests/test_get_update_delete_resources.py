@@ -1,3 +1,4 @@
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework.views import status
@@ -41,7 +42,7 @@ class GetResourceTest(ResourceSetup):
         self.client.login(username="test_user1", password="pwd12345")
         resource = Resource.objects.filter(owner__username='test_user2').first()
         response = self.client.get(reverse('get-resource', args=[resource.id]))
-        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
     def test_get_resource_as_admin(self):
         self.client.login(username="admin", password="pwd12345")
@@ -67,7 +68,8 @@ class UpdateResourceTest(ResourceSetup):
         self.client.login(username="test_user1", password="pwd12345")
         resource = Resource.objects.filter(owner__username='test_user2').first()
         response = self.client.patch(reverse('get-resource', args=[resource.id]), data={'resource_value': 'New Value'})
-        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotEqual(Resource.objects.get(pk=resource.pk).resource_value, 'New Value')
 
     def test_update_resource_as_admin(self):
         self.client.login(username="admin", password="pwd12345")
@@ -92,10 +94,68 @@ class DeleteResourceTest(ResourceSetup):
         self.client.login(username="test_user1", password="pwd12345")
         resource = Resource.objects.filter(owner__username='test_user2').first()
         response = self.client.delete(reverse('get-resource', args=[resource.id]))
-        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertTrue(Resource.objects.filter(pk=resource.pk).exists())
 
     def test_delete_resource_as_admin(self):
         self.client.login(username="admin", password="pwd12345")
         resource = Resource.objects.filter(owner__username='test_user1').first()
         response = self.client.delete(reverse('get-resource', args=[resource.id]))
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+
+@override_settings(PAAS_RESPONSE_CACHE_TTL=0)
+class ResourceQueryCountTest(ResourceSetup):
+    """
+    The owner check needs no query of its own: a user's lookup is the resource
+    row filtered on owner_id, and another user's resource is not found by it.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.get(username='test_user1')
+        self.resource = Resource.objects.filter(owner=self.user).first()
+        self.foreign = Resource.objects.filter(owner__username='test_user2').first()
+        self.client.force_authenticate(user=self.user)
+
+    def test_get_queries(self):
+        with self.assertNumQueries(1) as queries:
+            response = self.client.get(reverse('get-resource', args=[self.resource.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('"paas_resource"."owner_id" = ', queries.captured_queries[0]['sql'])
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('get-resource', args=[self.foreign.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_if_none_match_queries(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('get-resource', args=[self.resource.id]), HTTP_IF_NONE_MATCH='"1"')
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_patch_queries(self):
+        # The lookup, then in a savepoint the conditional update, version read, search index and change log
+        with self.assertNumQueries(10):
+            response = self.client.patch(reverse('get-resource', args=[self.resource.id]), {'resource_value': "New"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(1):
+            response = self.client.patch(reverse('get-resource', args=[self.foreign.id]), {'resource_value': "New"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_put_queries(self):
+        # As for PATCH, plus validating the owner PUT repeats
+        data = {'resource_value': "New", 'owner': self.user.id}
+        with self.assertNumQueries(11):
+            response = self.client.put(reverse('get-resource', args=[self.resource.id]), data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(1):
+            response = self.client.put(reverse('get-resource', args=[self.foreign.id]), {'resource_value': "New"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_delete_queries(self):
+        # The lookup, then in a savepoint the per-owner count, search index, change log, delete and quota
+        with self.assertNumQueries(9):
+            response = self.client.delete(reverse('get-resource', args=[self.resource.id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        with self.assertNumQueries(1):
+            response = self.client.delete(reverse('get-resource', args=[self.foreign.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,135 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework.views import status
+from paas import jobs
+from paas.models import Job
+from paas.models import MyUser as User
+from paas.models import Resource
+from paas.models import ResourceQuerySet
+
+
+@override_settings(PAAS_USER_DELETE_SYNC_LIMIT=5, PAAS_JOB_BATCH_SIZE=4, PAAS_JOB_WORKER=None)
+class UserDeletionJobTest(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@gmail.com', password="pwd12345")
+        self.user = User.objects.create_user('user1', 'user1@gmail.com', password="pwd12345")
+        self.other = User.objects.create_user('user2', 'user2@gmail.com', password="pwd12345")
+        Resource.objects.create(owner=self.other, resource_value="User2 Resource")
+        self.client.force_authenticate(user=self.admin)
+
+    def add_resources(self, user, count):
+        Resource.objects.bulk_create(Resource(owner=user, resource_value="Resource %s" % i) for i in range(count))
+        User.objects.filter(pk=user.pk).update(resource_count=count)
+
+    def test_small_user_deleted_synchronously(self):
+        self.add_resources(self.user, 5)
+        response = self.client.delete(reverse('get-user', args=[self.user.pk]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertEqual(Resource.objects.count(), 1)
+        self.assertFalse(Job.objects.exists())
+
+    def test_large_user_deleted_by_job(self):
+        self.add_resources(self.user, 10)
+        response = self.client.delete(reverse('get-user', args=[self.user.pk]))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], Job.PENDING)
+        self.assertEqual(response.data['total'], 10)
+        self.assertEqual(response['Location'], reverse('get-job', args=[response.data['id']]))
+
+        user = User.objects.get(pk=self.user.pk)
+        self.assertTrue(user.pending_delete)
+        self.assertFalse(user.is_active)
+        self.assertEqual(Resource.objects.filter(owner=user).count(), 10)
+
+        # Deleting again hands back the queued job
+        again = self.client.delete(reverse('get-user', args=[self.user.pk]))
+        self.assertEqual(again.data['id'], response.data['id'])
+
+        self.assertEqual(jobs.run_pending_jobs(), 1)
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertEqual(list(Resource.objects.values_list('owner', flat=True)), [self.other.pk])
+
+        progress = self.client.get(response['Location'])
+        self.assertEqual(progress.status_code, status.HTTP_200_OK)
+        self.assertEqual(progress.data['status'], Job.DONE)
+        self.assertEqual(progress.data['done'], 10)
+
+    def test_batches_report_progress(self):
+        self.add_resources(self.user, 10)
+        job = jobs.schedule_user_deletion(self.user)
+        progress = []
+        delete_in_bulk = ResourceQuerySet.delete_in_bulk
+
+        def record(queryset):
+            progress.append(Job.objects.get(pk=job.pk).done)
+            return delete_in_bulk(queryset)
+
+        with mock.patch.object(ResourceQuerySet, 'delete_in_bulk', autospec=True, side_effect=record):
+            jobs.run_pending_jobs()
+        self.assertEqual(progress, [0, 4, 8])
+        self.assertEqual(Job.objects.get(pk=job.pk).done, 10)
+
+    def test_stale_job_is_taken_over(self):
+        self.add_resources(self.user, 10)
+        job = jobs.schedule_user_deletion(self.user)
+        Job.objects.filter(pk=job.pk).update(status=Job.RUNNING, done=4)
+        Resource.objects.filter(pk__in=Resource.objects.filter(owner=self.user).values('pk')[:4]).delete_in_bulk()
+        self.assertIsNone(jobs.claim_job())
+
+        Job.objects.filter(pk=job.pk).update(updated=timezone.now() - timedelta(seconds=301))
+        self.assertEqual(jobs.run_pending_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.done), (Job.DONE, 10))
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+
+    def test_failed_job(self):
+        job = jobs.schedule_user_deletion(self.user)
+        Job.objects.filter(pk=job.pk).update(kind='unknown')
+        jobs.handlers['unknown'] = lambda job: 1 / 0
+        self.addCleanup(jobs.handlers.pop, 'unknown')
+        with self.assertLogs('paas.jobs', 'ERROR'):
+            jobs.run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIn('division by zero', job.error)
+
+    def test_failed_job_queued_again(self):
+        self.add_resources(self.user, 10)
+        response = self.client.delete(reverse('get-user', args=[self.user.pk]))
+        with mock.patch.dict(jobs.handlers, {jobs.DELETE_USER: mock.Mock(side_effect=OSError("disk full"))}), \
+                self.assertLogs('paas.jobs', 'ERROR'):
+            jobs.run_pending_jobs()
+        self.assertEqual(Job.objects.get().status, Job.FAILED)
+
+        again = self.client.delete(reverse('get-user', args=[self.user.pk]))
+        self.assertEqual(again.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual((again.data['id'], again.data['status'], again.data['error']),
+                         (response.data['id'], Job.PENDING, ''))
+        self.assertEqual(jobs.run_pending_jobs(), 1)
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+
+    @override_settings(PAAS_JOB_WORKER='thread', PAAS_JOB_STALE_SECONDS=300)
+    def test_worker_resumed_after_restart(self):
+        job = jobs.schedule_user_deletion(self.user)
+        # A new process: the job is queued but no worker runs it
+        with mock.patch.object(jobs, '_resumed_at', None), mock.patch.object(jobs, 'start_worker') as start:
+            self.client.get(reverse('get-job', args=[job.pk]))
+            start.assert_called_once_with()
+            self.client.get(reverse('get-job', args=[job.pk]))
+            start.assert_called_once_with()
+            with mock.patch('paas.jobs.time.monotonic', return_value=jobs.time.monotonic() + 301):
+                self.client.get(reverse('get-job', args=[job.pk]))
+            self.assertEqual(start.call_count, 2)
+
+    def test_job_view_requires_admin(self):
+        job = jobs.schedule_user_deletion(self.user)
+        self.client.force_authenticate(user=self.other)
+        response = self.client.get(reverse('get-job', args=[job.pk]))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
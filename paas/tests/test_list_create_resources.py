@@ -1,3 +1,6 @@
+import json
+
+from django.db import connection
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework.views import status
@@ -48,18 +51,94 @@ class ListResourceEndPointsTestCase(APITestCase):
     def test_list_resources_of_user(self):
         self.client.login(email='test2@gmail.com', password='pwd12345')
         response = self.client.get(reverse('list-resources'))
-        expected = Resource.objects.filter(owner__username='test_user2')
+        expected = Resource.objects.filter(owner__username='test_user2').order_by('owner_id', 'id')
         serialized = ListResourceSerializer(expected, many=True)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serialized.data)
+        self.assertEqual(response.data['results'], serialized.data)
 
     def test_list_resources_as_admin(self):
         self.client.login(email='admin@gmail.com', password='pwd12345')
         response = self.client.get(reverse('list-resources'))
-        expected = Resource.objects.all()
+        expected = Resource.objects.order_by('owner_id', 'id')
         serialized = ListResourceSerializer(expected, many=True)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serialized.data)
+        self.assertEqual(response.data['results'], serialized.data)
+        self.assertIsNone(response.data['next'])
+
+    def test_list_resources_pages(self):
+        self.client.login(email='admin@gmail.com', password='pwd12345')
+        seen = []
+        url = reverse('list-resources') + '?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        expected = Resource.objects.order_by('owner_id', 'id').values_list('id', flat=True)
+        self.assertEqual(seen, [str(pk) for pk in expected])
+
+    def test_list_resources_pages_owner_filter(self):
+        self.client.login(email='admin@gmail.com', password='pwd12345')
+        user = User.objects.get(username='test_user1')
+        response = self.client.get(reverse('list-resources'), data={'owner_id': user.id, 'page_size': 2})
+        self.assertEqual(len(response.data['results']), 2)
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+
+    def test_list_resources_page_size_ceiling(self):
+        self.client.login(email='admin@gmail.com', password='pwd12345')
+        with self.settings(PAAS_MAX_PAGE_SIZE=3):
+            response = self.client.get(reverse('list-resources'), data={'page_size': 50})
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_list_resources_query_count(self):
+        admin = User.objects.get(username='admin')
+        self.client.force_authenticate(user=admin)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('list-resources'))
+        self.assertEqual(len(response.data['results']), 5)
+
+        for i in range(4):
+            user = User.objects.create_user('extra_user%s' % i, 'extra%s@gmail.com' % i)
+            for j in range(3):
+                Resource.objects.create(owner=user, resource_value="Extra Resource%s" % j)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('list-resources'))
+        self.assertEqual(len(response.data['results']), 17)
+
+    def test_owner_lookups_use_composite_index(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Resource._meta.db_table)
+        indexed = [constraint['columns'] for constraint in constraints.values() if constraint['index']]
+        self.assertIn(['owner_id', 'id'], indexed)
+        self.assertNotIn(['owner_id'], indexed)
+        owner = User.objects.get(username='admin')
+        self.assertIn('paas_resource_owner_id_idx', Resource.objects.filter(owner=owner).explain())
+
+    def test_list_resources_ndjson(self):
+        self.client.login(email='admin@gmail.com', password='pwd12345')
+        response = self.client.get(reverse('list-resources'), data={'format': 'ndjson', 'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        expected = ListResourceSerializer(Resource.objects.order_by('owner_id', 'id'), many=True)
+        self.assertEqual(rows, json.loads(json.dumps(expected.data, default=str)))
+
+    def test_list_resources_ndjson_accept_header(self):
+        self.client.login(email='test2@gmail.com', password='pwd12345')
+        response = self.client.get(reverse('list-resources'), HTTP_ACCEPT='application/x-ndjson')
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(len(lines), 2)
+
+    def test_list_resources_invalid_cursor(self):
+        self.client.login(email='admin@gmail.com', password='pwd12345')
+        response = self.client.get(reverse('list-resources'), data={'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
 
 class CreateResourceEndpointTest(APITestCase):
@@ -0,0 +1,60 @@
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework import status
+from paas import metrics
+from paas.models import MyUser as User
+from paas.models import Resource
+
+
+@override_settings(PAAS_METRICS_SAMPLE_RATE=1.0, PAAS_RESPONSE_CACHE_TTL=0)
+class RequestMetricsTest(APITestCase):
+
+    def setUp(self):
+        metrics.registry.reset()
+        self.user = User.objects.create_user('user1', 'user1@gmail.com', 'pwd12345')
+        self.admin = User.objects.create_superuser('admin', 'admin@gmail.com', 'pwd12345')
+        Resource.objects.create(owner=self.user, resource_value="Test Resource")
+
+    def test_server_timing_header(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse('list-resources'))
+        self.assertFalse(response.has_header('Server-Timing'))
+        with self.settings(PAAS_METRICS_SERVER_TIMING=True):
+            response = self.client.get(reverse('list-resources'))
+        self.assertIn('total;dur=', response['Server-Timing'])
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('serialize;dur=', response['Server-Timing'])
+
+    def test_server_timing_for_staff_only(self):
+        response = self.client.post(reverse('user-login'), {'email': 'user1@gmail.com', 'password': 'wrong'})
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('list-resources'))
+        self.assertIn('total;dur=', response['Server-Timing'])
+        with self.settings(PAAS_METRICS_SERVER_TIMING=False):
+            response = self.client.get(reverse('list-resources'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_sampling_off(self):
+        self.client.force_authenticate(user=self.user)
+        with self.settings(PAAS_METRICS_SAMPLE_RATE=0):
+            response = self.client.get(reverse('list-resources'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_metrics_export(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get(reverse('list-resources'))
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode('utf-8')
+        self.assertIn('paas_requests_total{url_name="list-resources",method="GET",status="200"} 1', body)
+        self.assertIn('paas_request_db_queries_count{url_name="list-resources"} 1', body)
+        self.assertIn('paas_cache_requests_total{cache="token_auth",result="hit"}', body)
+
+    def test_metrics_admin_only(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,128 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.db import connections
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITransactionTestCase
+from rest_framework.views import status
+from paas.db import routers
+from paas.models import MyUser as User
+from paas.models import Resource
+
+replica_directory = None
+
+
+def setUpModule():
+    # A second SQLite file standing in for a replica; replicate() plays the replication stream
+    global replica_directory
+    replica_directory = tempfile.mkdtemp()
+    connections.databases['replica'] = dict(connections.databases['default'],
+                                            NAME=os.path.join(replica_directory, 'replica.sqlite3'))
+
+
+def tearDownModule():
+    connections['replica'].close()
+    del connections.databases['replica']
+    shutil.rmtree(replica_directory)
+
+
+def replicate():
+    """
+    Bring the replica up to date with the primary.
+    """
+    connections['replica'].close()
+    primary = connections['default']
+    primary.ensure_connection()
+    target = sqlite3.connect(connections.databases['replica']['NAME'])
+    try:
+        primary.connection.backup(target)
+    finally:
+        target.close()
+
+
+@override_settings(PAAS_DB_REPLICAS=['replica'], PAAS_DB_REPLICA_STICKY_SECONDS=5, PAAS_RESPONSE_CACHE_TTL=0)
+class ReplicaRoutingTest(APITransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.user = User.objects.create_user('user1', 'user1@gmail.com', password="pwd12345")
+        self.admin = User.objects.create_superuser('admin', 'admin@gmail.com', password="pwd12345")
+        self.replicated = Resource.objects.create(owner=self.user, resource_value="Replicated")
+        replicate()
+        self.lagging = Resource.objects.create(owner=self.user, resource_value="Not replicated yet")
+
+    def listed(self):
+        response = self.client.get(reverse('list-resources'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [resource['resource_value'] for resource in response.data['results']]
+
+    def test_reads_go_to_replica(self):
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.listed(), ["Replicated"])
+        response = self.client.get(reverse('get-resource', args=[self.lagging.pk]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('get-user', args=[self.user.pk]))
+        self.assertEqual(response.data['resource_count'], 1)
+
+        replicate()
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(len(self.listed()), 2)
+
+    def test_reads_after_write_go_to_primary(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(reverse('list-resources'), data={'resource_value': "Created"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Resource.objects.using('replica').count(), 1)
+
+        self.assertEqual(sorted(self.listed()), ["Created", "Not replicated yet", "Replicated"])
+        response = self.client.get(reverse('get-resource', args=[response.data['id']]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Other users still read from the replica
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('get-user', args=[self.user.pk]))
+        self.assertEqual(response.data['resource_count'], 1)
+
+    def test_sticky_marker_shared_between_processes(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        shared = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                                       'shared': shared},
+                               PAAS_DB_REPLICA_STICKY_CACHE='shared'):
+            self.client.force_authenticate(user=self.user)
+            response = self.client.post(reverse('list-resources'), data={'resource_value': "Created"})
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            # Another worker has its own local memory but opens the same shared cache
+            caches['default'].clear()
+            other_worker = FileBasedCache(location, {})
+            self.assertIsNotNone(other_worker.get(routers.sticky_key(self.user.pk)))
+            self.assertEqual(len(self.listed()), 3)
+
+    def test_sticky_window_expires(self):
+        routers.stick_to_primary(self.user.pk)
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(len(self.listed()), 2)
+        with mock.patch('paas.db.routers.time.time', return_value=time.time() + 6):
+            self.assertEqual(self.listed(), ["Replicated"])
+
+    def test_replica_reads_are_not_cached(self):
+        self.client.force_authenticate(user=self.user)
+        with override_settings(PAAS_RESPONSE_CACHE_TTL=300):
+            self.assertEqual(self.listed(), ["Replicated"])
+            replicate()
+            self.assertEqual(len(self.listed()), 2)
+
+    def test_without_replicas(self):
+        self.client.force_authenticate(user=self.user)
+        with override_settings(PAAS_DB_REPLICAS=[]):
+            self.assertEqual(len(self.listed()), 2)
@@ -0,0 +1,142 @@
+import io
+import threading
+import time
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework.views import status
+from paas import changes
+from paas.models import MyUser as User
+from paas.models import Resource
+from paas.models import ResourceChange
+
+
+class ResourceChangesTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('user1', 'user1@gmail.com', password="pwd12345")
+        self.other = User.objects.create_user('user2', 'user2@gmail.com', password="pwd12345")
+        self.admin = User.objects.create_superuser('admin', 'admin@gmail.com', password="pwd12345")
+        self.resource = Resource.objects.create(owner=self.user, resource_value="First")
+        self.client.force_authenticate(user=self.user)
+
+    def feed(self, **params):
+        response = self.client.get(reverse('resource-changes'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def kinds(self, data):
+        return [(change['resource_id'], change['kind']) for change in data['results']]
+
+    def test_writes_are_logged(self):
+        pk = str(self.resource.pk)
+        self.client.patch(reverse('get-resource', args=[pk]), {'resource_value': "Changed"})
+        created = self.client.post(reverse('bulk-resources'), [{'resource_value': "Bulk"}], format='json')
+        bulk_pk = created.data[0]['data']['id']
+        self.client.patch(reverse('bulk-resources'), [{'id': bulk_pk, 'resource_value': "Renamed"}], format='json')
+        self.client.delete(reverse('bulk-resources'), [bulk_pk], format='json')
+        self.client.delete(reverse('get-resource', args=[pk]))
+        self.assertEqual(self.kinds(self.feed()), [
+            (pk, 'created'), (pk, 'updated'), (bulk_pk, 'created'), (bulk_pk, 'updated'), (bulk_pk, 'deleted'),
+            (pk, 'deleted'),
+        ])
+
+    def test_pages_resume_from_next(self):
+        Resource.objects.bulk_create(Resource(owner=self.user, resource_value="R%s" % i) for i in range(4))
+        data = self.feed(page_size=2)
+        self.assertTrue(data['more'])
+        seen = [change['id'] for change in data['results']]
+        while data['more']:
+            data = self.client.get(data['next']).data
+            seen += [change['id'] for change in data['results']]
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(seen, sorted(seen))
+
+        # The drained feed keeps its position for the next poll
+        self.assertEqual(data['since'], seen[-1])
+        Resource.objects.create(owner=self.user, resource_value="Later")
+        self.assertEqual(len(self.client.get(data['next']).data['results']), 1)
+
+    def test_since_latest(self):
+        data = self.feed(since='latest')
+        self.assertEqual(data['results'], [])
+        Resource.objects.create(owner=self.user, resource_value="New")
+        self.assertEqual(len(self.feed(since=data['since'])['results']), 1)
+
+    def test_owner_scope(self):
+        foreign = Resource.objects.create(owner=self.other, resource_value="Foreign")
+        self.assertNotIn(str(foreign.pk), [change['resource_id'] for change in self.feed()['results']])
+        self.client.force_authenticate(user=self.admin)
+        self.assertEqual(len(self.feed()['results']), 2)
+        self.assertEqual(self.kinds(self.feed(owner_id=self.other.pk)), [(str(foreign.pk), 'created')])
+
+    def test_user_deletion_logs_deletes(self):
+        Resource.objects.create(owner=self.user, resource_value="Second")
+        since = self.feed(since='latest')['since']
+        self.client.force_authenticate(user=self.admin)
+        self.client.delete(reverse('get-user', args=[self.user.pk]))
+        self.assertEqual({change['kind'] for change in self.feed(since=since, owner_id=self.user.pk)['results']},
+                         {'deleted'})
+        self.assertEqual(ResourceChange.objects.filter(owner_id=self.user.pk, kind='deleted').count(), 2)
+
+    def test_user_cascade_logs_deletes(self):
+        self.user.delete()
+        self.assertTrue(ResourceChange.objects.filter(resource_id=self.resource.pk, kind='deleted').exists())
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('resource-changes'), {'since': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_wait_times_out_empty(self):
+        since = self.feed(since='latest')['since']
+        start = time.monotonic()
+        data = self.feed(since=since, wait=0.2)
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+        self.assertEqual(data['results'], [])
+
+    def test_wait_wakes_on_commit(self):
+        found = [[], ['change']]
+        timer = threading.Timer(0.1, changes.notify)
+        timer.start()
+        start = time.monotonic()
+        self.assertEqual(changes.wait_for_changes(lambda: found.pop(0), 5, poll_interval=5), ['change'])
+        self.assertLess(time.monotonic() - start, 2)
+        timer.join()
+
+    @override_settings(PAAS_CHANGES_SETTLE_SECONDS=10)
+    def test_late_commits_are_not_skipped(self):
+        first = ResourceChange.objects.get().id
+        change = {'resource_id': self.resource.pk, 'owner_id': self.user.pk, 'kind': 'updated'}
+        ResourceChange.objects.create(id=first + 10, **change)
+        data = self.feed()
+        self.assertEqual([change['id'] for change in data['results']], [first, first + 10])
+        self.assertEqual(data['since'], '0.{}'.format(first + 10))
+
+        # A transaction that took id first + 5 commits after first + 10 was handed out
+        ResourceChange.objects.create(id=first + 5, **change)
+        start = time.monotonic()
+        data = self.feed(since=data['since'], wait=0.2)
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+        self.assertEqual([change['id'] for change in data['results']], [first, first + 5, first + 10])
+
+        ResourceChange.objects.update(created=timezone.now() - timedelta(seconds=11))
+        data = self.feed(since=data['since'])
+        self.assertEqual(len(data['results']), 3)
+        self.assertEqual(data['since'], first + 10)
+        self.assertEqual(self.feed(since=data['since'])['results'], [])
+
+    def test_pruned_cursor_is_gone(self):
+        Resource.objects.bulk_create(Resource(owner=self.user, resource_value="R%s" % i) for i in range(3))
+        first = self.feed()['results'][0]['id']
+        ResourceChange.objects.filter(id__lte=first + 2).update(created=timezone.now() - timedelta(days=40))
+        call_command('prune_resource_changes', '--days', '30', stdout=io.StringIO())
+
+        # The newest pruned change is kept as the start of the log
+        self.assertEqual(ResourceChange.objects.order_by('id').first().id, first + 2)
+        response = self.client.get(reverse('resource-changes'), {'since': first})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertEqual(len(self.feed(since=first + 2)['results']), 1)
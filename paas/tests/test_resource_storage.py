@@ -0,0 +1,122 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework import status
+from paas import storage
+from paas.models import MyUser as User
+from paas.models import Resource
+from paas.models import ResourcePayload
+
+LARGE_VALUE = " ".join(["repetitive payload"] * 200)
+
+
+def stored_value(resource):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT resource_value FROM paas_resource WHERE id = %s", [resource.pk.hex])
+        return cursor.fetchone()[0]
+
+
+@override_settings(PAAS_RESOURCE_COMPRESSION_MIN_SIZE=100, PAAS_RESPONSE_CACHE_TTL=0)
+class ResourceStorageTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('user1', 'user1@gmail.com', 'pwd12345')
+        self.client.force_authenticate(user=self.user)
+
+    def test_plain_by_default(self):
+        resource = Resource.objects.create(owner=self.user, resource_value=LARGE_VALUE)
+        self.assertEqual(stored_value(resource), LARGE_VALUE)
+
+    def test_compressed(self):
+        for codec in ('zlib', 'lzma'):
+            with self.settings(PAAS_RESOURCE_COMPRESSION=codec):
+                response = self.client.post(reverse('list-resources'), {'resource_value': LARGE_VALUE})
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            resource = Resource.objects.get(pk=response.data['id'])
+            self.assertTrue(stored_value(resource).startswith('\x01{}:'.format(codec)))
+            self.assertLess(len(stored_value(resource)), len(LARGE_VALUE) // 10)
+            self.assertEqual(resource.resource_value, LARGE_VALUE)
+            response = self.client.get(reverse('get-resource', kwargs={'pk': resource.pk}))
+            self.assertEqual(response.data['resource_value'], LARGE_VALUE)
+
+    @override_settings(PAAS_RESOURCE_COMPRESSION='zlib')
+    def test_small_values_stay_plain(self):
+        resource = Resource.objects.create(owner=self.user, resource_value="Small Value")
+        self.assertEqual(stored_value(resource), "Small Value")
+        self.assertTrue(Resource.objects.filter(resource_value="Small Value").exists())
+
+    def test_marker_is_escaped(self):
+        resource = Resource.objects.create(owner=self.user, resource_value="\x01zlib:not compressed")
+        self.assertEqual(Resource.objects.get(pk=resource.pk).resource_value, "\x01zlib:not compressed")
+
+    @override_settings(PAAS_RESOURCE_COMPRESSION='zlib', PAAS_RESOURCE_DEDUPLICATION=True)
+    def test_deduplicated(self):
+        data = [{'resource_value': LARGE_VALUE}] * 3 + [{'resource_value': "Small Value"}]
+        response = self.client.post(reverse('bulk-resources'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(ResourcePayload.objects.count(), 1)
+        self.assertTrue(ResourcePayload.objects.get().value.startswith('\x01zlib:'))
+        response = self.client.get(reverse('list-resources'))
+        self.assertEqual(sorted(item['resource_value'] for item in response.data['results']),
+                         sorted([LARGE_VALUE] * 3 + ["Small Value"]))
+
+    @override_settings(PAAS_RESOURCE_DEDUPLICATION=True)
+    def test_payloads_saved_by_writes(self):
+        resource = Resource.objects.create(owner=self.user, resource_value="Small Value")
+        other_value = LARGE_VALUE + " updated"
+        # Compiling a statement writes nothing
+        Resource._meta.get_field('resource_value').get_db_prep_save(other_value, connection)
+        self.assertFalse(ResourcePayload.objects.exists())
+
+        response = self.client.patch(reverse('get-resource', kwargs={'pk': resource.pk}),
+                                     {'resource_value': other_value}, HTTP_IF_MATCH='"5"')
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertFalse(ResourcePayload.objects.exists())
+
+        response = self.client.patch(reverse('get-resource', kwargs={'pk': resource.pk}),
+                                     {'resource_value': other_value})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        resource.resource_value = LARGE_VALUE
+        Resource.objects.bulk_update([resource], ['resource_value'])
+        resource.save()
+        self.assertEqual(ResourcePayload.objects.count(), 2)
+        self.assertEqual(Resource.objects.get(pk=resource.pk).resource_value, LARGE_VALUE)
+
+    @override_settings(PAAS_PAYLOAD_CACHE_SIZE=8000)
+    def test_payload_cache_is_bounded(self):
+        cache = storage.PayloadCache()
+        for i in range(5):
+            cache.set(i, "x" * 900)
+        self.assertEqual(cache.size, 4500)
+        cache.get(0)
+        for i in range(5, 9):
+            cache.set(i, "x" * 900)
+        # The least recently used entries went, the one read lately stayed
+        self.assertEqual(cache.size, 7200)
+        self.assertIsNotNone(cache.get(0))
+        self.assertIsNone(cache.get(1))
+        cache.set('huge', "x" * 1001)
+        self.assertIsNone(cache.get('huge'))
+
+    def test_compact_resources(self):
+        resources = [Resource.objects.create(owner=self.user, resource_value=LARGE_VALUE) for i in range(3)]
+        small = Resource.objects.create(owner=self.user, resource_value="Small Value")
+        with self.settings(PAAS_RESOURCE_COMPRESSION='zlib', PAAS_RESOURCE_DEDUPLICATION=True):
+            out = StringIO()
+            call_command('compact_resources', batch_size=2, stdout=out)
+        self.assertIn("Scanned 4 resource(s), rewrote 3", out.getvalue())
+        self.assertEqual(ResourcePayload.objects.count(), 1)
+        self.assertTrue(stored_value(resources[0]).startswith('\x01sha256:'))
+        self.assertEqual(stored_value(small), "Small Value")
+        self.assertEqual(Resource.objects.get(pk=resources[0].pk).resource_value, LARGE_VALUE)
+
+        out = StringIO()
+        call_command('compact_resources', prune=True, stdout=out)
+        self.assertIn("rewrote 3", out.getvalue())
+        self.assertIn("Pruned 1 unused payload(s)", out.getvalue())
+        self.assertEqual(stored_value(resources[0]), LARGE_VALUE)
+        self.assertFalse(ResourcePayload.objects.exists())
@@ -0,0 +1,121 @@
+import time
+from unittest import mock
+
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework import status
+from paas.cache import response_cache
+from paas.checks import check_shared_caches
+from paas.models import MyUser as User
+from paas.models import Resource
+
+
+class ResponseCacheTest(APITestCase):
+
+    def setUp(self):
+        response_cache.reset_stats()
+        self.user = User.objects.create_user('user1', 'user1@gmail.com', 'pwd12345')
+        self.other = User.objects.create_user('user2', 'user2@gmail.com', 'pwd12345')
+        self.admin = User.objects.create_superuser('admin', 'admin@gmail.com', 'pwd12345')
+        self.resource = Resource.objects.create(owner=self.user, resource_value="User1 Resource1")
+        Resource.objects.create(owner=self.other, resource_value="User2 Resource1")
+
+    def test_list_served_from_cache(self):
+        self.client.force_authenticate(user=self.user)
+        first = self.client.get(reverse('list-resources'))
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('list-resources'))
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(response_cache.stats()['list'], {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_list_scoped_per_user(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get(reverse('list-resources'))
+        self.client.force_authenticate(user=self.other)
+        response = self.client.get(reverse('list-resources'))
+        self.assertEqual([item['resource_value'] for item in response.data['results']], ['User2 Resource1'])
+
+    def test_list_not_modified(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse('list-resources'))
+        response = self.client.get(reverse('list-resources'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        # Dates sent once the entry's second is over validate it
+        with mock.patch('paas.cache.time.time', return_value=time.time() + 2):
+            response = self.client.get(reverse('list-resources'))
+        response = self.client.get(reverse('list-resources'), HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_list_modified_within_the_same_second(self):
+        self.client.force_authenticate(user=self.user)
+        now = time.time()
+        with mock.patch('paas.cache.time.time', return_value=now):
+            first = self.client.get(reverse('list-resources'))
+            self.client.post(reverse('list-resources'), data={'resource_value': 'User1 Resource2'})
+            self.client.get(reverse('list-resources'))
+        with mock.patch('paas.cache.time.time', return_value=now + 2):
+            response = self.client.get(reverse('list-resources'), HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_list_invalidated_on_create(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('list-resources'))
+        etag = response['ETag']
+        self.client.force_authenticate(user=self.user)
+        self.client.post(reverse('list-resources'), data={'resource_value': 'User1 Resource2'})
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('list-resources'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_resource_served_from_cache(self):
+        self.client.force_authenticate(user=self.user)
+        first = self.client.get(reverse('get-resource', args=[self.resource.id]))
+        second = self.client.get(reverse('get-resource', args=[self.resource.id]))
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(response_cache.stats()['resource']['hits'], 1)
+
+    def test_cached_resource_is_not_found_for_others(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get(reverse('get-resource', args=[self.resource.id]))
+        self.client.force_authenticate(user=self.other)
+        response = self.client.get(reverse('get-resource', args=[self.resource.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_resource_invalidated_on_update(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse('get-resource', args=[self.resource.id]))
+        etag = response['ETag']
+        self.client.patch(reverse('get-resource', args=[self.resource.id]), data={'resource_value': 'New Value'})
+        response = self.client.get(reverse('get-resource', args=[self.resource.id]), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['resource_value'], 'New Value')
+
+    def test_resource_invalidated_on_bulk_delete(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get(reverse('get-resource', args=[self.resource.id]))
+        self.client.delete(reverse('bulk-resources'), [self.resource.id], format='json')
+        response = self.client.get(reverse('get-resource', args=[self.resource.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_invalidated_on_owner_change(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get(reverse('list-resources'))
+        self.user.quota = 10
+        self.user.save()
+        response = self.client.get(reverse('list-resources'))
+        self.assertEqual(response.data['results'][0]['owner']['quota'], 10)
+
+    def test_check_warns_about_process_local_cache(self):
+        memcached = {'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache', 'LOCATION': 'cache:11211'}
+        with override_settings(PAAS_WORKER_PROCESSES=1):
+            self.assertEqual(check_shared_caches(None), [])
+        with override_settings(PAAS_WORKER_PROCESSES=4, PAAS_RESPONSE_CACHE='default', PAAS_THROTTLE_CACHE='shared',
+                               PAAS_DB_REPLICA_STICKY_CACHE='shared', PAAS_AUTH_CHANGES_CACHE='shared',
+                               CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                                       'shared': memcached}):
+            warnings = check_shared_caches(None)
+        self.assertEqual([(warning.id, warning.msg.split()[0]) for warning in warnings],
+                         [('paas.W001', 'PAAS_RESPONSE_CACHE')])
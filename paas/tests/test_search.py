@@ -0,0 +1,111 @@
+import io
+import json
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework.views import status
+from paas import search
+from paas.models import MyUser as User
+from paas.models import Resource
+from paas.models import SearchDocument
+
+
+class SearchTestMixin(object):
+
+    def setUp(self):
+        self.user = User.objects.create_user('user1', 'user1@gmail.com', password="pwd12345")
+        self.other = User.objects.create_user('user2', 'user2@gmail.com', password="pwd12345")
+        self.admin = User.objects.create_superuser('admin', 'admin@gmail.com', password="pwd12345")
+        self.hello = Resource.objects.create(owner=self.user, resource_value="Hello world")
+        self.twice = Resource.objects.create(owner=self.user, resource_value="hello hello world, hello")
+        self.help = Resource.objects.create(owner=self.user, resource_value="Help wanted")
+        self.foreign = Resource.objects.create(owner=self.other, resource_value="Hello from user2")
+        self.client.force_authenticate(user=self.user)
+
+    def find(self, query, **params):
+        response = self.client.get(reverse('list-resources'), dict(params, q=query))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [resource['id'] for resource in response.data['results']]
+
+    def test_all_words_match(self):
+        self.assertEqual(self.find("world hello"), [str(self.twice.pk), str(self.hello.pk)])
+        self.assertEqual(self.find("WANTED"), [str(self.help.pk)])
+        self.assertEqual(self.find("hello wanted"), [])
+
+    def test_prefix(self):
+        self.assertEqual(set(self.find("hel*")), {str(self.hello.pk), str(self.twice.pk), str(self.help.pk)})
+        self.assertEqual(self.find("hel"), [])
+
+    def test_owner_scope(self):
+        self.assertNotIn(str(self.foreign.pk), self.find("hello"))
+        self.client.force_authenticate(user=self.admin)
+        self.assertEqual(len(self.find("hello")), 3)
+        self.assertEqual(self.find("hello", owner_id=self.other.pk), [str(self.foreign.pk)])
+
+    def test_pagination(self):
+        for i in range(5):
+            Resource.objects.create(owner=self.user, resource_value="paged item %s" % i)
+        response = self.client.get(reverse('list-resources'), {'q': 'paged', 'page_size': 2})
+        found = [resource['id'] for resource in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            found += [resource['id'] for resource in response.data['results']]
+        self.assertEqual(len(found), 5)
+        self.assertEqual(len(set(found)), 5)
+
+    def test_writes_update_index(self):
+        response = self.client.patch(reverse('get-resource', args=[self.hello.pk]), {'resource_value': "Goodbye"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.find("goodbye"), [str(self.hello.pk)])
+        self.assertEqual(self.find("world"), [str(self.twice.pk)])
+
+        self.client.delete(reverse('get-resource', args=[self.hello.pk]))
+        self.assertEqual(self.find("goodbye"), [])
+
+        response = self.client.post(reverse('bulk-resources'), [{'resource_value': "bulk one"}], format='json')
+        created = response.data[0]['data']['id']
+        self.assertEqual(self.find("bulk"), [created])
+        self.client.patch(reverse('bulk-resources'), [{'id': created, 'resource_value': "renamed"}], format='json')
+        self.assertEqual(self.find("renamed"), [created])
+        self.assertEqual(self.find("bulk"), [])
+        self.client.delete(reverse('bulk-resources'), [created], format='json')
+        self.assertEqual(self.find("renamed"), [])
+
+    def test_delete_in_bulk(self):
+        Resource.objects.filter(owner=self.user).delete_in_bulk()
+        self.assertEqual(SearchDocument.objects.count(), 1)
+        self.client.force_authenticate(user=self.admin)
+        self.assertEqual(self.find("hello"), [str(self.foreign.pk)])
+
+    def test_ndjson(self):
+        response = self.client.get(reverse('list-resources'), {'q': 'hello', 'format': 'ndjson'})
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [str(self.twice.pk), str(self.hello.pk)])
+
+    def test_query_without_words(self):
+        response = self.client.get(reverse('list-resources'), {'q': ' ,. '})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(PAAS_RESOURCE_COMPRESSION='zlib', PAAS_RESOURCE_COMPRESSION_MIN_SIZE=10)
+    def test_compressed_values(self):
+        resource = Resource.objects.create(owner=self.user, resource_value="compressible " * 20)
+        self.assertEqual(self.find("compressible"), [str(resource.pk)])
+
+
+@override_settings(PAAS_SEARCH_BACKEND='fts5')
+class FTS5SearchTest(SearchTestMixin, APITestCase):
+
+    def test_rebuild_to_tokens(self):
+        with override_settings(PAAS_SEARCH_BACKEND='tokens'):
+            call_command('rebuild_search_index', stdout=io.StringIO())
+            self.assertEqual(self.find("world hello"), [str(self.twice.pk), str(self.hello.pk)])
+
+
+@override_settings(PAAS_SEARCH_BACKEND='tokens')
+class TokenSearchTest(SearchTestMixin, APITestCase):
+
+    def test_tokenize(self):
+        self.assertEqual(search.tokenize("Hello, World_2!"), ['hello', 'world_2'])
+        self.assertEqual(search.parse_query("foo-bar baz*"), [('foo', False), ('bar', False), ('baz', True)])
@@ -0,0 +1,252 @@
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from collections import Counter
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connections
+from django.test import SimpleTestCase
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITransactionTestCase
+from rest_framework.views import status
+from paas.db import sharding
+from paas.models import MyUser as User
+from paas.models import Resource
+from paas.models import ResourceChange
+
+shard_directory = None
+
+
+def setUpModule():
+    # A second SQLite file standing in for a shard, with the same schema as the default database
+    global shard_directory
+    shard_directory = tempfile.mkdtemp()
+    connections.databases['shard1'] = dict(connections.databases['default'],
+                                           NAME=os.path.join(shard_directory, 'shard1.sqlite3'))
+    call_command('migrate', database='shard1', verbosity=0)
+
+
+def tearDownModule():
+    connections['shard1'].close()
+    del connections.databases['shard1']
+    shutil.rmtree(shard_directory)
+
+
+class HashRingTest(SimpleTestCase):
+
+    def test_placement_is_stable(self):
+        owners = [uuid.uuid4() for i in range(2000)]
+        ring = sharding.HashRing(['default', 'shard1'])
+        placed = [ring.lookup(owner) for owner in owners]
+        self.assertEqual(placed, [sharding.HashRing(['shard1', 'default']).lookup(owner) for owner in owners])
+        self.assertEqual(placed, [ring.lookup(str(owner)) for owner in owners])
+        self.assertGreater(min(Counter(placed).values()), 600)
+
+    def test_adding_shard_moves_a_share_of_owners(self):
+        owners = [uuid.uuid4() for i in range(2000)]
+        before = sharding.HashRing(['default', 'shard1'])
+        after = sharding.HashRing(['default', 'shard1', 'shard2'])
+        moved = [after.lookup(owner) for owner in owners if after.lookup(owner) != before.lookup(owner)]
+        self.assertEqual(set(moved), {'shard2'})
+        self.assertLess(len(moved), 1000)
+
+
+@override_settings(PAAS_SHARDS=['default', 'shard1'], PAAS_RESPONSE_CACHE_TTL=0)
+class ShardRoutingTest(APITransactionTestCase):
+    databases = {'default', 'shard1'}
+
+    def setUp(self):
+        # An owner consistent hashing places on shard1
+        owner_id = next(pk for pk in iter(uuid.uuid4, None) if sharding.ring_shard(pk) == 'shard1')
+        self.user = User.objects.create_user('user1', 'user1@gmail.com', password="pwd12345", id=owner_id)
+        self.other = User.objects.create_user('user2', 'user2@gmail.com', password="pwd12345", shard='default')
+        self.admin = User.objects.create_superuser('admin', 'admin@gmail.com', password="pwd12345")
+
+    def create(self, user, value):
+        self.client.force_authenticate(user=user)
+        response = self.client.post(reverse('list-resources'), data={'resource_value': value})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+
+    def test_new_users_are_placed_on_the_ring(self):
+        user = User.objects.create_user('user3', 'user3@gmail.com', password="pwd12345")
+        self.assertEqual(user.shard, sharding.ring_shard(user.pk))
+
+    def test_resources_live_on_the_owners_shard(self):
+        pk = self.create(self.user, "Sharded")
+        self.create(self.other, "Default")
+        self.assertEqual(list(Resource.objects.using('shard1').values_list('pk', flat=True)), [uuid.UUID(pk)])
+        self.assertFalse(Resource.objects.using('default').filter(pk=pk).exists())
+        self.assertEqual(ResourceChange.objects.using('shard1').get().resource_id, uuid.UUID(pk))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.resource_count, 1)
+
+        self.client.force_authenticate(user=self.user)
+        url = reverse('get-resource', args=[pk])
+        self.assertEqual(self.client.get(url).data['resource_value'], "Sharded")
+        response = self.client.patch(url, {'resource_value': "Changed"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Resource.objects.using('shard1').get(pk=pk).resource_value, "Changed")
+        response = self.client.get(reverse('list-resources'), {'q': "changed"})
+        self.assertEqual([resource['id'] for resource in response.data['results']], [pk])
+
+        self.client.force_authenticate(user=self.other)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_404_NOT_FOUND)
+
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Resource.objects.using('shard1').exists())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.resource_count, 0)
+
+    def test_admin_lists_all_shards(self):
+        created = {self.create(self.user, "Sharded {}".format(i)) for i in range(3)}
+        created |= {self.create(self.other, "Default {}".format(i)) for i in range(3)}
+
+        self.client.force_authenticate(user=self.admin)
+        listed, url, params = [], reverse('list-resources'), {'page_size': 4}
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            listed.extend(resource['id'] for resource in response.data['results'])
+            url, params = response.data['next'], None
+        self.assertEqual(len(listed), 6)
+        self.assertEqual(set(listed), created)
+
+        response = self.client.get(reverse('list-resources'), {'format': 'ndjson'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['id'] for row in rows], listed)
+        self.assertEqual({row['owner']['username'] for row in rows}, {'user1', 'user2'})
+
+        response = self.client.get(reverse('list-resources'), {'owner_id': self.user.pk})
+        self.assertEqual(len(response.data['results']), 3)
+        response = self.client.get(reverse('list-resources'), {'q': "sharded"})
+        self.assertEqual(len(response.data['results']), 3)
+
+        pk = next(iter(created))
+        response = self.client.get(reverse('get-resource', args=[pk]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_admin_locates_resource_on_cache_miss_only(self):
+        pk = self.create(self.user, "Sharded")
+        self.client.force_authenticate(user=self.admin)
+        url = reverse('get-resource', args=[pk])
+        with self.settings(PAAS_RESPONSE_CACHE_TTL=300), \
+                mock.patch.object(sharding, 'locate_resource', wraps=sharding.locate_resource) as locate:
+            first = self.client.get(url)
+            self.assertEqual(first.data['resource_value'], "Sharded")
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(locate.call_count, 1)
+            response = self.client.patch(url, {'resource_value': "Changed"})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(locate.call_count, 2)
+        self.assertEqual(Resource.objects.using('shard1').get(pk=pk).resource_value, "Changed")
+
+    def test_change_feed_is_per_shard(self):
+        self.create(self.user, "Sharded")
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse('resource-changes'))
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertTrue(response.data['since'].startswith('shard1:'))
+
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('resource-changes'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('resource-changes'), {'owner_id': self.user.pk})
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_rebalance_moves_owner(self):
+        pks = {self.create(self.user, "Value {}".format(i)) for i in range(5)}
+        self.client.force_authenticate(user=self.user)
+        since = self.client.get(reverse('resource-changes'))
+
+        moved = sharding.move_owner(self.user, 'default', batch_size=2)
+        self.assertEqual(moved, 5)
+        self.assertFalse(Resource.objects.using('shard1').exists())
+        self.assertFalse(ResourceChange.objects.using('shard1').exists())
+        self.assertEqual({str(pk) for pk in Resource.objects.using('default').values_list('pk', flat=True)}, pks)
+
+        self.user.refresh_from_db()
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse('list-resources'))
+        self.assertEqual({resource['id'] for resource in response.data['results']}, pks)
+        response = self.client.get(reverse('list-resources'), {'q': "value"})
+        self.assertEqual(len(response.data['results']), 5)
+        response = self.client.get(reverse('resource-changes'), {'since': since.data['since']})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+        out = StringIO()
+        call_command('rebalance_shards', owner=[str(self.user.pk)], grace=0, stdout=out)
+        self.assertIn("1 owner(s) moved", out.getvalue())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.shard, 'shard1')
+        self.assertEqual(Resource.objects.using('shard1').count(), 5)
+        self.assertFalse(Resource.objects.using('default').exists())
+
+    def test_rebalance_waits_once(self):
+        self.create(self.user, "Value")
+        sharding.move_owner(self.user, 'default')
+        owner_id = next(pk for pk in iter(uuid.uuid4, None) if sharding.ring_shard(pk) == 'shard1')
+        other = User.objects.create_user('user3', 'user3@gmail.com', password="pwd12345", id=owner_id,
+                                         shard='default')
+        self.create(other, "Other")
+
+        out = StringIO()
+        with mock.patch('paas.management.commands.rebalance_shards.time.sleep') as sleep:
+            call_command('rebalance_shards', owner=[str(self.user.pk), str(other.pk)], grace=300, stdout=out)
+        sleep.assert_called_once_with(300)
+        self.assertIn("2 owner(s) moved", out.getvalue())
+        self.assertEqual(Resource.objects.using('shard1').count(), 2)
+        self.assertFalse(Resource.objects.using('default').exists())
+        self.assertFalse(ResourceChange.objects.using('default').exists())
+
+    def test_copy_keeps_newer_versions_and_replays_deletes(self):
+        kept, changed, deleted = (self.create(self.user, "Value {}".format(i)) for i in range(3))
+        sharding.copy_resources([kept, changed, deleted], 'shard1', 'default')
+        self.assertEqual(Resource.objects.using('default').count(), 3)
+        self.assertFalse(ResourceChange.objects.using('default').exists())
+
+        Resource.objects.using('default').filter(pk=kept).update(resource_value="Newer on target", version=5)
+        self.client.force_authenticate(user=self.user)
+        self.client.patch(reverse('get-resource', args=[changed]), {'resource_value': "Changed"})
+        self.client.delete(reverse('get-resource', args=[deleted]))
+        sharding.copy_resources([kept, changed, deleted], 'shard1', 'default')
+        copies = dict(Resource.objects.using('default').values_list('pk', 'resource_value'))
+        self.assertEqual(copies, {uuid.UUID(kept): "Newer on target", uuid.UUID(changed): "Changed"})
+        self.assertEqual(list(ResourceChange.objects.using('default').values_list('resource_id', 'kind')),
+                         [(uuid.UUID(deleted), 'deleted')])
+
+    def test_writes_during_grace_reach_new_shard(self):
+        pk = self.create(self.user, "Value")
+        # The user as an authentication cache still holds it, on its old shard
+        self.client.force_authenticate(user=User.objects.get(pk=self.user.pk))
+        responses = []
+
+        def write(seconds):
+            responses.append(self.client.patch(reverse('get-resource', args=[pk]), {'resource_value': "Changed"}))
+            responses.append(self.client.post(reverse('list-resources'), data={'resource_value': "New"}))
+
+        with mock.patch.object(sharding.time, 'sleep', side_effect=write):
+            sharding.move_owner(User.objects.get(pk=self.user.pk), 'default', grace=30)
+        self.assertEqual([response.status_code for response in responses],
+                         [status.HTTP_200_OK, status.HTTP_201_CREATED])
+        self.assertEqual(set(Resource.objects.using('default').values_list('resource_value', flat=True)),
+                         {"Changed", "New"})
+        self.assertFalse(Resource.objects.using('shard1').exists())
+
+    def test_user_delete_reaches_shard(self):
+        self.create(self.user, "Sharded")
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.delete(reverse('get-user', args=[self.user.pk]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Resource.objects.using('shard1').exists())
+        self.assertEqual(ResourceChange.objects.using('shard1').latest('id').kind, 'deleted')
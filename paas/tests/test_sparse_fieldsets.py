@@ -0,0 +1,69 @@
+import json
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework import status
+from paas.models import MyUser as User
+from paas.models import Resource
+
+
+class SparseFieldsetTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('user1', 'user1@gmail.com', 'pwd12345')
+        self.admin = User.objects.create_superuser('admin', 'admin@gmail.com', 'pwd12345')
+        self.resource = Resource.objects.create(owner=self.user, resource_value="User1 Resource1")
+        Resource.objects.create(owner=self.user, resource_value="User1 Resource2")
+
+    def test_list_resources_fields(self):
+        self.client.force_authenticate(user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('list-resources'), {'fields': 'id'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([list(item) for item in response.data['results']], [['id'], ['id']])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('resource_value', queries[0]['sql'])
+        self.assertNotIn('paas_myuser', queries[0]['sql'])
+
+    def test_list_resources_exclude(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse('list-resources'), {'exclude': 'resource_value'})
+        self.assertEqual(list(response.data['results'][0]), ['id', 'owner'])
+        self.assertEqual(response.data['results'][0]['owner']['username'], 'user1')
+
+    def test_list_resources_ndjson_fields(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse('list-resources'), {'format': 'ndjson', 'fields': 'id,resource_value'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(sorted(row['resource_value'] for row in rows), ["User1 Resource1", "User1 Resource2"])
+        self.assertEqual(list(rows[0]), ['id', 'resource_value'])
+
+    def test_unknown_field(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse('list-resources'), {'fields': 'id,password'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_resource_fields(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse('get-resource', args=[self.resource.id])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'fields': 'id,owner'})
+        self.assertEqual(response.data, {'id': str(self.resource.id), 'owner': self.user.id})
+        self.assertNotIn('resource_value', queries[0]['sql'])
+        response = self.client.get(url)
+        self.assertEqual(response.data['resource_value'], "User1 Resource1")
+
+    def test_users_fields(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('list-users'), {'fields': 'id,username'})
+        self.assertEqual([list(item) for item in response.data], [['id', 'username']] * 2)
+        response = self.client.get(reverse('get-user', args=[self.user.id]), {'exclude': 'quota,quota_left'})
+        self.assertEqual(list(response.data), ['id', 'username', 'resource_count'])
+
+    def test_writes_ignore_fields(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(reverse('list-resources') + '?fields=id', {'resource_value': "New Value"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['resource_value'], "New Value")
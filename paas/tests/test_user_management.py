@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.contrib.sessions.models import Session
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework.views import status
@@ -67,3 +69,14 @@ class UserLoginTest(APITestCase):
         response = self.client.post(reverse('user-login'), data={'email': 'user1@gmail.com', 'password': 'pwd12345'})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['username'], 'user1')
+        self.assertTrue(response.data['token'])
+        # The token is the credential: no session is stored nor cookie set
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertFalse(Session.objects.exists())
+        self.assertIsNotNone(User.objects.get(username='user1').last_login)
+
+    def test_user_login_reuses_token(self):
+        data = {'email': 'user1@gmail.com', 'password': 'pwd12345'}
+        first = self.client.post(reverse('user-login'), data=data)
+        second = self.client.post(reverse('user-login'), data=data)
+        self.assertEqual(first.data['token'], second.data['token'])
@@ -1,9 +1,19 @@
+import threading
+import time
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test.utils import CaptureQueriesContext
+from django.db import OperationalError, connection, transaction
 from django.urls import reverse
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APITransactionTestCase
 from rest_framework import status
 from paas.models import MyUser as User
 from paas.models import Resource
+from paas.models import QuotaExceeded
 from paas.serializers import UserQuotaSerializer
+from paas.views import ManageUserView
 
 
 class UserSetup(APITestCase):
@@ -64,6 +74,24 @@ class UserQuotaTest(UserSetup):
         self.assertEqual(us.quota, None)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_change_user_quota_requires_quota(self):
+        self.client.login(username="admin", password="pwd12345")
+        us = User.objects.get(username='user2')
+        response = self.client.patch(reverse('get-user', args=[us.id]), data={'username': 'renamed'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_change_user_quota_keeps_concurrent_count(self):
+        self.client.login(username="admin", password="pwd12345")
+        stale = User.objects.get(username='user2')
+        # A create committing between the view loading the user and locking it
+        Resource.objects.create(owner=stale, resource_value="Test Resource1")
+        with mock.patch.object(ManageUserView, 'get_object', return_value=stale):
+            response = self.client.patch(reverse('get-user', args=[stale.id]), data={'quota': 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['resource_count'], response.data['quota_left']), (2, 3))
+        us = User.objects.get(username='user2')
+        self.assertEqual((us.resource_count, us.quota, us.quota_left), (2, 5, 3))
+
     def test_change_user_quota_as_user(self):
         self.client.login(username="user1", password="pwd12345")
         us = User.objects.get(username='user1')
@@ -130,3 +158,69 @@ class UserQuotaUpdateWithResource(UserSetup):
 
         response = self.client.post(reverse('list-resources'), data={'owner': us.id, 'resource_value': 'New Resource1'})
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ResourceCountTest(UserSetup):
+
+    def test_count_follows_creates_and_deletes(self):
+        us = User.objects.get(username='user2')
+        self.assertEqual(us.resource_count, 1)
+        resource = Resource.objects.create(owner=us, resource_value="Test Resource1")
+        us.refresh_from_db()
+        self.assertEqual(us.resource_count, 2)
+        resource.delete()
+        Resource.objects.filter(owner=us).delete_in_bulk()
+        us.refresh_from_db()
+        self.assertEqual(us.resource_count, 0)
+
+    def test_quota_update_does_not_count_resources(self):
+        self.client.force_authenticate(user=User.objects.get(username='admin'))
+        us = User.objects.get(username='user2')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(reverse('get-user', args=[us.id]), data={'quota': 3})
+        self.assertEqual(response.data['quota_left'], 2)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries))
+
+    def test_reconcile_resource_counts(self):
+        us = User.objects.get(username='user2')
+        User.objects.filter(pk=us.pk).update(resource_count=7, quota=3, quota_left=0)
+        out = StringIO()
+        call_command('reconcile_resource_counts', stdout=out)
+        us.refresh_from_db()
+        self.assertEqual(us.resource_count, 1)
+        self.assertEqual(us.quota_left, 2)
+        self.assertIn('1 user(s) had drifted', out.getvalue())
+
+
+class ConcurrentQuotaTest(APITransactionTestCase):
+
+    def test_parallel_creates_do_not_overshoot_quota(self):
+        user = User.objects.create_user('user1', 'user1@gmail.com', 'pwd12345', quota=5, quota_left=5)
+        results = []
+
+        def create():
+            # The shared in-memory SQLite test database reports lock contention instead of waiting
+            while True:
+                try:
+                    with transaction.atomic():
+                        Resource.objects.create(owner_id=user.id, resource_value="Parallel Resource")
+                    results.append(True)
+                    break
+                except QuotaExceeded:
+                    results.append(False)
+                    break
+                except OperationalError:
+                    time.sleep(0.001)
+            connection.close()
+
+        threads = [threading.Thread(target=create) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        user.refresh_from_db()
+        self.assertEqual(results.count(True), 5)
+        self.assertEqual(results.count(False), 15)
+        self.assertEqual(Resource.objects.filter(owner=user).count(), 5)
+        self.assertEqual(user.quota_left, 0)
@@ -0,0 +1,74 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Token bucket per client key. The rate setting reads like DRF's, e.g. '10/min':
+    a full bucket allows 10 requests at once and refills at 10 a minute. Buckets
+    live in the PAAS_THROTTLE_CACHE cache alias, like the history of DRF's
+    SimpleRateThrottle, so every process sharing it applies the same limit. Entries
+    expire once their bucket would be full again.
+    """
+    scope = None
+    rate_setting = None
+    durations = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'PAAS_THROTTLE_CACHE', 'default')]
+
+    def get_rate(self):
+        rate = getattr(settings, self.rate_setting, None)
+        if rate is None:
+            return None
+        count, period = rate.split('/')
+        return int(count), int(count) / float(self.durations[period[0]])
+
+    def get_key(self, request, view):
+        raise NotImplementedError('.get_key() must be overridden')
+
+    def get_cache_key(self, key):
+        # Hashed, client supplied keys may hold characters cache backends refuse
+        return 'paas:throttle:{}:{}'.format(self.scope, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def allow_request(self, request, view):
+        rate = self.get_rate()
+        key = self.get_key(request, view)
+        if rate is None or key is None:
+            return True
+        capacity, refill = rate
+        now = time.time()
+        cache_key = self.get_cache_key(key)
+        tokens, updated = self.cache.get(cache_key, (capacity, now))
+        tokens = min(capacity, tokens + max(0, now - updated) * refill)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self.cache.set(cache_key, (tokens, now), (capacity - tokens) / refill + 1)
+        self.wait_seconds = None if allowed else (1 - tokens) / refill
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class LoginIPThrottle(TokenBucketThrottle):
+    scope = 'login_ip'
+    rate_setting = 'PAAS_LOGIN_IP_RATE'
+
+    def get_key(self, request, view):
+        return self.get_ident(request)
+
+
+class LoginAccountThrottle(TokenBucketThrottle):
+    scope = 'login_account'
+    rate_setting = 'PAAS_LOGIN_ACCOUNT_RATE'
+
+    def get_key(self, request, view):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        return email.strip().lower() if isinstance(email, str) else None
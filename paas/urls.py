@@ -2,15 +2,27 @@ from django.urls import path
 from paas.views import ListCreateUsersView
 from paas.views import ListCreateResourceView
 from paas.views import ManageResource
+from paas.views import BulkResourceView
+from paas.views import ResourceChangesView
 from paas.views import LoginView
+from paas.views import LogoutView
+from paas.views import MetricsView
 from paas.views import ManageUserView
+from paas.views import JobView
 
 urlpatterns = [
     path('login/', LoginView.as_view(), name='user-login'),
+    path('logout/', LogoutView.as_view(), name='user-logout'),
 
     path('users/', ListCreateUsersView.as_view(), name="list-users"),
     path('users/<uuid:pk>', ManageUserView.as_view(), name="get-user"),
 
     path('resources/', ListCreateResourceView.as_view(), name="list-resources"),
-    path('resources/<uuid:pk>', ManageResource.as_view(), name="get-resource")
+    path('resources/bulk/', BulkResourceView.as_view(), name="bulk-resources"),
+    path('resources/changes/', ResourceChangesView.as_view(), name="resource-changes"),
+    path('resources/<uuid:pk>', ManageResource.as_view(), name="get-resource"),
+
+    path('jobs/<uuid:pk>', JobView.as_view(), name="get-job"),
+
+    path('metrics/', MetricsView.as_view(), name="metrics"),
 ]
@@ -1,74 +1,164 @@
+import functools
+import heapq
+import itertools
+
 from django.contrib.auth import authenticate
-from django.contrib.auth import login
+from django.contrib.auth import logout
+from django.contrib.auth.signals import user_logged_in
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db import router
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.http import StreamingHttpResponse
+from django.urls import reverse
 from rest_framework import generics
+from rest_framework.authtoken.models import Token
+from rest_framework.views import APIView
 from rest_framework.permissions import IsAdminUser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.exceptions import ParseError
+from rest_framework.exceptions import NotFound
 from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import Throttled
+from rest_framework import serializers
 from paas.models import MyUser as User
 from paas.serializers import UserSerializer
 from paas.models import Resource
+from paas.models import QuotaExceeded
+from paas.models import reserve_quota
 from paas.serializers import ResourceSerializer
 from paas.serializers import ListResourceSerializer
 from paas.serializers import UserLoginSerializer
 from paas.serializers import UserQuotaSerializer
+from paas.serializers import BulkCreateResourceSerializer
+from paas.serializers import BulkUpdateResourceSerializer
+from paas.serializers import JobSerializer
+from paas.serializers import ResourceChangeSerializer
+from paas.models import Job
+from paas.models import ResourceChange
+from paas.jobs import schedule_user_deletion
 from paas.permissions import ResourceOwnerReadOnly
+from paas.pagination import OwnerKeysetPagination
+from paas.pagination import SearchPagination
+from paas.pagination import ChangeFeedPagination
+from paas.preconditions import PreconditionFailed
+from paas.preconditions import if_none_match
+from paas.preconditions import parse_if_match
+from paas.preconditions import resource_etag
+from paas.renderers import NDJSONRenderer
+from paas.fieldsets import SparseFieldsetMixin
+from paas.fieldsets import SparseFieldsetFilter
+from paas.db.routers import ReplicaReadMixin
+from paas.db.routers import ShardRoutingMixin
+from paas.db.routers import use_shard
+from paas.db import sharding
+from paas.fastserializers import compile_serializer
+from paas.search import SearchFilter
+from paas import search
+from paas import changes
+from paas.cache import response_cache
+from paas.authentication import credential_cache
+from paas.authentication import token_cache
+from paas.hashing import HashingPoolSaturated
+from paas.throttling import LoginIPThrottle
+from paas.throttling import LoginAccountThrottle
+from paas import metrics
 
 
-class ListCreateUsersView(generics.ListCreateAPIView):
+class ListCreateUsersView(ReplicaReadMixin, SparseFieldsetMixin, generics.ListCreateAPIView):
     """
     post:
         Create a User
     get:
-        List all Users
+        List all Users. Use ?fields= or ?exclude= to select the returned fields.
     """
     permission_classes = (IsAdminUser,)
+    filter_backends = (SparseFieldsetFilter,)
 
     queryset = User.objects.all()
     serializer_class = UserSerializer
 
+    def list(self, request, *args, **kwargs):
+        serializer = compile_serializer(UserSerializer, self.get_sparse_fields())
+        rows = list(self.filter_queryset(self.get_queryset()).values(*serializer.columns))
+        with metrics.span('serialize'):
+            data = serializer.serialize(rows)
+        return Response(data)
+
 
-class ManageUserView(generics.RetrieveUpdateDestroyAPIView):
+class ManageUserView(ReplicaReadMixin, SparseFieldsetMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     get:
-        Retrieve a User based with id
+        Retrieve a User based with id. Use ?fields= or ?exclude= to select the returned fields.
     put:
         Update User data
     patch:
         Update User data
     delete:
-        Delete a User with id
+        Delete a User with id and its Resources. Users with more Resources than
+        PAAS_USER_DELETE_SYNC_LIMIT are deactivated and deleted by a background job:
+        the response is 202 with the job, whose progress is at the Location URL.
     """
     permission_classes = (IsAdminUser,)
+    filter_backends = (SparseFieldsetFilter,)
 
     queryset = User.objects.all()
     serializer_class = UserQuotaSerializer
 
-    def perform_update(self, serializer):
+    def destroy(self, request, *args, **kwargs):
         user = self.get_object()
-        serializer.validated_data.pop('quota_left', None)
-        resource_count = Resource.objects.filter(owner=user).count()
+        if user.resource_count <= getattr(settings, 'PAAS_USER_DELETE_SYNC_LIMIT', 1000) and not user.pending_delete:
+            resources = Resource.objects.using(sharding.user_shard(user)).filter(owner=user)
+            with sharding.atomic(DEFAULT_DB_ALIAS, resources.db):
+                resources.delete_in_bulk()
+                user.delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        job = schedule_user_deletion(user)
+        return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED,
+                        headers={'Location': reverse('get-job', kwargs={'pk': job.pk})})
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        # Locking the owner row waits for in-flight resource creates to commit before reading the count
+        user = User.objects.select_for_update().get(pk=serializer.instance.pk)
+        if 'quota' not in serializer.validated_data:
+            raise ParseError("quota is required")
         quota = serializer.validated_data['quota']
 
-        if resource_count > quota:
+        if quota is not None and user.resource_count > quota:
             raise ParseError("More Resources exists than quota")
-        user = serializer.save()
-        user.quota_left = quota - resource_count
-        user.save()
+        # Only the quota columns: a full save would write back counts read before the lock
+        user.quota = quota
+        user.quota_left = None if quota is None else quota - user.resource_count
+        user.save(update_fields=['quota', 'quota_left'])
+        serializer.instance = user
 
 
-class ListCreateResourceView(generics.ListCreateAPIView):
+class ListCreateResourceView(ShardRoutingMixin, ReplicaReadMixin, SparseFieldsetMixin, generics.ListCreateAPIView):
     """
     post:
         Create a Resource
     get:
-        List all Resources
+        List all Resources. Use ?format=ndjson to stream every Resource as newline delimited JSON,
+        and ?fields= or ?exclude= to select the returned fields. ?q=words lists the Resources
+        containing all words (word* for a prefix), best matches first. Admin listings over all
+        owners of a sharded setup query the shards in parallel and merge their pages.
     """
     permission_classes = (IsAuthenticated,)
+    filter_backends = (SparseFieldsetFilter, SearchFilter)
+    always_load = ('id', 'owner')
+    search_query_param = 'q'
 
     serializer_class = ResourceSerializer
+    pagination_class = OwnerKeysetPagination
+    renderer_classes = tuple(api_settings.DEFAULT_RENDERER_CLASSES) + (NDJSONRenderer,)
+    stream_chunk_size = 2000
 
     def get_queryset(self):
         if self.request.user.is_staff:
@@ -80,9 +170,116 @@ class ListCreateResourceView(generics.ListCreateAPIView):
         return Resource.objects.filter(owner=self.request.user)
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = ListResourceSerializer(queryset, many=True)
-        return Response(serializer.data)
+        # Listings are built from values() rows, without model instances or DRF field objects
+        serializer = compile_serializer(ListResourceSerializer, self.get_sparse_fields(ListResourceSerializer))
+        columns = dict.fromkeys(serializer.columns + list(self.always_load))
+        owner_columns = self.get_owner_columns(columns)
+        queryset = self.get_queryset().values(*(column for column in columns if column not in owner_columns))
+        find = self.get_search()
+        if isinstance(request.accepted_renderer, NDJSONRenderer):
+            return self.stream(request.accepted_renderer, queryset, serializer, find)
+
+        key = response_cache.list_key(self.get_cache_scope(), request.build_absolute_uri())
+        entry = response_cache.get_list(key)
+        if entry is None:
+            if find is None:
+                page = self.paginator.paginate_querysets(self.get_querysets(queryset), request)
+            else:
+                self._paginator = SearchPagination()
+                page = self.get_ranked_rows(queryset, self.paginator.paginate_search(find, request))
+            page = self.join_owners(page, owner_columns)
+            with metrics.span('serialize'):
+                data = serializer.serialize(page)
+            entry = response_cache.set(key, self.get_paginated_response(data).data)
+        return response_cache.respond(request, entry)
+
+    def get_cache_scope(self):
+        if self.request.user.is_staff:
+            return self.request.query_params.get('owner_id') or response_cache.all_owners
+        return str(self.request.user.id)
+
+    def get_querysets(self, queryset):
+        """
+        queryset on every shard the request spans, or alone when it is routed to one.
+        """
+        aliases = self.get_fan_out_shards()
+        if aliases is None:
+            return [queryset]
+        return [queryset.using(alias) for alias in aliases]
+
+    def get_owner_columns(self, columns):
+        """
+        The columns of columns read from the owner, which are not joined on shards,
+        users living on the default database only.
+        """
+        if not sharding.sharding_enabled():
+            return []
+        return [column for column in columns if column.startswith('owner__')]
+
+    def join_owners(self, rows, columns):
+        """
+        Fill in the owner columns of rows from one query on the users.
+        """
+        if not columns or not rows:
+            return rows
+        fields = {column: column[len('owner__'):] for column in columns}
+        owners = {owner['id']: owner for owner in User.objects.filter(pk__in={row['owner'] for row in rows}).values(
+            *dict.fromkeys(['id'] + list(fields.values())))}
+        for row in rows:
+            owner = owners.get(row['owner'], {})
+            row.update((column, owner.get(field)) for column, field in fields.items())
+        return rows
+
+    def get_search(self):
+        """
+        search.search() bound to the ?q= terms and the owners get_queryset allows,
+        or None when the request does not search.
+        """
+        query = self.request.query_params.get(self.search_query_param)
+        if query is None:
+            return None
+        terms = search.parse_query(query)
+        if not terms:
+            raise ParseError("Search query has no words")
+        owner_id = self.request.user.id
+        if self.request.user.is_staff:
+            owner_id = self.request.query_params.get('owner_id') or None
+        aliases = self.get_fan_out_shards()
+        if aliases is not None:
+            return functools.partial(search.search_databases, terms, owner_id=owner_id, using=aliases)
+        return functools.partial(search.search, terms, owner_id=owner_id, using=router.db_for_read(Resource))
+
+    def get_ranked_rows(self, queryset, ranked):
+        # The index only yields ids; rows come from the queryset, which also applies the owner scope
+        pks = [pk for score, pk in ranked]
+        rows = {}
+        for found in sharding.fan_out(lambda shard: list(shard.filter(pk__in=pks)), self.get_querysets(queryset)):
+            rows.update((row['id'], row) for row in found)
+        return [rows[pk] for score, pk in ranked if pk in rows]
+
+    def iterate_ranked_rows(self, queryset, find):
+        after = None
+        while True:
+            ranked = find(after=after, limit=self.stream_chunk_size)
+            yield from self.get_ranked_rows(queryset, ranked)
+            if len(ranked) < self.stream_chunk_size:
+                return
+            after = ranked[-1]
+
+    def stream(self, renderer, queryset, serializer, find=None):
+        if find is None:
+            rows = heapq.merge(*(shard.order_by('owner_id', 'id').iterator(chunk_size=self.stream_chunk_size)
+                                 for shard in self.get_querysets(queryset)),
+                               key=lambda row: (row['owner'], row['id']))
+        else:
+            rows = self.iterate_ranked_rows(queryset, find)
+        columns = self.get_owner_columns(serializer.columns)
+        if columns:
+            unjoined = iter(rows)
+            chunks = iter(lambda: list(itertools.islice(unjoined, self.stream_chunk_size)), [])
+            rows = itertools.chain.from_iterable(self.join_owners(chunk, columns) for chunk in chunks)
+        rows = (serializer.to_representation(row) for row in rows)
+        return StreamingHttpResponse(renderer.render_stream(rows), content_type=renderer.media_type)
 
     def create(self, request, *args, **kwargs):
         data = request.data.copy()
@@ -92,58 +289,414 @@ class ListCreateResourceView(generics.ListCreateAPIView):
         else:
             data['owner'] = request.user.id
 
-        owner = User.objects.get(pk=data['owner'])
-        if owner.quota is not None and owner.quota_left == 0:
-            raise ParseError("User Quota Exceeded ")
-
         serializer = self.get_serializer(data=data)
         serializer.is_valid(raise_exception=True)
-        self.perform_create(serializer)
+        try:
+            with sharding.owner_write(serializer.validated_data['owner'].pk) as shard:
+                if sharding.sharding_enabled():
+                    use_shard(shard)
+                self.perform_create(serializer)
+        except QuotaExceeded:
+            raise ParseError("User Quota Exceeded ")
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
 
-class ManageResource(generics.RetrieveUpdateDestroyAPIView):
+class ManageResource(ShardRoutingMixin, ReplicaReadMixin, SparseFieldsetMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     get:
-        Retrieve a Resource based on its id
+        Retrieve a Resource based on its id. Use ?fields= or ?exclude= to select the returned fields.
+        The ETag header carries the Resource version; If-None-Match with it gives a 304.
     put:
-        Update a Resource based on its id
+        Update a Resource based on its id. With If-Match, only if it is still at that version (412 otherwise).
     patch:
-        Update a Resource based on its id
+        Update a Resource based on its id. With If-Match, only if it is still at that version (412 otherwise).
     delete:
-        Delete a Resource based on its id
+        Delete a Resource based on its id. With If-Match, only if it is still at that version (412 otherwise).
     """
 
-    permission_classes = (ResourceOwnerReadOnly, )
+    permission_classes = (IsAuthenticated, ResourceOwnerReadOnly)
+    filter_backends = (SparseFieldsetFilter,)
+    always_load = ('pk', 'owner', 'version')
 
     queryset = Resource.objects.all()
     serializer_class = ResourceSerializer
 
+    def get_queryset(self):
+        # Other users' resources are not found: the lookup is one WHERE owner_id = ? AND id = ? query
+        if self.request.user.is_superuser:
+            self.use_resource_shard()
+            return super().get_queryset()
+        return super().get_queryset().filter(owner_id=self.request.user.id)
+
+    def get_shard(self):
+        # An admin's shard is only looked up once the database is needed, see use_resource_shard()
+        if self.request.user.is_superuser:
+            return None
+        return sharding.user_shard(self.request.user)
+
+    def use_resource_shard(self):
+        """
+        Route to the shard holding the requested resource, which an admin may ask for
+        whoever owns it. Asks every shard, so it only runs on a response cache miss.
+        """
+        if sharding.sharding_enabled() and not getattr(self, 'resource_shard_located', False):
+            use_shard(sharding.locate_resource(self.kwargs['pk']))
+            self.resource_shard_located = True
+
+    def retrieve(self, request, *args, **kwargs):
+        fields = self.get_sparse_fields()
+        key = response_cache.resource_key(kwargs['pk'], fields)
+        entry = response_cache.get_resource(key)
+        if entry is None:
+            if_none_match_header = request.META.get('HTTP_IF_NONE_MATCH')
+            # A revalidation is answered from the version, without loading or serializing the value
+            if if_none_match_header is not None:
+                etag = resource_etag(self.get_version(kwargs['pk']), fields)
+                if if_none_match(if_none_match_header, etag):
+                    return Response(status=status.HTTP_304_NOT_MODIFIED,
+                                    headers={'ETag': etag, 'Cache-Control': 'private, no-cache'})
+            # Read the owner's generation before the query when the owner is known up front
+            generation = None if request.user.is_staff else response_cache.generation(str(request.user.id))
+            instance = self.get_object()
+            if generation is None:
+                generation = response_cache.generation(str(instance.owner_id))
+            with metrics.span('serialize'):
+                data = self.get_serializer(instance).data
+            entry = response_cache.set(key, data, etag=resource_etag(instance.version, fields),
+                                       owner_id=instance.owner_id, generation=generation)
+        elif not request.user.is_superuser and entry['owner_id'] != request.user.id:
+            raise NotFound()
+        return response_cache.respond(request, entry)
+
+    def get_version(self, pk):
+        version = self.get_queryset().filter(pk=pk).values_list('version', flat=True).first()
+        if version is None:
+            raise NotFound()
+        return version
+
+    def get_conditional_queryset(self, instance):
+        """
+        The instance's row, narrowed to the versions If-Match accepts, so the write
+        that follows checks the version in its own WHERE clause.
+        """
+        resources = Resource.objects.filter(pk=instance.pk)
+        versions = parse_if_match(self.request.META.get('HTTP_IF_MATCH'))
+        if versions is not None:
+            resources = resources.filter(version__in=versions)
+        return resources
+
+    def update(self, request, *args, **kwargs):
+        partial = kwargs.pop('partial', False)
+        instance = self.get_object()
+        serializer = self.get_serializer(instance, data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
+        return Response(serializer.data, headers={'ETag': resource_etag(instance.version)})
+
     def perform_update(self, serializer):
+        instance = serializer.instance
+        # PUT repeats the owner; only a different one is refused
         owner = serializer.validated_data.pop('owner', None)
-        if owner:
+        if owner is not None and owner.pk != instance.owner_id:
             raise ParseError("Change owner not allowed")
-        serializer.save()
+        instance.resource_value = serializer.validated_data.get('resource_value', instance.resource_value)
+        with sharding.owner_write(instance.owner_id) as shard:
+            resources = self.get_conditional_queryset(instance).using(shard)
+            if not resources.update(resource_value=instance.resource_value, version=F('version') + 1):
+                raise PreconditionFailed()
+            instance.version = Resource.objects.using(resources.db).values_list('version', flat=True).get(
+                pk=instance.pk)
+            search.index_resources([instance], resources.db)
+            changes.record([instance], changes.UPDATED, resources.db)
+            response_cache.invalidate_owners([instance.owner_id])
+
+    def perform_destroy(self, instance):
+        with sharding.owner_write(instance.owner_id) as shard:
+            if not self.get_conditional_queryset(instance).using(shard).delete_in_bulk():
+                raise PreconditionFailed()
+
+
+class ResourceChangesView(ShardRoutingMixin, generics.ListAPIView):
+    """
+    get:
+        Resource creates, updates and deletes in order, after the ?since= change id
+        (?since=latest skips all changes so far). Resume from the "next" URL; "more"
+        says whether it has changes already. With ?wait=seconds an empty page waits
+        up to PAAS_CHANGES_MAX_WAIT for the next change. A cursor older than the
+        retained log, or from before the owner moved to another shard, is answered
+        with 410: sync from a full listing and ?since=latest. Each shard has its own
+        log, so on a sharded setup admins read it per owner, with ?owner_id=.
+    """
+    permission_classes = (IsAuthenticated,)
+
+    serializer_class = ResourceChangeSerializer
+    pagination_class = ChangeFeedPagination
+
+    def get_queryset(self):
+        if self.request.user.is_staff:
+            resource_changes = ResourceChange.objects.all()
+            owner_id = self.request.query_params.get('owner_id', None)
+            if owner_id:
+                resource_changes = resource_changes.filter(owner_id=owner_id)
+            return resource_changes
+        return ResourceChange.objects.filter(owner_id=self.request.user.id)
+
+    def get_wait(self):
+        try:
+            wait = float(self.request.query_params.get('wait', 0))
+        except ValueError:
+            raise ParseError("wait must be a number of seconds")
+        return max(0, min(wait, getattr(settings, 'PAAS_CHANGES_MAX_WAIT', 30)))
+
+    def list(self, request, *args, **kwargs):
+        if self.get_fan_out_shards() is not None:
+            raise ParseError("owner_id is required while resources are sharded")
+        queryset = self.get_queryset()
+        page = self.paginator.paginate_changes(queryset, request, wait=self.get_wait(), shard=queryset.db)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+
+class BulkResourceView(ShardRoutingMixin, generics.GenericAPIView):
+    """
+    post:
+        Create Resources from a list of {resource_value, owner}
+    patch:
+        Update Resources from a list of {id, resource_value}
+    delete:
+        Delete Resources from a list of ids
+
+    Each item gets its own status in the response, in request order. Quota is
+    reserved per owner for the whole batch, so an owner's items are either all
+    created or all rejected. Admin requests over all owners of a sharded setup
+    write to each shard in turn, in a transaction per shard.
+    """
+    permission_classes = (IsAuthenticated,)
+
+    serializer_class = BulkCreateResourceSerializer
+
+    def get_queryset(self):
+        if self.request.user.is_staff:
+            return Resource.objects.all()
+        return Resource.objects.filter(owner=self.request.user)
+
+    def write_shards(self, write):
+        """
+        write(alias, locking) for each shard holding resources to write, in a transaction
+        on it and on the default database, with the results in a list. A user's writes
+        hold their row lock (sharding.owner_write()). An admin's get locking=alias while
+        sharding is on: they lock the owners of the rows they find with owners_on() and
+        leave out those whose owner has moved to another shard since.
+        """
+        if not self.request.user.is_staff:
+            with sharding.owner_write(self.request.user.id) as shard:
+                return [write(shard, None)]
+        results = []
+        for alias in self.get_fan_out_shards() or [router.db_for_write(Resource)]:
+            with sharding.atomic(DEFAULT_DB_ALIAS, alias):
+                results.append(write(alias, alias if sharding.sharding_enabled() else None))
+        return results
+
+    @staticmethod
+    def owners_on(alias, owner_ids):
+        """
+        The owners among owner_ids still on alias, locked; all of them when alias is None.
+        """
+        if alias is None:
+            return set(owner_ids)
+        return {pk for pk, shard in sharding.lock_owners(set(owner_ids)).items() if shard == alias}
+
+    def get_items(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            raise ParseError("Expected a list of items")
+        max_size = getattr(settings, 'PAAS_MAX_BULK_SIZE', 10000)
+        if len(items) > max_size:
+            raise ParseError("At most {} items allowed per request".format(max_size))
+        return items
+
+    def get_response(self, results, item_status, response_status):
+        if all(result['status'] == item_status for result in results):
+            return Response(results, status=response_status)
+        return Response(results, status=status.HTTP_207_MULTI_STATUS)
+
+    def post(self, request):
+        items = self.get_items(request)
+        results = [None] * len(items)
+        pending = {}
+
+        for index, item in enumerate(items):
+            serializer = BulkCreateResourceSerializer(data=item)
+            if not serializer.is_valid():
+                results[index] = {'status': status.HTTP_400_BAD_REQUEST, 'errors': serializer.errors}
+                continue
+            owner_id = serializer.validated_data.get('owner')
+            if not request.user.is_staff or owner_id is None:
+                owner_id = request.user.id
+            resource = Resource(owner_id=owner_id, resource_value=serializer.validated_data['resource_value'])
+            pending.setdefault(owner_id, []).append((index, resource))
+
+        created, per_shard = [], {}
+        with transaction.atomic():
+            # Locked, so that no owner moves to another shard before its resources are created
+            owners = sharding.lock_owners(pending)
+            for owner_id, entries in pending.items():
+                if owner_id not in owners:
+                    errors = {'owner': ['Invalid pk "{}" - object does not exist.'.format(owner_id)]}
+                elif not reserve_quota(owner_id, len(entries)):
+                    errors = {'detail': "User Quota Exceeded "}
+                else:
+                    created.extend(entries)
+                    per_shard.setdefault(owners[owner_id], []).extend(entries)
+                    continue
+                for index, resource in entries:
+                    results[index] = {'status': status.HTTP_400_BAD_REQUEST, 'errors': errors}
+            for alias, entries in per_shard.items():
+                with transaction.atomic(using=alias, savepoint=False):
+                    Resource.objects.using(alias).bulk_create([resource for index, resource in entries])
+            response_cache.invalidate_owners(resource.owner_id for index, resource in created)
+
+        serializer = ResourceSerializer()
+        for index, resource in created:
+            results[index] = {'status': status.HTTP_201_CREATED, 'data': serializer.to_representation(resource)}
+        return self.get_response(results, status.HTTP_201_CREATED, status.HTTP_201_CREATED)
+
+    def patch(self, request):
+        items = self.get_items(request)
+        results = [None] * len(items)
+        values = {}
+
+        for index, item in enumerate(items):
+            serializer = BulkUpdateResourceSerializer(data=item)
+            if not serializer.is_valid():
+                results[index] = {'status': status.HTTP_400_BAD_REQUEST, 'errors': serializer.errors}
+            elif serializer.validated_data['id'] in values:
+                results[index] = {'status': status.HTTP_400_BAD_REQUEST, 'errors': {'id': ["Duplicate id"]}}
+            else:
+                values[serializer.validated_data['id']] = (index, serializer.validated_data['resource_value'])
+
+        def update(alias, locking):
+            found = list(self.get_queryset().using(alias).filter(pk__in=values).only('id', 'owner'))
+            owners = self.owners_on(locking, (resource.owner_id for resource in found))
+            found = [resource for resource in found if resource.owner_id in owners]
+            for resource in found:
+                resource.resource_value = values[resource.pk][1]
+                resource.version = F('version') + 1
+            Resource.objects.using(alias).bulk_update(found, ['resource_value', 'version'])
+            response_cache.invalidate_owners(owners)
+            return found
+
+        resources = list(itertools.chain.from_iterable(self.write_shards(update)))
+
+        serializer = ResourceSerializer()
+        for resource in resources:
+            index, value = values.pop(resource.pk)
+            results[index] = {'status': status.HTTP_200_OK, 'data': serializer.to_representation(resource)}
+        for index, value in values.values():
+            results[index] = {'status': status.HTTP_404_NOT_FOUND, 'errors': {'detail': "Not found."}}
+        return self.get_response(results, status.HTTP_200_OK, status.HTTP_200_OK)
+
+    def delete(self, request):
+        items = self.get_items(request)
+        results = [None] * len(items)
+        ids = {}
+
+        field = serializers.UUIDField()
+        for index, item in enumerate(items):
+            try:
+                ids.setdefault(field.run_validation(item), []).append(index)
+            except ValidationError as exc:
+                results[index] = {'status': status.HTTP_400_BAD_REQUEST, 'errors': {'id': exc.detail}}
+
+        def delete(alias, locking):
+            found = dict(self.get_queryset().using(alias).filter(pk__in=ids).values_list('pk', 'owner_id'))
+            owners = self.owners_on(locking, found.values())
+            found = {pk for pk, owner_id in found.items() if owner_id in owners}
+            Resource.objects.using(alias).filter(pk__in=found).delete_in_bulk()
+            return found
+
+        existing = set().union(*self.write_shards(delete))
+
+        for pk, indexes in ids.items():
+            for index in indexes:
+                if pk in existing:
+                    results[index] = {'status': status.HTTP_204_NO_CONTENT}
+                else:
+                    results[index] = {'status': status.HTTP_404_NOT_FOUND, 'errors': {'detail': "Not found."}}
+        return self.get_response(results, status.HTTP_204_NO_CONTENT, status.HTTP_200_OK)
 
 
 class LoginView(generics.GenericAPIView):
     """
     post:
-        User Login with email and password
+        User Login with email and password. The response includes an API token,
+        send it as "Authorization: Token <token>" on later requests. Too many
+        attempts from one address or for one account are answered with 429.
     """
 
     authentication_classes = ()
+    throttle_classes = (LoginIPThrottle, LoginAccountThrottle)
     serializer_class = UserLoginSerializer
 
     def post(self, request):
         serializer = UserLoginSerializer(data=request.data)
         if serializer.is_valid():
-            user = authenticate(email=serializer.validated_data['email'],
-                                password=serializer.validated_data['password'])
+            try:
+                user = authenticate(email=serializer.validated_data['email'],
+                                    password=serializer.validated_data['password'])
+            except HashingPoolSaturated:
+                raise Throttled(detail="Too many logins in progress, try again shortly")
             if user:
-                login(request, user)
-                return Response(UserSerializer(user).data)
+                # No session: the token authenticates later requests. The signal still records last_login
+                user_logged_in.send(sender=user.__class__, request=request, user=user)
+                token, created = Token.objects.get_or_create(user=user)
+                data = UserSerializer(user).data
+                data['token'] = token.key
+                return Response(data)
             raise AuthenticationFailed("Invalid credentials")
         else:
             raise AuthenticationFailed(serializer.errors)
+
+
+class LogoutView(APIView):
+    """
+    post:
+        Revoke the API token of the current User and end the session
+    """
+
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request):
+        Token.objects.filter(user=request.user).delete()
+        logout(request)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class JobView(generics.RetrieveAPIView):
+    """
+    get:
+        Status and progress of a background job
+    """
+    permission_classes = (IsAdminUser,)
+
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+
+
+class MetricsView(APIView):
+    """
+    get:
+        Request metrics and cache statistics in the Prometheus text format
+    """
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        extra = ['# TYPE paas_cache_requests_total counter']
+        caches = [('response_' + kind, stats) for kind, stats in sorted(response_cache.stats().items())]
+        caches += [('basic_auth', credential_cache.stats()), ('token_auth', token_cache.stats())]
+        for name, stats in caches:
+            for key, result in (('hits', 'hit'), ('misses', 'miss')):
+                extra.append('paas_cache_requests_total{{cache="{}",result="{}"}} {}'.format(
+                    name, result, stats[key]))
+        return HttpResponse(metrics.registry.render(extra), content_type='text/plain; version=0.0.4; charset=utf-8')
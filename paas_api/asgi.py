@@ -0,0 +1,18 @@
+"""
+ASGI config for paas_api project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Django 2.2 has no ASGI handler of its own, so the WSGI application is served
+from a bounded thread pool, e.g. ``uvicorn paas_api.asgi:application``.
+"""
+
+import os
+
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+
+from paas.asgi import ThreadPoolASGIHandler
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'paas_api.settings')
+
+application = ThreadPoolASGIHandler(get_wsgi_application(), max_workers=settings.PAAS_ASGI_WORKER_THREADS)
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -39,31 +41,97 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
 
     'rest_framework',
+    'rest_framework.authtoken',
     'rest_framework_swagger',
-    'paas',
+    'paas.apps.PaasConfig',
 ]
 
 AUTH_USER_MODEL = 'paas.MyUser'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.BasicAuthentication',
+        'paas.authentication.CachedBasicAuthentication',
+        'paas.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     )
 }
 
+# Resource listing page size and the ceiling for the ?page_size= parameter
+PAAS_PAGE_SIZE = 100
+PAAS_MAX_PAGE_SIZE = 1000
+
+# Maximum number of items in one /api/resources/bulk/ request
+PAAS_MAX_BULK_SIZE = 10000
+
+# Resource values of at least MIN_SIZE characters are stored compressed with this codec
+# ('zlib' or 'lzma', None stores them as is), and stored once per distinct value with
+# DEDUPLICATION. Run `manage.py compact_resources` after changing these.
+PAAS_RESOURCE_COMPRESSION = None
+PAAS_RESOURCE_COMPRESSION_MIN_SIZE = 1024
+PAAS_RESOURCE_DEDUPLICATION = False
+# Characters of deduplicated values each process keeps decoded in memory; larger values than an eighth are not kept
+PAAS_PAYLOAD_CACHE_SIZE = 16 * 1024 * 1024
+
+# Index behind ?q= resource search: 'fts5' (SQLite FTS5 table), 'tokens' (a token table that works on
+# any database) or 'auto', FTS5 when the migration could create its table. Run
+# `manage.py rebuild_search_index` after changing it.
+PAAS_SEARCH_BACKEND = 'auto'
+
+# Deleting a User with more Resources than SYNC_LIMIT runs as a background job, in BATCH_SIZE batches.
+# PAAS_JOB_WORKER 'thread' runs jobs on a thread of the serving process; with None they are left
+# to `manage.py run_jobs`. A running job not updated for STALE_SECONDS is taken over by another worker;
+# the thread worker looks for such jobs, and jobs queued before a restart, every STALE_SECONDS.
+PAAS_USER_DELETE_SYNC_LIMIT = 1000
+PAAS_JOB_BATCH_SIZE = 1000
+PAAS_JOB_WORKER = 'thread'
+PAAS_JOB_STALE_SECONDS = 300
+
+# Longest ?wait= in seconds of a change feed request, and the days of changes
+# `manage.py prune_resource_changes` keeps by default
+PAAS_CHANGES_MAX_WAIT = 30
+PAAS_CHANGES_RETENTION_DAYS = 30
+
 AUTHENTICATION_BACKENDS = ('paas.backends.ModelEmailBackend',)
 
+# Password hashing runs on this many threads, with at most QUEUE_DEPTH logins waiting; more get a 429
+PAAS_LOGIN_HASHING_THREADS = 4
+PAAS_LOGIN_QUEUE_DEPTH = 16
+
+# Login attempts per client IP and per account, as token buckets ('10/min' allows bursts of 10); None disables
+PAAS_LOGIN_IP_RATE = '30/min'
+PAAS_LOGIN_ACCOUNT_RATE = '10/min'
+# Cache alias holding the login token buckets; with several worker processes it has to be one they share
+PAAS_THROTTLE_CACHE = 'default'
+
+# Verified Basic auth credentials are cached for this many seconds (0 disables), up to SIZE entries
+PAAS_AUTH_CACHE_TTL = 300
+PAAS_AUTH_CACHE_SIZE = 1024
+
+# Principals of API tokens are cached for this many seconds, which bounds how long a revoked token keeps working
+PAAS_TOKEN_CACHE_TTL = 60
+PAAS_TOKEN_CACHE_SIZE = 4096
+# Cache alias where a change of a user's password, activity or tokens is recorded, for every process
+# to drop what it verified before; with several worker processes it has to be one they share
+PAAS_AUTH_CHANGES_CACHE = 'default'
+
 MIDDLEWARE = [
+    'paas.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'paas.middleware.HashingPoolSaturatedMiddleware',
+    'paas.db.routers.PrimaryAfterWriteMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Share of requests (0 to 1) measured by RequestMetricsMiddleware; 0 turns it off
+PAAS_METRICS_SAMPLE_RATE = 0
+# Server-Timing header on sampled responses: 'staff' for admin requests only, True for all, False for none
+PAAS_METRICS_SERVER_TIMING = 'staff'
+
 ROOT_URLCONF = 'paas_api.urls'
 
 TEMPLATES = [
@@ -84,17 +152,107 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'paas_api.wsgi.application'
 
+# Threads running views under paas_api.asgi; requests beyond this wait without holding a thread
+PAAS_ASGI_WORKER_THREADS = 16
+
+# Worker processes serving the API, as told to gunicorn or uvicorn through WEB_CONCURRENCY. With more than
+# one, `manage.py check` warns about the caches the processes have to share but keep in their own memory.
+PAAS_WORKER_PROCESSES = int(os.environ.get('WEB_CONCURRENCY', 1))
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
-DATABASES = {
+# PAAS_DATABASE_PROFILE selects the database setup:
+#   sqlite        SQLite tuned for concurrent workers: WAL journal, immediate write transactions
+#   sqlite-plain  SQLite with Django's defaults
+#   server        a database server from the PAAS_DB_* variables, with persistent connections
+PAAS_DATABASE_PROFILE = os.environ.get('PAAS_DATABASE_PROFILE', 'sqlite')
+
+if PAAS_DATABASE_PROFILE == 'server':
+    DATABASES = {
+        'default': {
+            'ENGINE': os.environ.get('PAAS_DB_ENGINE', 'django.db.backends.postgresql'),
+            'NAME': os.environ.get('PAAS_DB_NAME', 'paas'),
+            'USER': os.environ.get('PAAS_DB_USER', ''),
+            'PASSWORD': os.environ.get('PAAS_DB_PASSWORD', ''),
+            'HOST': os.environ.get('PAAS_DB_HOST', ''),
+            'PORT': os.environ.get('PAAS_DB_PORT', ''),
+            'CONN_MAX_AGE': int(os.environ.get('PAAS_DB_CONN_MAX_AGE', 600)),
+        }
+    }
+elif PAAS_DATABASE_PROFILE in ('sqlite', 'sqlite-plain'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'paas.db.sqlite3' if PAAS_DATABASE_PROFILE == 'sqlite' else 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('PAAS_DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
+            'CONN_MAX_AGE': int(os.environ.get('PAAS_DB_CONN_MAX_AGE', 0)),
+        }
+    }
+else:
+    raise ImproperlyConfigured("Unknown PAAS_DATABASE_PROFILE {!r}".format(PAAS_DATABASE_PROFILE))
+
+# SQLite serializes writers, so change ids become visible in order. A database server may commit a
+# lower id after a higher one was read: the change feed then hands out changes again until they are
+# this many seconds old, longer than write transactions take, and clients skip the ones they have.
+PAAS_CHANGES_SETTLE_SECONDS = 0 if PAAS_DATABASE_PROFILE != 'server' else 10
+
+# PAAS_DB_REPLICAS (comma separated SQLite files, or hosts for the server profile) adds read
+# replicas of the primary. Safe requests to the resource and user views read from one of them,
+# except for users that wrote within PAAS_DB_REPLICA_STICKY_SECONDS, who read their writes from the primary.
+# That is recorded in the PAAS_DB_REPLICA_STICKY_CACHE cache alias, which has to be a cache every worker
+# process shares (e.g. memcached or redis) when there is more than one.
+PAAS_DB_REPLICAS = []
+for location in filter(None, os.environ.get('PAAS_DB_REPLICAS', '').split(',')):
+    alias = 'replica{}'.format(len(PAAS_DB_REPLICAS) + 1)
+    DATABASES[alias] = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+    DATABASES[alias]['HOST' if PAAS_DATABASE_PROFILE == 'server' else 'NAME'] = location.strip()
+    PAAS_DB_REPLICAS.append(alias)
+PAAS_DB_REPLICA_STICKY_SECONDS = 5
+PAAS_DB_REPLICA_STICKY_CACHE = 'default'
+
+# PAAS_DB_SHARDS (comma separated SQLite files, or hosts for the server profile) spreads resources
+# over shards by owner, the default database being one of them. Users, tokens and jobs stay on the
+# default database; MyUser.shard records where each owner's resources are, new owners are placed by
+# consistent hashing over PAAS_SHARD_RING_POINTS points per shard and `manage.py rebalance_shards`
+# moves existing ones. Cross-shard admin listings query the shards on PAAS_SHARD_FAN_OUT_THREADS threads.
+PAAS_SHARDS = []
+for location in filter(None, os.environ.get('PAAS_DB_SHARDS', '').split(',')):
+    alias = 'shard{}'.format(len(PAAS_SHARDS) + 1)
+    DATABASES[alias] = dict(DATABASES['default'])
+    DATABASES[alias]['HOST' if PAAS_DATABASE_PROFILE == 'server' else 'NAME'] = location.strip()
+    PAAS_SHARDS.append(alias)
+if PAAS_SHARDS:
+    PAAS_SHARDS.insert(0, 'default')
+PAAS_SHARD_RING_POINTS = 64
+PAAS_SHARD_FAN_OUT_THREADS = 8
+
+DATABASE_ROUTERS = ['paas.db.routers.ShardRouter', 'paas.db.routers.ReplicaRouter']
+
+# Applied to every new SQLite connection
+PAAS_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 30000,
+    'mmap_size': 268435456,
+} if PAAS_DATABASE_PROFILE == 'sqlite' else {}
+
+# Seconds between liveness checks of a persistent connection, done when a request starts
+PAAS_DB_HEALTH_CHECK_INTERVAL = 30
+
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+# Cache alias and lifetime in seconds (0 disables) for resource GET responses. The alias also holds the
+# per-owner generations that invalidate them, so with several worker processes it has to be a cache they
+# share (e.g. memcached or redis): with LocMemCache a write leaves the other processes serving stale responses.
+PAAS_RESPONSE_CACHE = 'default'
+PAAS_RESPONSE_CACHE_TTL = 300
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators